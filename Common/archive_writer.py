@@ -0,0 +1,229 @@
+import os
+import time
+import zlib
+import struct
+import collections
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+## Zip archive writer shared by the tools (shapefile zips and KMZs). Each member is either
+## stored or deflated at the archive's compression level, and members whose extension is
+## already compressed are always stored. Deflated members are split into chunks that are
+## compressed on a pool of threads (zlib releases the GIL) and joined with sync flushes into
+## one deflate stream, so a large member is not held up on a single core.
+##
+## Members are written when the archive is closed. ZIP64 is not supported, so an archive is
+## limited to 65535 members of under 4 GB each. A streamed member (add_stream) is produced by
+## a function that writes to a file-like MemberStream, which compresses the data into the
+## archive as it is written, so the member is never held whole in memory.
+
+STORED = 0
+DEFLATED = 8
+
+default_stored_extension_set = frozenset(['.zip', '.kmz', '.gz', '.png', '.jpg', '.jpeg', '.gif', '.pdf'])
+
+class ArchiveWriter:
+
+    def __init__(self, archive_file_path, compression_level=6, worker_count=0, chunk_size=1024 * 1024, stored_extension_set=default_stored_extension_set):
+        ## A compression_level of 0 stores every member. A worker_count of 0 uses one thread per CPU.
+        if (compression_level < 0 or compression_level > 9):
+            raise ValueError('Compression level must be between 0 and 9, not {}'.format(compression_level))
+        self._archive_file_path = archive_file_path
+        self._compression_level = compression_level
+        if (worker_count <= 0):
+            worker_count = multiprocessing.cpu_count()
+        self._worker_count = worker_count
+        self._chunk_size = chunk_size
+        self._stored_extension_set = stored_extension_set
+        self._member_list = list()
+        self._name_set = set()
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        if exception_type is None:
+            self.close()
+        return False
+
+    def add_file(self, source_file_path, member_name, store=None):
+        ## store forces (True) or prevents (False) storing; None decides from the level and extension
+        date_time = time.localtime(os.path.getmtime(source_file_path))[0:6]
+        self._add_member(member_name, source_file_path, None, None, date_time, store)
+
+    def add_bytes(self, member_name, data, store=None):
+        self._add_member(member_name, None, data, None, time.localtime()[0:6], store)
+
+    def add_stream(self, member_name, write_member, store=None):
+        ## write_member(stream) is called when the archive is closed, on a single thread
+        self._add_member(member_name, None, None, write_member, time.localtime()[0:6], store)
+
+    def close(self):
+        if (self._closed):
+            return
+        self._closed = True
+        central_directory_list = list()
+        pool = None
+        if (self._worker_count > 1 and self._compression_level > 0):
+            pool = ThreadPool(self._worker_count)
+        try:
+            with open(self._archive_file_path, 'wb') as archive_file:
+                for member in self._member_list:
+                    central_directory_list.append(self._write_member(archive_file, member, pool))
+                central_directory_offset = archive_file.tell()
+                for entry in central_directory_list:
+                    archive_file.write(entry)
+                central_directory_size = archive_file.tell() - central_directory_offset
+                archive_file.write(struct.pack('<4s4H2LH', b'PK\x05\x06', 0, 0, len(central_directory_list), len(central_directory_list), central_directory_size, central_directory_offset, 0))
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    @property
+    def member_count(self):
+        return len(self._member_list)
+
+    def _add_member(self, member_name, source_file_path, data, write_member, date_time, store):
+        if (self._closed):
+            raise ValueError('Archive {} is already closed'.format(self._archive_file_path))
+        member_name = member_name.replace(os.sep, '/')
+        if member_name in self._name_set:
+            raise ValueError('Archive {} already has a member named {}'.format(self._archive_file_path, member_name))
+        if (len(self._member_list) >= 0xFFFF):
+            raise ValueError('Archive {} would need ZIP64 for more than 65535 members'.format(self._archive_file_path))
+        if store is None:
+            store = (self._compression_level == 0 or os.path.splitext(member_name)[1].lower() in self._stored_extension_set)
+        self._name_set.add(member_name)
+        self._member_list.append((member_name, source_file_path, data, write_member, date_time, store))
+
+    def _write_member(self, archive_file, member, pool):
+        member_name, source_file_path, data, write_member, date_time, store = member
+        if isinstance(member_name, bytes):
+            encoded_name = member_name
+            flags = 0
+        else:
+            try:
+                encoded_name = member_name.encode('ascii')
+                flags = 0
+            except UnicodeEncodeError:
+                encoded_name = member_name.encode('utf-8')
+                flags = 0x800
+        method = STORED if store else DEFLATED
+        dos_time, dos_date = dos_date_time(date_time)
+
+        header_offset = archive_file.tell()
+        archive_file.write(local_file_header(flags, method, dos_time, dos_date, 0, 0, 0, encoded_name))
+        if write_member is None:
+            crc = 0
+            compressed_size = 0
+            uncompressed_size = 0
+            for chunk, compressed_chunk in self._compressed_chunks(source_file_path, data, method, pool):
+                crc = zlib.crc32(chunk, crc)
+                uncompressed_size = uncompressed_size + len(chunk)
+                compressed_size = compressed_size + len(compressed_chunk)
+                archive_file.write(compressed_chunk)
+        else:
+            member_stream = MemberStream(archive_file, method, self._compression_level)
+            write_member(member_stream)
+            crc, compressed_size, uncompressed_size = member_stream.finish()
+        if (compressed_size > 0xFFFFFFFF or uncompressed_size > 0xFFFFFFFF or archive_file.tell() > 0xFFFFFFFF):
+            raise ValueError('Archive {} would need ZIP64 for member {}'.format(self._archive_file_path, member_name))
+        crc = crc & 0xFFFFFFFF
+
+        ## Go back and complete the local header now the sizes and CRC are known
+        end_offset = archive_file.tell()
+        archive_file.seek(header_offset)
+        archive_file.write(local_file_header(flags, method, dos_time, dos_date, crc, compressed_size, uncompressed_size, encoded_name))
+        archive_file.seek(end_offset)
+
+        return (struct.pack('<4s4B4HL2L5H2L', b'PK\x01\x02', 20, 0, 20, 0, flags, method, dos_time, dos_date, crc, compressed_size, uncompressed_size, len(encoded_name), 0, 0, 0, 0, 0, header_offset) +
+                encoded_name)
+
+    def _compressed_chunks(self, source_file_path, data, method, pool):
+        ## Yields (chunk, compressed chunk) pairs in order, keeping a bounded number of chunks in flight
+        chunk_iterator = read_chunks(source_file_path, data, self._chunk_size)
+        if (method == STORED):
+            for chunk in chunk_iterator:
+                yield (chunk, chunk)
+            return
+        if pool is None:
+            compressor = zlib.compressobj(self._compression_level, zlib.DEFLATED, -15)
+            for chunk in chunk_iterator:
+                yield (chunk, compressor.compress(chunk))
+            yield (b'', compressor.flush(zlib.Z_FINISH))
+            return
+        in_flight = collections.deque()
+        for chunk in chunk_iterator:
+            in_flight.append((chunk, pool.apply_async(deflate_chunk, (chunk, self._compression_level, False))))
+            if (len(in_flight) >= self._worker_count * 2):
+                chunk, result = in_flight.popleft()
+                yield (chunk, result.get())
+        while len(in_flight) > 0:
+            chunk, result = in_flight.popleft()
+            yield (chunk, result.get())
+        ## The final empty block ends the deflate stream
+        yield (b'', deflate_chunk(b'', self._compression_level, True))
+
+class MemberStream:
+
+    ## File-like object handed to a streamed member's write function. Each write is added to
+    ## the CRC and compressed straight into the archive file.
+
+    def __init__(self, archive_file, method, compression_level):
+        self._archive_file = archive_file
+        self._compressor = None
+        if (method == DEFLATED):
+            self._compressor = zlib.compressobj(compression_level, zlib.DEFLATED, -15)
+        self._crc = 0
+        self._compressed_size = 0
+        self._uncompressed_size = 0
+
+    def write(self, data):
+        self._crc = zlib.crc32(data, self._crc)
+        self._uncompressed_size = self._uncompressed_size + len(data)
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+        self._write_compressed(data)
+
+    def finish(self):
+        ## Returns the member's CRC, compressed size and uncompressed size
+        if self._compressor is not None:
+            self._write_compressed(self._compressor.flush(zlib.Z_FINISH))
+            self._compressor = None
+        return (self._crc, self._compressed_size, self._uncompressed_size)
+
+    def _write_compressed(self, data):
+        self._compressed_size = self._compressed_size + len(data)
+        self._archive_file.write(data)
+
+def deflate_chunk(chunk, compression_level, final):
+    ## Each chunk is compressed on its own and ended with a sync flush, which leaves the output
+    ## byte aligned so the chunks can simply be concatenated into one raw deflate stream
+    compressor = zlib.compressobj(compression_level, zlib.DEFLATED, -15)
+    if (final):
+        return compressor.compress(chunk) + compressor.flush(zlib.Z_FINISH)
+    return compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+def read_chunks(source_file_path, data, chunk_size):
+    if source_file_path is None:
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+        return
+    with open(source_file_path, 'rb') as source_file:
+        while True:
+            chunk = source_file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+def local_file_header(flags, method, dos_time, dos_date, crc, compressed_size, uncompressed_size, encoded_name):
+    return struct.pack('<4s2B4HL2L2H', b'PK\x03\x04', 20, 0, flags, method, dos_time, dos_date, crc, compressed_size, uncompressed_size, len(encoded_name), 0) + encoded_name
+
+def dos_date_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    ## Zip dates cannot be earlier than 1980
+    if year < 1980:
+        year, month, day, hour, minute, second = (1980, 1, 1, 0, 0, 0)
+    return ((hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day)
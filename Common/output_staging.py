@@ -0,0 +1,130 @@
+import os
+import sys
+import shutil
+import tempfile
+
+## Builds a run's output files on local scratch disk and publishes them to the Outbox in one
+## go once the run has finished. Each file is copied next to its destination under a
+## temporary name and, once every copy has completed, renamed into place, so readers of the
+## Outbox never see a half written file. A file being replaced is kept as a .bak until every
+## rename has succeeded; if one fails, the files already renamed are taken out again and the
+## .bak files restored, so the Outbox is left as it was. Only a process killed part way
+## through the renames can leave a mix of old and new files, with the replaced ones as .bak.
+##
+## Paths are always given as their final Outbox paths; staged_path returns where to build
+## them locally. Files already complete on the share (e.g. an unchanged KMZ from the last
+## run) can be added with add_existing to be linked or copied on the share at publish time.
+
+partial_suffix = '.partial'
+backup_suffix = '.bak'
+
+class OutputStaging:
+
+    def __init__(self, outbox_folder, staging_folder=None, prefix='OutputStaging_'):
+        ## Without a staging_folder a new temporary one is made. Passing a fixed folder lets a
+        ## resumed run pick up the files staged by the run it continues.
+        self._outbox_folder = os.path.abspath(outbox_folder)
+        if staging_folder is None:
+            staging_folder = tempfile.mkdtemp(prefix=prefix)
+        elif not os.path.isdir(staging_folder):
+            os.makedirs(staging_folder)
+        self._staging_folder = staging_folder
+        self._existing_file_list = list()
+
+    def staged_path(self, final_file_path):
+        return staged_file_path(self._outbox_folder, self._staging_folder, final_file_path)
+
+    def make_staged_folder(self, final_folder_path):
+        staged_folder_path = self.staged_path(final_folder_path)
+        if not os.path.isdir(staged_folder_path):
+            os.makedirs(staged_folder_path)
+        return staged_folder_path
+
+    def add_existing(self, source_file_path, final_file_path):
+        self._existing_file_list.append((source_file_path, final_file_path))
+
+    def publish(self, ignore_extension_set=frozenset(['.lock'])):
+        ## Returns the list of published Outbox paths
+        publish_list = list()
+        for base, dirs, files in os.walk(self._staging_folder):
+            for file_name in files:
+                if not os.path.splitext(file_name)[1].lower() in ignore_extension_set:
+                    staged_file = os.path.join(base, file_name)
+                    publish_list.append((staged_file, os.path.join(self._outbox_folder, os.path.relpath(staged_file, self._staging_folder)), False))
+        for source_file_path, final_file_path in self._existing_file_list:
+            if (os.path.abspath(source_file_path) != os.path.abspath(final_file_path)):
+                publish_list.append((source_file_path, final_file_path, True))
+
+        ## Copy everything across first, then rename it all into place
+        renamed_list = list()
+        try:
+            for source_file_path, final_file_path, on_share in publish_list:
+                final_folder_path = os.path.dirname(final_file_path)
+                if not os.path.isdir(final_folder_path):
+                    os.makedirs(final_folder_path)
+                remove_file(final_file_path + partial_suffix)
+                if (on_share):
+                    link_or_copy_file(source_file_path, final_file_path + partial_suffix)
+                else:
+                    shutil.copyfile(source_file_path, final_file_path + partial_suffix)
+            for source_file_path, final_file_path, on_share in publish_list:
+                backed_up = os.path.isfile(final_file_path)
+                if (backed_up):
+                    remove_file(final_file_path + backup_suffix)
+                    replace_file(final_file_path, final_file_path + backup_suffix)
+                renamed_list.append((final_file_path, backed_up))
+                replace_file(final_file_path + partial_suffix, final_file_path)
+        except:
+            for final_file_path, backed_up in reversed(renamed_list):
+                remove_file(final_file_path)
+                if (backed_up):
+                    replace_file(final_file_path + backup_suffix, final_file_path)
+            for source_file_path, final_file_path, on_share in publish_list:
+                remove_file(final_file_path + partial_suffix)
+            raise
+        for final_file_path, backed_up in renamed_list:
+            if (backed_up):
+                remove_file(final_file_path + backup_suffix)
+        self._existing_file_list = list()
+        return [final_file_path for source_file_path, final_file_path, on_share in publish_list]
+
+    def discard(self):
+        shutil.rmtree(self._staging_folder, True)
+
+    @property
+    def outbox_folder(self):
+        return self._outbox_folder
+
+    @property
+    def staging_folder(self):
+        return self._staging_folder
+
+def staged_file_path(outbox_folder, staging_folder, final_file_path):
+    ## A plain function as well, so worker processes can map paths from their settings alone
+    relative_path = os.path.relpath(os.path.abspath(final_file_path), os.path.abspath(outbox_folder))
+    if (relative_path == os.pardir or relative_path.startswith(os.pardir + os.sep) or os.path.isabs(relative_path)):
+        raise ValueError('{} is not inside the Outbox {}'.format(final_file_path, outbox_folder))
+    return os.path.join(staging_folder, relative_path)
+
+def replace_file(source_file_path, destination_file_path):
+    ## os.rename will not replace an existing file on Windows, so MoveFileEx is used there
+    if (sys.platform == 'win32'):
+        import ctypes
+        move_file_replace_existing = 0x1
+        if not ctypes.windll.kernel32.MoveFileExW(unicode(source_file_path), unicode(destination_file_path), move_file_replace_existing):
+            raise ctypes.WinError()
+    else:
+        os.rename(source_file_path, destination_file_path)
+
+def remove_file(file_path):
+    if (os.path.isfile(file_path)):
+        os.remove(file_path)
+
+def link_or_copy_file(source_file_path, destination_file_path):
+    if (hasattr(os, 'link')):
+        try:
+            os.link(source_file_path, destination_file_path)
+            return
+        except OSError:
+            pass
+    shutil.copyfile(source_file_path, destination_file_path)
@@ -0,0 +1,27 @@
+## Converts arcpy polygon geometries into plain Python rings, lists of (x, y) tuples, for the
+## pure Python geometry code shared by the tools. arcpy itself is not imported here; any
+## object iterating like an arcpy Polygon (parts of points, with None separating the
+## exterior ring of a part from its interior rings) will do.
+
+def geometry_parts(geometry):
+    ## Each part lists its rings, exterior ring first
+    parts = list()
+    for part in geometry:
+        rings = list()
+        ring = list()
+        for point in part:
+            if point is None:
+                rings.append(ring)
+                ring = list()
+            else:
+                ring.append((point.X, point.Y))
+        rings.append(ring)
+        parts.append(rings)
+    return parts
+
+def geometry_rings(geometry):
+    ## Every ring of every part in one list, for code using the even-odd rule
+    rings = list()
+    for part_rings in geometry_parts(geometry):
+        rings.extend(part_rings)
+    return rings
@@ -0,0 +1,63 @@
+import os
+import sys
+import shutil
+import zipfile
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import archive_writer
+
+def write_lines(line_count):
+    def write_member(stream):
+        for index in range(0, line_count):
+            stream.write('Line {}\n'.format(index).encode('ascii'))
+    return write_member
+
+def expected_lines(line_count):
+    return b''.join(['Line {}\n'.format(index).encode('ascii') for index in range(0, line_count)])
+
+class ArchiveWriterTests(unittest.TestCase):
+
+    def setUp(self):
+        self._folder = tempfile.mkdtemp(prefix='ArchiveWriterTest_')
+        self._archive_file_path = os.path.join(self._folder, 'archive.zip')
+
+    def tearDown(self):
+        shutil.rmtree(self._folder, True)
+
+    def read_archive(self):
+        with zipfile.ZipFile(self._archive_file_path, 'r') as archive:
+            self.assertEqual(archive.testzip(), None)
+            return dict([(info.filename, (archive.read(info.filename), info.compress_type)) for info in archive.infolist()])
+
+    def test_streamed_member(self):
+        for compression_level, compress_type in [(6, zipfile.ZIP_DEFLATED), (0, zipfile.ZIP_STORED)]:
+            with archive_writer.ArchiveWriter(self._archive_file_path, compression_level, 1) as archive:
+                archive.add_stream('doc.kml', write_lines(100000))
+            self.assertEqual(self.read_archive(), {'doc.kml': (expected_lines(100000), compress_type)})
+
+    def test_empty_streamed_member(self):
+        with archive_writer.ArchiveWriter(self._archive_file_path, 6, 1) as archive:
+            archive.add_stream('doc.kml', write_lines(0))
+        self.assertEqual(self.read_archive(), {'doc.kml': (b'', zipfile.ZIP_DEFLATED)})
+
+    def test_streamed_member_among_others(self):
+        source_file_path = os.path.join(self._folder, 'source.dbf')
+        with open(source_file_path, 'wb') as source_file:
+            source_file.write(b'x' * 300000)
+        with archive_writer.ArchiveWriter(self._archive_file_path, 6, 4, chunk_size=65536) as archive:
+            archive.add_file(source_file_path, 'source.dbf')
+            archive.add_stream('doc.kml', write_lines(1000))
+            archive.add_bytes('image.png', b'png')
+        self.assertEqual(self.read_archive(), {'source.dbf': (b'x' * 300000, zipfile.ZIP_DEFLATED),
+                                               'doc.kml': (expected_lines(1000), zipfile.ZIP_DEFLATED),
+                                               'image.png': (b'png', zipfile.ZIP_STORED)})
+
+    def test_duplicate_member(self):
+        archive = archive_writer.ArchiveWriter(self._archive_file_path)
+        archive.add_stream('doc.kml', write_lines(1))
+        self.assertRaises(ValueError, archive.add_bytes, 'doc.kml', b'')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import output_staging
+
+def write_file(file_path, text):
+    with open(file_path, 'w') as output_file:
+        output_file.write(text)
+
+def read_file(file_path):
+    with open(file_path, 'r') as input_file:
+        return input_file.read()
+
+class OutputStagingTests(unittest.TestCase):
+
+    def setUp(self):
+        self._folder = tempfile.mkdtemp(prefix='OutputStagingTest_')
+        self._outbox_folder = os.path.join(self._folder, 'Outbox')
+        os.makedirs(self._outbox_folder)
+        self._staging = output_staging.OutputStaging(self._outbox_folder, os.path.join(self._folder, 'Staging'))
+        self._replace_file = output_staging.replace_file
+
+    def tearDown(self):
+        output_staging.replace_file = self._replace_file
+        shutil.rmtree(self._folder, True)
+
+    def outbox_path(self, file_name):
+        return os.path.join(self._outbox_folder, file_name)
+
+    def stage_files(self):
+        write_file(self.outbox_path('a.kmz'), 'old a')
+        write_file(self.outbox_path('b.kmz'), 'old b')
+        for file_name in ['a.kmz', 'b.kmz', 'c.kmz']:
+            write_file(self._staging.staged_path(self.outbox_path(file_name)), 'new ' + file_name[0])
+
+    def test_publish_replaces_files(self):
+        self.stage_files()
+        published_file_list = self._staging.publish()
+        self.assertEqual(sorted(published_file_list), [self.outbox_path('a.kmz'), self.outbox_path('b.kmz'), self.outbox_path('c.kmz')])
+        self.assertEqual(sorted(os.listdir(self._outbox_folder)), ['a.kmz', 'b.kmz', 'c.kmz'])
+        self.assertEqual([read_file(file_path) for file_path in sorted(published_file_list)], ['new a', 'new b', 'new c'])
+
+    def test_failed_rename_restores_outbox(self):
+        self.stage_files()
+        rename_list = list()
+        def failing_replace_file(source_file_path, destination_file_path):
+            ## Fails the last of the three renames into place
+            if (source_file_path.endswith(output_staging.partial_suffix)):
+                rename_list.append(destination_file_path)
+                if (len(rename_list) == 3):
+                    raise OSError('Outbox unavailable')
+            self._replace_file(source_file_path, destination_file_path)
+        output_staging.replace_file = failing_replace_file
+        self.assertRaises(OSError, self._staging.publish)
+        self.assertEqual(sorted(os.listdir(self._outbox_folder)), ['a.kmz', 'b.kmz'])
+        self.assertEqual(read_file(self.outbox_path('a.kmz')), 'old a')
+        self.assertEqual(read_file(self.outbox_path('b.kmz')), 'old b')
+
+    def test_staged_path_outside_outbox(self):
+        self.assertRaises(ValueError, self._staging.staged_path, os.path.join(self._folder, 'elsewhere.kmz'))
+
+if __name__ == '__main__':
+    unittest.main()
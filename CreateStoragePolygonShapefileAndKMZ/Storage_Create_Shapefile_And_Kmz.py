@@ -2,14 +2,26 @@ import arcpy
 import os
 import sys
 import datetime
-import zipfile
 import shutil
+import tempfile
+## Modules shared by the tools live in the Common folder alongside this one
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'Common'))
+import archive_writer
+import output_staging
+import polygon_rings
+import polygon_centroids
+import stage_executor
+import shapefile_zip_writer
+import export_fingerprint
 
 Debug = False
 
 def main():
     settings_dictionary = create_settings_dictionary()
-    create_shapefile_and_kmz_for_valid_storage_polygons(settings_dictionary)
+    # Files are built on local disk and only published to the Outbox once the run succeeds
+    staging = output_staging.OutputStaging(settings_dictionary["OutputFolder"], prefix='StorageExport_')
+    stage_output_files(settings_dictionary, staging)
+    create_shapefile_and_kmz_for_valid_storage_polygons(settings_dictionary, staging)
 
 def create_settings_dictionary():
 
@@ -50,13 +62,26 @@ def create_settings_dictionary():
     settings_dictionary["outputMXD"] = os.path.join(outputMXD)
     settings_dictionary["temporaryLayer"] = os.path.join(temporaryLayer)
     settings_dictionary["outputKMZ"] = os.path.join(outputKMZ)
+    settings_dictionary["OutboxArtifacts"] = {"Zip": outputShapeFileFolderZipped, "PDF": outputPDF, "KMZ": outputKMZ}
     settings_dictionary["DateTimeStamp"] = get_database_timestamp()
     settings_dictionary["RunIdentifier"] = r"%s_%s" %(strRunName,strNewTimeStamp)
 
     settings_dictionary["ViewWhereClause"] = 'Valid = 1 AND Download_Land_Data > 0 AND SubStationStatus IS NOT NULL'
+    settings_dictionary["StageWorkerCount"] = 3 # PDF, shapefile and KMZ branches run side by side, 1 runs every stage in turn
+    settings_dictionary["ShapefileEngine"] = "Native" # "Native" writes the shapefile straight into the zip, "ArcGIS" exports to a folder and zips it
+    settings_dictionary["CompressionLevel"] = 6 # Deflate level for the shapefile zip, 0 stores the members uncompressed
+    settings_dictionary["CompressionWorkerCount"] = 0 # Threads compressing each zip member, 0 uses one per CPU
+    settings_dictionary["ManifestFilePath"] = os.path.join(tempfile.gettempdir(), 'StorageExportManifest.json') # Kept out of the user-facing Outbox; without it the next run does a full export
+    settings_dictionary["SkipIfUnchanged"] = not "--full-rebuild" in sys.argv # Reuse the last run's artifacts when the selected polygons have not changed
+    settings_dictionary["EditDateField"] = None # Last edited date field fingerprinted in place of every attribute, None uses the sketch layer's editor tracking field
 
     return settings_dictionary
 
+def stage_output_files(settings_dictionary, staging):
+    # The stages build their files at the staged paths. Only the paths go into the settings, which are pickled into the stage workers
+    for output_key in ["outputShapeFileFolder", "outputShapeFile", "outputShapeFileFolderZipped", "outputPDF", "outputMXD", "outputKMZ"]:
+        settings_dictionary[output_key] = staging.staged_path(settings_dictionary[output_key])
+
 def get_current_timestamp():
     strDateFormat = '%Y%m%d'
     strNewTimeStamp = datetime.date.today().strftime(strDateFormat)
@@ -76,17 +101,76 @@ def get_database_timestamp():
 
     return strNewTimeStamp
 
-def create_shapefile_and_kmz_for_valid_storage_polygons(settings_dictionary):
+def create_shapefile_and_kmz_for_valid_storage_polygons(settings_dictionary, staging):
+
+    fingerprint = get_selection_fingerprint(settings_dictionary)
+    if (settings_dictionary["SkipIfUnchanged"] and reuse_unchanged_artifacts(settings_dictionary, staging, fingerprint)):
+        return
 
     select_required_polygons(settings_dictionary)
 
     if (selected_polygons_ok(settings_dictionary)):
-        create_shapefile_and_zip(settings_dictionary)
-        create_kmz(settings_dictionary)
-        tidy_up(settings_dictionary, True)
+        results = create_artifacts(settings_dictionary)
+        tidy_up(settings_dictionary, results.ok)
+        if not results.ok:
+            output_warning('Nothing published, partial output left in {}'.format(staging.staging_folder))
+            raise Exception('Storage polygon export failed in stage(s): {}'.format(', '.join([result.stage_name for result in results.failed_results])))
+        publish_outputs(staging)
+        export_fingerprint.save_export_manifest(settings_dictionary["ManifestFilePath"], fingerprint, settings_dictionary["RunIdentifier"], settings_dictionary["OutputFolder"], settings_dictionary["OutboxArtifacts"])
     else:
         report_issue(settings_dictionary)
         tidy_up(settings_dictionary, False)
+        staging.discard()
+
+def get_selection_fingerprint(settings_dictionary):
+    output_message("Fingerprinting selected polygons...")
+    view_path = settings_dictionary["InputFeatureClassViewPath"]
+    view_field_list = arcpy.ListFields(view_path)
+    edit_date_field = get_edit_date_field(settings_dictionary, [field.name for field in view_field_list])
+    if (edit_date_field):
+        # Any edit to a polygon moves its last edited date, so its other attributes need not be read
+        edit_field_list = [edit_date_field]
+    else:
+        output_warning("No last edited date field found for {}, fingerprinting every attribute".format(view_path))
+        edit_field_list = [field.name for field in view_field_list if not field.type in ('OID', 'Geometry', 'Blob', 'Raster')]
+    fingerprint = export_fingerprint.SelectionFingerprint('{}|{}|{}'.format(settings_dictionary["ViewWhereClause"], settings_dictionary["ShapefileEngine"], edit_date_field))
+    with arcpy.da.SearchCursor(view_path, ['OID@', 'SHAPE@WKB'] + edit_field_list, settings_dictionary["ViewWhereClause"]) as cursor:
+        for row in cursor:
+            fingerprint.add_row(row[0], row[1], list(row[2:]))
+    output_message("{} polygons fingerprinted".format(fingerprint.count))
+    return fingerprint.hexdigest()
+
+def get_edit_date_field(settings_dictionary, view_field_list):
+    # The configured field, or the editor tracking last edited field of the sketch polygons, if the view carries it
+    edit_date_field = settings_dictionary["EditDateField"]
+    if not (edit_date_field):
+        description = arcpy.Describe(settings_dictionary["InputFeatureClassPath"])
+        if (getattr(description, 'editorTrackingEnabled', False)):
+            edit_date_field = description.editedAtFieldName
+    if (edit_date_field and edit_date_field.lower() in [field_name.lower() for field_name in view_field_list]):
+        return edit_date_field
+    return None
+
+def reuse_unchanged_artifacts(settings_dictionary, staging, fingerprint):
+    # The previous run's artifacts stay in the Outbox under its own names, skipping the selection and every export stage
+    manifest = export_fingerprint.load_export_manifest(settings_dictionary["ManifestFilePath"])
+    reusable = export_fingerprint.reusable_artifacts(manifest, fingerprint, settings_dictionary["OutputFolder"], settings_dictionary["OutboxArtifacts"].keys())
+    if reusable is None:
+        return False
+    run_identifier, previous_artifact_dictionary = reusable
+    output_warning("Selected polygons unchanged since run {}, reusing its artifacts instead of rebuilding them".format(run_identifier))
+    for artifact_name in sorted(settings_dictionary["OutboxArtifacts"].keys()):
+        output_warning("Reused {}".format(previous_artifact_dictionary[artifact_name]))
+    staging.discard()
+    return True
+
+def publish_outputs(staging):
+    output_message("Publishing to {}...".format(staging.outbox_folder))
+    try:
+        for published_file_path in staging.publish():
+            output_warning("Published {}".format(published_file_path))
+    finally:
+        staging.discard()
 
 def select_required_polygons(settings_dictionary):
     arcpy.env.workspace = settings_dictionary["InputDatabase"]
@@ -100,13 +184,32 @@ def selected_polygons_ok(settings_dictionary):
     output_message("%s polygons selected" % (count))
     return (count > 0)
 
-def create_shapefile_and_zip(settings_dictionary):
-
-    create_folder_for_shapefile(settings_dictionary)
-    add_centroids(settings_dictionary)
-    create_mxd(settings_dictionary)
-    export_shapefile(settings_dictionary)
-    zip_shapefile(settings_dictionary)
+def create_artifacts(settings_dictionary):
+    # The PDF, shapefile and KMZ branches only read the selected feature class once its centroids exist
+    graph = stage_executor.StageGraph()
+    graph.add_stage("Centroids", add_centroids, settings_dictionary)
+    graph.add_stage("PDF", create_mxd, settings_dictionary, ["Centroids"])
+    if (settings_dictionary["ShapefileEngine"] == "Native"):
+        graph.add_stage("Shapefile", export_shapefile_to_zip, settings_dictionary, ["Centroids"])
+    else:
+        graph.add_stage("Folder", create_folder_for_shapefile, settings_dictionary)
+        graph.add_stage("Shapefile", export_shapefile, settings_dictionary, ["Folder", "Centroids"])
+        graph.add_stage("Zip", zip_shapefile, settings_dictionary, ["Shapefile"])
+    graph.add_stage("KMZ", create_kmz, settings_dictionary, ["Centroids"])
+
+    output_message("Creating PDF, shapefile and KMZ with {} workers...".format(settings_dictionary["StageWorkerCount"]))
+    start_time = datetime.datetime.now()
+    results = graph.run(settings_dictionary["StageWorkerCount"], report_stage)
+    for stage_name in results.skipped_names:
+        output_warning("Stage {} skipped as a stage it depends on failed".format(stage_name))
+    output_message("Artifact stages finished in {:.1f}s".format((datetime.datetime.now() - start_time).total_seconds()))
+    return results
+
+def report_stage(result):
+    if (result.ok):
+        output_message("Stage {} completed in {:.1f}s".format(result.stage_name, result.elapsed_seconds))
+    else:
+        output_error("Stage {} failed after {:.1f}s: {}".format(result.stage_name, result.elapsed_seconds, result.error))
 
 def create_folder_for_shapefile(settings_dictionary):
     #create folder for shapefile
@@ -124,8 +227,6 @@ def add_centroids(settings_dictionary):
 
     fieldPrecision = 18
     fieldScale = 11
-    expression1 = "1.5"
-    expression2 = "2.5"
 
     # Execute AddField
     arcpy.AddField_management(inFeatures, fieldName1, "DOUBLE",
@@ -133,14 +234,31 @@ def add_centroids(settings_dictionary):
     arcpy.AddField_management(inFeatures, fieldName2, "DOUBLE",
                               fieldPrecision, fieldScale)
 
-    # Execute CalculateField
-    arcpy.CalculateField_management(inFeatures, fieldName1, expression1,
-                                    "PYTHON_9.3")
-    output_message("Added X Centroid")
-
-    arcpy.CalculateField_management(inFeatures, fieldName2, expression2,
-                                    "PYTHON_9.3")
-    output_message("Added Y Centroid")
+    # Read every polygon's rings in one pass and compute all the centroids together
+    builder = polygon_centroids.CentroidArrayBuilder()
+    polygon_index_dictionary = dict()
+    with arcpy.da.SearchCursor(inFeatures, ['OID@', 'SHAPE@']) as cursor:
+        for row in cursor:
+            rings = list()
+            if row[1]:
+                rings = polygon_rings.geometry_rings(row[1])
+            polygon_index_dictionary[row[0]] = builder.add_polygon(rings)
+    centroid_x_array, centroid_y_array = builder.centroids()
+
+    # Write both fields in a single update pass
+    with arcpy.da.UpdateCursor(inFeatures, ['OID@', fieldName1, fieldName2]) as cursor:
+        for row in cursor:
+            polygon_index = polygon_index_dictionary[row[0]]
+            row[1] = get_centroid_value(centroid_x_array[polygon_index])
+            row[2] = get_centroid_value(centroid_y_array[polygon_index])
+            cursor.updateRow(row)
+    output_message("Added centroids for {} polygons".format(len(polygon_index_dictionary)))
+
+def get_centroid_value(value):
+    # Polygons without any vertices have no centroid
+    if (value != value):
+        return None
+    return float(value)
 
 def create_mxd(settings_dictionary):
     output_message("Creating mxd...")
@@ -168,13 +286,9 @@ def create_mxd(settings_dictionary):
     #use df.extents to zoom to the landregisrty feature before plotting to pdf.
     mxd =arcpy.mapping.MapDocument(settings_dictionary["outputMXD"])
     mxd.title = settings_dictionary["RunIdentifier"]
-    cur = arcpy.UpdateCursor(lyrLayer)
-    for row in cur:
-        X = row.xCentroid
-        X= round(X,0)
-        Y = row.yCentroid
-        Y = round(Y,0)
-        mxd.summary = "Easting: %s, Northing %s" %(X,Y)
+    #summary location is the centre of the selected polygons' extent, read without scanning the rows
+    X, Y = get_extent_centre(inFeatures)
+    mxd.summary = "Easting: %s, Northing %s" %(X,Y)
 
     df = arcpy.mapping.ListDataFrames(mxd)[0]
     lyrs = arcpy.mapping.ListLayers(mxd)[0]
@@ -190,15 +304,21 @@ def create_mxd(settings_dictionary):
     del mxd
     output_message("MXD created")
 
+def get_extent_centre(inFeatures):
+    extent = arcpy.Describe(inFeatures).extent
+    X = round((extent.XMin + extent.XMax) / 2.0, 0)
+    Y = round((extent.YMin + extent.YMax) / 2.0, 0)
+    return (X, Y)
+
 def zip_shapefile(settings_dictionary):
     output_message("Zip shapefile...")
-    zip = zipfile.ZipFile(settings_dictionary["outputShapeFileFolderZipped"], 'w', zipfile.ZIP_DEFLATED)
+    zip = archive_writer.ArchiveWriter(settings_dictionary["outputShapeFileFolderZipped"], settings_dictionary["CompressionLevel"], settings_dictionary["CompressionWorkerCount"])
     rootlen = len(settings_dictionary["outputShapeFileFolder"]) + 1
     for base, dirs, files in os.walk(settings_dictionary["outputShapeFileFolder"]):
         for file in files:
             if not file.endswith('.lock'):
                 fn = os.path.join(base, file)
-                zip.write(fn,fn[rootlen:])
+                zip.add_file(fn,fn[rootlen:])
 
     zip.close()
     output_warning("Shapefile zipped to {}".format(settings_dictionary["outputShapeFileFolderZipped"]))
@@ -208,6 +328,37 @@ def export_shapefile(settings_dictionary):
     arcpy.FeatureClassToShapefile_conversion(settings_dictionary["outputFeatureClass"], settings_dictionary["outputShapeFileFolder"])
     output_message("Shapefile exported")
 
+def export_shapefile_to_zip(settings_dictionary):
+    output_message("Writing shapefile into zip...")
+    inFeatures = settings_dictionary["outputFeatureClass"]
+    shapefile_name = os.path.splitext(os.path.basename(settings_dictionary["outputShapeFile"]))[0]
+
+    field_name_list = list()
+    dbf_field_list = list()
+    for field in arcpy.ListFields(inFeatures):
+        dbf_field = shapefile_zip_writer.dbf_field_from_arcgis_field(field.name, field.type, field.length)
+        if dbf_field is not None:
+            field_name_list.append(field.name)
+            dbf_field_list.append(dbf_field)
+
+    # exportToString appends the coordinate domains after the WKT
+    projection_wkt = arcpy.Describe(inFeatures).spatialReference.exportToString().split(';')[0]
+
+    with shapefile_zip_writer.ShapefileZipWriter(settings_dictionary["outputShapeFileFolderZipped"], shapefile_name, dbf_field_list, projection_wkt, settings_dictionary["CompressionLevel"], settings_dictionary["CompressionWorkerCount"]) as writer:
+        with arcpy.da.SearchCursor(inFeatures, ['SHAPE@'] + field_name_list) as cursor:
+            for row in cursor:
+                rings = None
+                if row[0]:
+                    rings = polygon_rings.geometry_rings(row[0])
+                writer.add_record(rings, list(row[1:]))
+    record_count = writer.record_count
+
+    # Read the zip back, so a truncated or corrupt archive is never left looking complete
+    problem_list = shapefile_zip_writer.verify_shapefile_zip(settings_dictionary["outputShapeFileFolderZipped"], shapefile_name, writer)
+    if (len(problem_list) > 0):
+        raise Exception("Shapefile zip {} does not match what was written: {}".format(settings_dictionary["outputShapeFileFolderZipped"], '; '.join(problem_list)))
+    output_warning("Shapefile with {} polygons zipped to {}".format(record_count, settings_dictionary["outputShapeFileFolderZipped"]))
+
 def create_kmz(settings_dictionary):
     output_message("Creating KMZ...")
     arcpy.MakeFeatureLayer_management(settings_dictionary["outputFeatureClass"], settings_dictionary["temporaryLayer"])
@@ -230,13 +381,18 @@ def output_warning(message):
         print message
 	arcpy.AddWarning(message)
 
+def output_error(message):
+    if (Debug == True):
+        print message
+    arcpy.AddError(message)
+
 def remove_temp_file(temp_file_path):
     if (os.path.isfile(temp_file_path)):
         os.remove(temp_file_path)
 
 def tidy_up(settings_dictionary, ok):
     remove_temp_file(settings_dictionary["outputMXD"])
-    if (ok):
+    if (ok and os.path.isdir(settings_dictionary["outputShapeFileFolder"])):
         shutil.rmtree(settings_dictionary["outputShapeFileFolder"])
     arcpy.Delete_management(settings_dictionary["outputFeatureClass"])
     del settings_dictionary["outputShapeFileFolder"]
@@ -0,0 +1,82 @@
+import os
+import json
+import hashlib
+
+## Fingerprints the polygons selected for export so that a run whose selection has not
+## changed since the last successful run can reuse that run's artifacts instead of
+## rebuilding them. The manifest records the fingerprint, the published artifact paths and
+## the run identifier they were built with. That identifier is in the artifacts' file
+## names, the PDF title and the zip's member names, so the artifacts are reused as they are
+## rather than linked under a new run's names.
+
+class SelectionFingerprint:
+
+    ## Each row is digested as it is read; the digests are sorted before being combined so
+    ## the fingerprint does not depend on cursor order. A row is its OID, its geometry and a
+    ## few values that change whenever it is edited, such as the editor tracking date, rather
+    ## than every attribute.
+
+    def __init__(self, configuration_text=''):
+        ## configuration_text covers settings that change the artifacts without changing the polygons
+        self._configuration_text = configuration_text
+        self._row_digest_list = list()
+
+    def add_row(self, oid, geometry_bytes, edit_value_list):
+        row_digest = hashlib.sha1()
+        row_digest.update(text_bytes(repr(oid)))
+        row_digest.update(b'|')
+        row_digest.update(text_bytes(repr(edit_value_list)))
+        row_digest.update(b'|')
+        if geometry_bytes is not None:
+            row_digest.update(bytes(geometry_bytes))
+        self._row_digest_list.append(row_digest.digest())
+
+    @property
+    def count(self):
+        return len(self._row_digest_list)
+
+    def hexdigest(self):
+        fingerprint = hashlib.sha1()
+        fingerprint.update(text_bytes(self._configuration_text))
+        fingerprint.update(b'|')
+        fingerprint.update(text_bytes(str(self.count)))
+        for row_digest in sorted(self._row_digest_list):
+            fingerprint.update(row_digest)
+        return fingerprint.hexdigest()
+
+def text_bytes(text):
+    ## hashlib takes bytes, which repr and str already return on Python 2
+    if isinstance(text, bytes):
+        return text
+    return text.encode('utf-8')
+
+def load_export_manifest(manifest_file_path):
+    if not os.path.isfile(manifest_file_path):
+        return None
+    with open(manifest_file_path, 'r') as manifest_file:
+        return json.load(manifest_file)
+
+def save_export_manifest(manifest_file_path, fingerprint, run_identifier, output_folder, artifact_dictionary):
+    manifest = {"Fingerprint": fingerprint, "RunIdentifier": run_identifier, "OutputFolder": output_folder, "Artifacts": artifact_dictionary}
+    temporary_file_path = manifest_file_path + '.tmp'
+    with open(temporary_file_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+    if (os.path.isfile(manifest_file_path)):
+        os.remove(manifest_file_path)
+    os.rename(temporary_file_path, manifest_file_path)
+
+def reusable_artifacts(manifest, fingerprint, output_folder, artifact_name_list):
+    ## Returns the previous run's identifier and its artifact paths by name when they can be
+    ## reused, otherwise None. Each artifact must still exist and carry that run's identifier.
+    if manifest is None or manifest.get("Fingerprint") != fingerprint or manifest.get("OutputFolder") != output_folder:
+        return None
+    run_identifier = manifest.get("RunIdentifier")
+    if not run_identifier:
+        return None
+    artifact_dictionary = manifest.get("Artifacts", dict())
+    for artifact_name in artifact_name_list:
+        if not (artifact_name in artifact_dictionary and os.path.isfile(artifact_dictionary[artifact_name])):
+            return None
+        if not run_identifier in os.path.basename(artifact_dictionary[artifact_name]):
+            return None
+    return (run_identifier, artifact_dictionary)
@@ -0,0 +1,74 @@
+import numpy
+
+## Area-weighted polygon centroids computed for every polygon at once. The vertices of all
+## polygons are held in one flat array, with the ring and polygon number of each vertex, so
+## the shoelace sums are made with whole-array operations rather than a loop per polygon.
+##
+## Rings must be closed (last vertex repeats the first). Holes are handled by their opposite
+## winding, as ArcGIS stores them, so their area is subtracted from the part they sit in.
+
+class CentroidArrayBuilder(object):
+
+    ## Collects the rings of each polygon into the flat arrays used by polygon_centroids
+
+    def __init__(self):
+        self._coordinate_list = list()
+        self._ring_index_list = list()
+        self._polygon_index_list = list()
+        self._ring_count = 0
+        self._polygon_count = 0
+
+    def add_polygon(self, rings):
+        ## Returns the polygon's index in the centroid arrays
+        polygon_index = self._polygon_count
+        for ring in rings:
+            for x, y in ring:
+                self._coordinate_list.append((x, y))
+                self._ring_index_list.append(self._ring_count)
+                self._polygon_index_list.append(polygon_index)
+            self._ring_count = self._ring_count + 1
+        self._polygon_count = self._polygon_count + 1
+        return polygon_index
+
+    def centroids(self):
+        coordinates = numpy.array(self._coordinate_list, dtype=numpy.float64).reshape(-1, 2)
+        ring_index = numpy.array(self._ring_index_list, dtype=numpy.int64)
+        polygon_index = numpy.array(self._polygon_index_list, dtype=numpy.int64)
+        return polygon_centroids(coordinates, ring_index, polygon_index, self._polygon_count)
+
+def polygon_centroids(coordinates, ring_index, polygon_index, polygon_count):
+    ## Returns arrays of centroid x and y, one per polygon. Polygons with no area fall back to
+    ## the mean of their vertices, and polygons with no vertices get NaN.
+    if polygon_count == 0:
+        return (numpy.zeros(0), numpy.zeros(0))
+    vertex_count = numpy.bincount(polygon_index, minlength=polygon_count).astype(numpy.float64)
+
+    ## Shift each polygon to its first vertex, as national grid coordinates lose precision when multiplied
+    first_vertex = numpy.zeros((polygon_count, 2))
+    if len(coordinates) > 0:
+        first_position = numpy.ones(len(coordinates), dtype=bool)
+        first_position[1:] = polygon_index[1:] != polygon_index[:-1]
+        first_vertex[polygon_index[first_position]] = coordinates[first_position]
+    local = coordinates - first_vertex[polygon_index]
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        mean_x = numpy.bincount(polygon_index, weights=local[:, 0], minlength=polygon_count) / vertex_count
+        mean_y = numpy.bincount(polygon_index, weights=local[:, 1], minlength=polygon_count) / vertex_count
+
+        ## Only edges between consecutive vertices of the same ring count
+        x0 = local[:-1, 0]
+        y0 = local[:-1, 1]
+        x1 = local[1:, 0]
+        y1 = local[1:, 1]
+        cross = (x0 * y1 - x1 * y0) * (ring_index[:-1] == ring_index[1:])
+        edge_owner = polygon_index[:-1]
+        twice_area = numpy.bincount(edge_owner, weights=cross, minlength=polygon_count)
+        cross_magnitude = numpy.bincount(edge_owner, weights=numpy.abs(cross), minlength=polygon_count)
+        sum_x = numpy.bincount(edge_owner, weights=(x0 + x1) * cross, minlength=polygon_count)
+        sum_y = numpy.bincount(edge_owner, weights=(y0 + y1) * cross, minlength=polygon_count)
+
+        degenerate = numpy.abs(twice_area) <= 1e-12 * cross_magnitude
+        centroid_x = numpy.where(degenerate, mean_x, sum_x / (3.0 * twice_area))
+        centroid_y = numpy.where(degenerate, mean_y, sum_y / (3.0 * twice_area))
+
+    return (centroid_x + first_vertex[:, 0], centroid_y + first_vertex[:, 1])
@@ -0,0 +1,300 @@
+import os
+import shutil
+import struct
+import zipfile
+import hashlib
+import datetime
+import tempfile
+import archive_writer
+
+## Writes a polygon shapefile (.shp, .shx, .dbf, .prj and .cpg) straight into a zip archive.
+## The members are built in a local temporary folder, as the .shp and .shx headers can only
+## be completed once every record is known, so the only file written to the destination is
+## the zip itself.
+##
+## Geometries are lists of closed rings, each a list of (x, y) tuples, with exterior rings
+## clockwise and holes anticlockwise as ArcGIS stores them. None writes a null shape.
+##
+## The writer keeps the extent and a digest of the DBF records it wrote, so that
+## verify_shapefile_zip can read the zip back and check them as well as the record counts.
+
+NULL_SHAPE = 0
+POLYGON_SHAPE = 5
+
+class DbfField:
+
+    def __init__(self, name, field_type, length, decimals=0):
+        self._name = name
+        self._field_type = field_type
+        self._length = length
+        self._decimals = decimals
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def field_type(self):
+        return self._field_type
+
+    @property
+    def length(self):
+        return self._length
+
+    @property
+    def decimals(self):
+        return self._decimals
+
+    def format_value(self, value):
+        if value is None:
+            return b' ' * self._length
+        if (self._field_type == 'C'):
+            if not isinstance(value, bytes):
+                value = u'{}'.format(value).encode('utf-8')
+            value = truncate_utf8(value, self._length)
+            return value + b' ' * (self._length - len(value))
+        if (self._field_type == 'D'):
+            return value.strftime('%Y%m%d').encode('ascii')
+        if (self._field_type == 'L'):
+            return b'T' if value else b'F'
+        if (self._decimals > 0):
+            text = '{0:.{1}f}'.format(float(value), self._decimals)
+            if len(text) > self._length:
+                text = '{0:.{1}e}'.format(float(value), max(self._length - 8, 1))
+        else:
+            text = '{}'.format(int(value))
+        if len(text) > self._length:
+            raise ValueError('Value {} does not fit field {}'.format(value, self._name))
+        return text.rjust(self._length).encode('ascii')
+
+class ShapefileZipWriter:
+
+    def __init__(self, zip_file_path, shapefile_name, field_list, projection_wkt=None, compression_level=6, worker_count=0):
+        self._zip_file_path = zip_file_path
+        self._shapefile_name = shapefile_name
+        self._field_list = unique_dbf_field_names(field_list)
+        self._projection_wkt = projection_wkt
+        self._compression_level = compression_level
+        self._worker_count = worker_count
+        self._record_count = 0
+        self._shp_length = 100
+        self._extent = None
+        self._dbf_record_digest = hashlib.sha1()
+        self._shp_file = None
+        self._shx_file = None
+        self._dbf_file = None
+        self._member_folder = tempfile.mkdtemp(prefix='ShapefileZip_')
+        try:
+            self._shp_file = open(self._member_path('.shp'), 'wb')
+            self._shx_file = open(self._member_path('.shx'), 'wb')
+            self._dbf_file = open(self._member_path('.dbf'), 'wb')
+            ## Headers are rewritten with the real lengths and extent on close
+            self._shp_file.write(b'\0' * 100)
+            self._shx_file.write(b'\0' * 100)
+            self._write_dbf_header()
+        except:
+            self.abort()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        if exception_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def add_record(self, rings, value_list):
+        if (len(value_list) != len(self._field_list)):
+            raise ValueError('{} values given for {} fields'.format(len(value_list), len(self._field_list)))
+        self._record_count = self._record_count + 1
+        content = polygon_record_content(rings)
+        self._shx_file.write(struct.pack('>ii', self._shp_length // 2, len(content) // 2))
+        self._shp_file.write(struct.pack('>ii', self._record_count, len(content) // 2))
+        self._shp_file.write(content)
+        self._shp_length = self._shp_length + 8 + len(content)
+        if rings:
+            self._extent = union_extent(self._extent, rings_extent(rings))
+        dbf_record = b' ' + b''.join([field.format_value(value) for field, value in zip(self._field_list, value_list)])
+        self._dbf_record_digest.update(dbf_record)
+        self._dbf_file.write(dbf_record)
+
+    def close(self):
+        try:
+            self._finish_members()
+            with archive_writer.ArchiveWriter(self._zip_file_path, self._compression_level, self._worker_count) as zip_file:
+                for extension in ('.shp', '.shx', '.dbf', '.prj', '.cpg'):
+                    if (os.path.isfile(self._member_path(extension))):
+                        zip_file.add_file(self._member_path(extension), self._shapefile_name + extension)
+        finally:
+            shutil.rmtree(self._member_folder, True)
+
+    def abort(self):
+        for member_file in (self._shp_file, self._shx_file, self._dbf_file):
+            if member_file is not None:
+                member_file.close()
+        shutil.rmtree(self._member_folder, True)
+
+    @property
+    def record_count(self):
+        return self._record_count
+
+    @property
+    def extent(self):
+        ## None when every record is a null shape
+        return self._extent
+
+    @property
+    def dbf_record_digest(self):
+        return self._dbf_record_digest.hexdigest()
+
+    @property
+    def field_list(self):
+        return self._field_list
+
+    def _finish_members(self):
+        shape_type = POLYGON_SHAPE
+        extent = self._extent or (0.0, 0.0, 0.0, 0.0)
+        shx_length = 100 + 8 * self._record_count
+        self._shp_file.seek(0)
+        self._shp_file.write(main_file_header(self._shp_length, shape_type, extent))
+        self._shx_file.seek(0)
+        self._shx_file.write(main_file_header(shx_length, shape_type, extent))
+        self._dbf_file.write(b'\x1a')
+        self._dbf_file.seek(4)
+        self._dbf_file.write(struct.pack('<I', self._record_count))
+        for member_file in (self._shp_file, self._shx_file, self._dbf_file):
+            member_file.close()
+        if self._projection_wkt:
+            with open(self._member_path('.prj'), 'wb') as prj_file:
+                prj_file.write(self._projection_wkt.encode('ascii'))
+        with open(self._member_path('.cpg'), 'wb') as cpg_file:
+            cpg_file.write(b'UTF-8')
+
+    def _write_dbf_header(self):
+        today = datetime.date.today()
+        header_length = 32 + 32 * len(self._field_list) + 1
+        record_length = 1 + sum([field.length for field in self._field_list])
+        self._dbf_file.write(struct.pack('<BBBBIHH20x', 3, today.year - 1900, today.month, today.day, 0, header_length, record_length))
+        for field in self._field_list:
+            self._dbf_file.write(struct.pack('<11sc4xBB14x', field.name.encode('ascii'), field.field_type.encode('ascii'), field.length, field.decimals))
+        self._dbf_file.write(b'\r')
+
+    def _member_path(self, extension):
+        return os.path.join(self._member_folder, self._shapefile_name + extension)
+
+def main_file_header(file_length, shape_type, extent):
+    return (struct.pack('>i20xi', 9994, file_length // 2) +
+            struct.pack('<ii4d4d', 1000, shape_type, extent[0], extent[1], extent[2], extent[3], 0.0, 0.0, 0.0, 0.0))
+
+def polygon_record_content(rings):
+    if not rings:
+        return struct.pack('<i', NULL_SHAPE)
+    extent = rings_extent(rings)
+    part_index_list = list()
+    point_count = 0
+    for ring in rings:
+        part_index_list.append(point_count)
+        point_count = point_count + len(ring)
+    content = [struct.pack('<i4dii', POLYGON_SHAPE, extent[0], extent[1], extent[2], extent[3], len(rings), point_count)]
+    content.append(struct.pack('<{}i'.format(len(rings)), *part_index_list))
+    for ring in rings:
+        for x, y in ring:
+            content.append(struct.pack('<2d', x, y))
+    return b''.join(content)
+
+def rings_extent(rings):
+    x_list = [point[0] for ring in rings for point in ring]
+    y_list = [point[1] for ring in rings for point in ring]
+    return (min(x_list), min(y_list), max(x_list), max(y_list))
+
+def union_extent(extent_a, extent_b):
+    if extent_a is None:
+        return extent_b
+    return (min(extent_a[0], extent_b[0]), min(extent_a[1], extent_b[1]), max(extent_a[2], extent_b[2]), max(extent_a[3], extent_b[3]))
+
+def truncate_utf8(value, length):
+    ## Cut at a character boundary so the field never ends part way through a character
+    value = value[:length]
+    while len(value) > 0:
+        try:
+            value.decode('utf-8')
+            return value
+        except UnicodeDecodeError:
+            value = value[:-1]
+    return value
+
+def unique_dbf_field_names(field_list):
+    ## DBF names are at most 10 characters, so truncated names are made unique with a number
+    unique_field_list = list()
+    name_set = set()
+    for field in field_list:
+        name = field.name[:10]
+        number = 1
+        while name.upper() in name_set:
+            suffix = '_{}'.format(number)
+            name = field.name[:10 - len(suffix)] + suffix
+            number = number + 1
+        name_set.add(name.upper())
+        unique_field_list.append(DbfField(name, field.field_type, field.length, field.decimals))
+    return unique_field_list
+
+def dbf_field_from_arcgis_field(name, field_type, length=0):
+    ## Returns None for fields a shapefile cannot hold, following FeatureClassToShapefile's conversions
+    if (field_type == 'String'):
+        return DbfField(name, 'C', max(1, min(length, 254)))
+    if (field_type in ('Guid', 'GlobalID')):
+        return DbfField(name, 'C', 38)
+    if (field_type == 'SmallInteger'):
+        return DbfField(name, 'N', 6)
+    if (field_type == 'Integer'):
+        return DbfField(name, 'N', 10)
+    if (field_type == 'Single'):
+        return DbfField(name, 'N', 13, 11)
+    if (field_type == 'Double'):
+        return DbfField(name, 'N', 19, 11)
+    if (field_type == 'Date'):
+        return DbfField(name, 'D', 8)
+    return None
+
+def verify_shapefile_zip(zip_file_path, shapefile_name, writer):
+    ## Reads the zip back and returns a list of the ways it differs from what the writer wrote,
+    ## empty when it matches: record counts, shx offsets, the header and record extents, and
+    ## the DBF records, compared by digest
+    problem_list = list()
+    with zipfile.ZipFile(zip_file_path, 'r') as zip_file:
+        shp_data = zip_file.read(shapefile_name + '.shp')
+        shx_data = zip_file.read(shapefile_name + '.shx')
+        dbf_data = zip_file.read(shapefile_name + '.dbf')
+
+    shp_record_list = list()
+    record_extent = None
+    offset = 100
+    while offset + 8 <= len(shp_data):
+        content_length = struct.unpack('>i', shp_data[offset + 4:offset + 8])[0] * 2
+        shp_record_list.append((offset // 2, content_length // 2))
+        if (struct.unpack('<i', shp_data[offset + 8:offset + 12])[0] == POLYGON_SHAPE):
+            record_extent = union_extent(record_extent, struct.unpack('<4d', shp_data[offset + 12:offset + 44]))
+        offset = offset + 8 + content_length
+    shx_record_list = [struct.unpack('>ii', shx_data[offset:offset + 8]) for offset in range(100, len(shx_data) - 7, 8)]
+    dbf_record_count, dbf_header_length, dbf_record_length = struct.unpack('<4xIHH', dbf_data[:12])
+
+    for member_name, record_count in [('shp', len(shp_record_list)), ('shx', len(shx_record_list)), ('dbf', dbf_record_count)]:
+        if (record_count != writer.record_count):
+            problem_list.append('{} {} records, expected {}'.format(record_count, member_name, writer.record_count))
+    if (shx_record_list != shp_record_list):
+        problem_list.append('shx offsets do not match the shp records')
+
+    expected_extent = writer.extent
+    header_extent = struct.unpack('<4d', shp_data[36:68])
+    if (header_extent != (expected_extent or (0.0, 0.0, 0.0, 0.0))):
+        problem_list.append('shp header extent {}, expected {}'.format(header_extent, expected_extent))
+    if (record_extent != expected_extent):
+        problem_list.append('shp records extent {}, expected {}'.format(record_extent, expected_extent))
+
+    dbf_records = dbf_data[dbf_header_length:dbf_header_length + dbf_record_count * dbf_record_length]
+    if (len(dbf_records) != dbf_record_count * dbf_record_length or hashlib.sha1(dbf_records).hexdigest() != writer.dbf_record_digest):
+        problem_list.append('dbf field values differ from those written')
+    return problem_list
@@ -0,0 +1,199 @@
+import time
+import traceback
+import multiprocessing
+
+## Runs a small graph of named stages, each a module level function taking one picklable
+## argument. A stage starts once all the stages it depends on have completed, so
+## independent branches run at the same time, each stage in a worker process of its own.
+## When a stage fails, the stages that depend on it are skipped while the other branches
+## carry on. A worker process that dies without returning a result (a crash inside arcpy,
+## say) fails its stage in the same way, rather than leaving the run waiting for it.
+
+## Seconds between checks on the running stages
+poll_interval = 0.2
+
+class StageGraph:
+
+    def __init__(self):
+        self._stage_name_list = list()
+        self._stage_dictionary = dict()
+
+    def add_stage(self, stage_name, function, argument, dependency_list=()):
+        for dependency in dependency_list:
+            if not dependency in self._stage_dictionary:
+                raise ValueError('Stage {} depends on unknown stage {}'.format(stage_name, dependency))
+        self._stage_name_list.append(stage_name)
+        self._stage_dictionary[stage_name] = (function, argument, list(dependency_list))
+
+    def run(self, worker_count, stage_finished_function=None):
+        ## With a worker_count of 1 the stages run one at a time in this process.
+        ## stage_finished_function, if given, is called with each StageResult as it arrives.
+        if (worker_count <= 1):
+            return self._run_serially(stage_finished_function)
+        return self._run_in_processes(worker_count, stage_finished_function)
+
+    def _run_serially(self, stage_finished_function):
+        results = StageResults(self._stage_name_list)
+        for stage_name in self._stage_name_list:
+            function, argument, dependency_list = self._stage_dictionary[stage_name]
+            if (self._dependency_failed(results, dependency_list)):
+                results.skip(stage_name)
+                continue
+            result = run_stage((stage_name, function, argument))
+            results.add(result)
+            if stage_finished_function is not None:
+                stage_finished_function(result)
+        return results
+
+    def _run_in_processes(self, worker_count, stage_finished_function):
+        results = StageResults(self._stage_name_list)
+        pending_name_list = list(self._stage_name_list)
+        running_dictionary = dict()
+        try:
+            while len(pending_name_list) > 0 or len(running_dictionary) > 0:
+                for stage_name in list(pending_name_list):
+                    function, argument, dependency_list = self._stage_dictionary[stage_name]
+                    if (self._dependency_failed(results, dependency_list)):
+                        pending_name_list.remove(stage_name)
+                        results.skip(stage_name)
+                    elif (results.all_done(dependency_list) and len(running_dictionary) < worker_count):
+                        pending_name_list.remove(stage_name)
+                        running_dictionary[stage_name] = StageProcess(stage_name, function, argument)
+                if len(running_dictionary) == 0:
+                    break
+                finished_count = 0
+                for stage_name in list(running_dictionary):
+                    result = running_dictionary[stage_name].result()
+                    if result is not None:
+                        del running_dictionary[stage_name]
+                        finished_count = finished_count + 1
+                        results.add(result)
+                        if stage_finished_function is not None:
+                            stage_finished_function(result)
+                if finished_count == 0:
+                    time.sleep(poll_interval)
+        finally:
+            ## Only left running when the run itself is interrupted
+            for stage_process in running_dictionary.values():
+                stage_process.terminate()
+        return results
+
+    def _dependency_failed(self, results, dependency_list):
+        for dependency in dependency_list:
+            if (results.status(dependency) in ("failed", "skipped")):
+                return True
+        return False
+
+class StageProcess:
+
+    ## One stage running in a worker process, which sends its StageResult back through a pipe
+
+    def __init__(self, stage_name, function, argument):
+        self._stage_name = stage_name
+        self._start_time = time.time()
+        self._connection, child_connection = multiprocessing.Pipe(False)
+        self._process = multiprocessing.Process(target=run_stage_in_process, args=((stage_name, function, argument), child_connection))
+        self._process.daemon = True
+        self._process.start()
+        child_connection.close()
+
+    def result(self):
+        ## Returns the stage's StageResult once it has finished, otherwise None
+        if not self._connection.poll():
+            if (self._process.is_alive()):
+                return None
+            ## The result may have been sent just before the process exited
+            if not self._connection.poll():
+                return self._lost_result()
+        try:
+            result = self._connection.recv()
+        except EOFError:
+            return self._lost_result()
+        self._connection.close()
+        self._process.join()
+        return result
+
+    def terminate(self):
+        self._process.terminate()
+        self._process.join()
+        self._connection.close()
+
+    def _lost_result(self):
+        self._process.join()
+        self._connection.close()
+        return StageResult(self._stage_name, 'The worker process exited with code {} without finishing the stage'.format(self._process.exitcode), time.time() - self._start_time)
+
+class StageResult:
+
+    def __init__(self, stage_name, error, elapsed_seconds):
+        self._stage_name = stage_name
+        self._error = error
+        self._elapsed_seconds = elapsed_seconds
+
+    @property
+    def stage_name(self):
+        return self._stage_name
+
+    @property
+    def error(self):
+        return self._error
+
+    @property
+    def elapsed_seconds(self):
+        return self._elapsed_seconds
+
+    @property
+    def ok(self):
+        return self._error is None
+
+class StageResults:
+
+    def __init__(self, stage_name_list):
+        self._stage_name_list = list(stage_name_list)
+        self._status_dictionary = dict()
+        self._result_dictionary = dict()
+
+    def add(self, result):
+        self._result_dictionary[result.stage_name] = result
+        self._status_dictionary[result.stage_name] = "done" if result.ok else "failed"
+
+    def skip(self, stage_name):
+        self._status_dictionary[stage_name] = "skipped"
+
+    def status(self, stage_name):
+        return self._status_dictionary.get(stage_name)
+
+    def all_done(self, stage_name_list):
+        for stage_name in stage_name_list:
+            if (self.status(stage_name) != "done"):
+                return False
+        return True
+
+    def get_result(self, stage_name):
+        return self._result_dictionary.get(stage_name)
+
+    @property
+    def ok(self):
+        return self.all_done(self._stage_name_list)
+
+    @property
+    def failed_results(self):
+        return [self._result_dictionary[name] for name in self._stage_name_list if self.status(name) == "failed"]
+
+    @property
+    def skipped_names(self):
+        return [name for name in self._stage_name_list if self.status(name) == "skipped"]
+
+def run_stage_in_process(task, connection):
+    connection.send(run_stage(task))
+    connection.close()
+
+def run_stage(task):
+    stage_name, function, argument = task
+    start_time = time.time()
+    try:
+        function(argument)
+        error = None
+    except Exception as e:
+        error = '{}\n{}'.format(e, traceback.format_exc())
+    return StageResult(stage_name, error, time.time() - start_time)
@@ -0,0 +1,107 @@
+import os
+import sys
+import shutil
+import struct
+import datetime
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import export_fingerprint
+
+def rectangle_wkb(xmin, ymin, xmax, ymax):
+    ## Little endian WKB polygon with one ring, as SHAPE@WKB returns
+    point_list = [(xmin, ymin), (xmin, ymax), (xmax, ymax), (xmax, ymin), (xmin, ymin)]
+    return bytearray(struct.pack('<BIII', 1, 3, 1, len(point_list)) + b''.join([struct.pack('<dd', x, y) for x, y in point_list]))
+
+## (OID, geometry, last edited date) as read from the view
+ROW_LIST = [(1, rectangle_wkb(0, 0, 1, 1), [datetime.datetime(2026, 1, 1, 9, 0)]),
+            (2, rectangle_wkb(2, 0, 3, 1), [datetime.datetime(2026, 2, 1, 9, 0)]),
+            (3, None, [None])]
+
+def selection_fingerprint(row_list, configuration_text='Valid = 1|Native|last_edited_date'):
+    fingerprint = export_fingerprint.SelectionFingerprint(configuration_text)
+    for oid, geometry_bytes, edit_value_list in row_list:
+        fingerprint.add_row(oid, geometry_bytes, edit_value_list)
+    return fingerprint.hexdigest()
+
+class SelectionFingerprintTests(unittest.TestCase):
+
+    def test_row_order_independent(self):
+        self.assertEqual(selection_fingerprint(ROW_LIST), selection_fingerprint(list(reversed(ROW_LIST))))
+        self.assertEqual(selection_fingerprint(ROW_LIST), selection_fingerprint([ROW_LIST[1], ROW_LIST[2], ROW_LIST[0]]))
+
+    def test_changed_edit_date(self):
+        ## An attribute edit shows as a new last edited date
+        changed_row_list = [ROW_LIST[0], (2, ROW_LIST[1][1], [datetime.datetime(2026, 3, 1, 9, 0)]), ROW_LIST[2]]
+        self.assertNotEqual(selection_fingerprint(changed_row_list), selection_fingerprint(ROW_LIST))
+
+    def test_changed_geometry(self):
+        changed_row_list = [(1, rectangle_wkb(0, 0, 1, 1.5), ROW_LIST[0][2])] + ROW_LIST[1:]
+        self.assertNotEqual(selection_fingerprint(changed_row_list), selection_fingerprint(ROW_LIST))
+
+    def test_added_removed_or_renumbered_polygon(self):
+        fingerprint = selection_fingerprint(ROW_LIST)
+        self.assertNotEqual(selection_fingerprint(ROW_LIST[:2]), fingerprint)
+        self.assertNotEqual(selection_fingerprint(ROW_LIST + [(4, rectangle_wkb(4, 0, 5, 1), [None])]), fingerprint)
+        self.assertNotEqual(selection_fingerprint([(5,) + ROW_LIST[0][1:]] + ROW_LIST[1:]), fingerprint)
+
+    def test_changed_configuration(self):
+        self.assertNotEqual(selection_fingerprint(ROW_LIST, 'Valid = 1|ArcGIS|last_edited_date'), selection_fingerprint(ROW_LIST))
+
+    def test_text_values(self):
+        ## As when no edit date field is found and every attribute is fingerprinted
+        fingerprint = selection_fingerprint([(1, None, [u'Caf\xe9', 'SUB_1', 12, None])])
+        self.assertEqual(len(fingerprint), 40)
+        self.assertNotEqual(selection_fingerprint([(1, None, [u'Cafe', 'SUB_1', 12, None])]), fingerprint)
+
+class ReusableArtifactsTests(unittest.TestCase):
+
+    def setUp(self):
+        self._folder = tempfile.mkdtemp(prefix='ExportFingerprintTest_')
+        self._outbox_folder = os.path.join(self._folder, 'Outbox')
+        os.makedirs(self._outbox_folder)
+        self._manifest_file_path = os.path.join(self._folder, 'StorageExportManifest.json')
+        self._artifact_dictionary = dict()
+        for artifact_name, file_name in [("PDF", 'LandRegistryShape_StorageSiteSelection_20260101_0900.pdf'), ("KMZ", 'LandRegistryShape_StorageSiteSelection_20260101_0900.kmz')]:
+            self._artifact_dictionary[artifact_name] = os.path.join(self._outbox_folder, file_name)
+            with open(self._artifact_dictionary[artifact_name], 'w') as artifact_file:
+                artifact_file.write(artifact_name)
+        export_fingerprint.save_export_manifest(self._manifest_file_path, 'fingerprint', 'StorageSiteSelection_20260101_0900', self._outbox_folder, self._artifact_dictionary)
+
+    def tearDown(self):
+        shutil.rmtree(self._folder, True)
+
+    def reusable_artifacts(self, fingerprint='fingerprint', output_folder=None):
+        if output_folder is None:
+            output_folder = self._outbox_folder
+        manifest = export_fingerprint.load_export_manifest(self._manifest_file_path)
+        return export_fingerprint.reusable_artifacts(manifest, fingerprint, output_folder, ["PDF", "KMZ"])
+
+    def test_unchanged(self):
+        self.assertEqual(self.reusable_artifacts(), ('StorageSiteSelection_20260101_0900', self._artifact_dictionary))
+
+    def test_changed_fingerprint(self):
+        self.assertEqual(self.reusable_artifacts('changed'), None)
+
+    def test_other_output_folder(self):
+        self.assertEqual(self.reusable_artifacts(output_folder=os.path.join(self._outbox_folder, 'Debug')), None)
+
+    def test_missing_artifact(self):
+        os.remove(self._artifact_dictionary["KMZ"])
+        self.assertEqual(self.reusable_artifacts(), None)
+
+    def test_artifact_from_another_run(self):
+        ## Its names inside would not match the run identifier recorded for it
+        self._artifact_dictionary["KMZ"] = os.path.join(self._outbox_folder, 'LandRegistryShape_StorageSiteSelection_20251231_0900.kmz')
+        with open(self._artifact_dictionary["KMZ"], 'w') as artifact_file:
+            artifact_file.write("KMZ")
+        export_fingerprint.save_export_manifest(self._manifest_file_path, 'fingerprint', 'StorageSiteSelection_20260101_0900', self._outbox_folder, self._artifact_dictionary)
+        self.assertEqual(self.reusable_artifacts(), None)
+
+    def test_manifest_without_run_identifier(self):
+        export_fingerprint.save_export_manifest(self._manifest_file_path, 'fingerprint', None, self._outbox_folder, self._artifact_dictionary)
+        self.assertEqual(self.reusable_artifacts(), None)
+
+if __name__ == '__main__':
+    unittest.main()
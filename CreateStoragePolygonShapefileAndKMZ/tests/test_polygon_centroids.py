@@ -0,0 +1,85 @@
+import os
+import sys
+import math
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+try:
+    import numpy
+    import polygon_centroids
+except ImportError:
+    numpy = None
+
+def rectangle(xmin, ymin, xmax, ymax):
+    ## Clockwise, as ArcGIS stores exterior rings
+    return [(xmin, ymin), (xmin, ymax), (xmax, ymax), (xmax, ymin), (xmin, ymin)]
+
+def reverse(ring):
+    return list(reversed(ring))
+
+def polygon_centroid(rings):
+    builder = polygon_centroids.CentroidArrayBuilder()
+    builder.add_polygon(rings)
+    centroid_x_array, centroid_y_array = builder.centroids()
+    return (centroid_x_array[0], centroid_y_array[0])
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class PolygonCentroidTests(unittest.TestCase):
+
+    def assert_centroid(self, rings, expected_x, expected_y):
+        centroid_x, centroid_y = polygon_centroid(rings)
+        self.assertAlmostEqual(centroid_x, expected_x, places=6)
+        self.assertAlmostEqual(centroid_y, expected_y, places=6)
+
+    def test_unit_square(self):
+        self.assert_centroid([rectangle(0, 0, 1, 1)], 0.5, 0.5)
+
+    def test_offset_rectangle(self):
+        ## National grid sized coordinates
+        self.assert_centroid([rectangle(400000.0, 300000.0, 400010.0, 300004.0)], 400005.0, 300002.0)
+
+    def test_l_shape(self):
+        ## A 1 x 2 block with a 1 x 1 block beside its foot
+        l_shape = [(0, 0), (0, 2), (1, 2), (1, 1), (2, 1), (2, 0), (0, 0)]
+        self.assert_centroid([l_shape], 2.5 / 3, 2.5 / 3)
+
+    def test_hole(self):
+        ## A 4 x 4 square less a 1 x 1 hole, which winds the other way
+        self.assert_centroid([rectangle(0, 0, 4, 4), reverse(rectangle(1, 1, 2, 2))], (32 - 1.5) / 15.0, (32 - 1.5) / 15.0)
+
+    def test_multipart(self):
+        self.assert_centroid([rectangle(0, 0, 1, 1), rectangle(2, 0, 3, 1)], 1.5, 0.5)
+        ## Parts weighted by their area
+        self.assert_centroid([rectangle(0, 0, 1, 1), rectangle(10, 0, 13, 1)], (0.5 + 3 * 11.5) / 4, 0.5)
+
+    def test_clockwise_and_anticlockwise_rings(self):
+        ring = [(0, 0), (1, 3), (4, 1), (0, 0)]
+        self.assert_centroid([ring], 5 / 3.0, 4 / 3.0)
+        self.assert_centroid([reverse(ring)], 5 / 3.0, 4 / 3.0)
+
+    def test_no_area_uses_vertex_mean(self):
+        self.assert_centroid([[(0, 0), (2, 2), (0, 0)]], 2 / 3.0, 2 / 3.0)
+
+    def test_no_vertices(self):
+        centroid_x, centroid_y = polygon_centroid([])
+        self.assertTrue(math.isnan(centroid_x) and math.isnan(centroid_y))
+
+    def test_array_builder_matches_single_polygons(self):
+        polygon_list = [[rectangle(0, 0, 1, 1)],
+                        [],
+                        [rectangle(0, 0, 4, 4), reverse(rectangle(1, 1, 2, 2))],
+                        [rectangle(400000.0, 300000.0, 400010.0, 300004.0)]]
+        builder = polygon_centroids.CentroidArrayBuilder()
+        index_list = [builder.add_polygon(rings) for rings in polygon_list]
+        centroid_x_array, centroid_y_array = builder.centroids()
+        self.assertEqual(index_list, [0, 1, 2, 3])
+        for polygon_index, rings in enumerate(polygon_list):
+            centroid_x, centroid_y = polygon_centroid(rings)
+            if (math.isnan(centroid_x)):
+                self.assertTrue(math.isnan(centroid_x_array[polygon_index]))
+            else:
+                self.assertAlmostEqual(centroid_x_array[polygon_index], centroid_x, places=6)
+                self.assertAlmostEqual(centroid_y_array[polygon_index], centroid_y, places=6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import io
+import os
+import sys
+import shutil
+import zipfile
+import datetime
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+## The archive writer is shared by the tools from the Common folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, 'Common'))
+import shapefile_zip_writer
+try:
+    import shapefile
+except ImportError:
+    shapefile = None
+
+def rectangle(xmin, ymin, xmax, ymax):
+    ## Clockwise, as ArcGIS stores exterior rings
+    return [(xmin, ymin), (xmin, ymax), (xmax, ymax), (xmax, ymin), (xmin, ymin)]
+
+def hole(xmin, ymin, xmax, ymax):
+    return list(reversed(rectangle(xmin, ymin, xmax, ymax)))
+
+FIELD_LIST = [shapefile_zip_writer.DbfField('Site_Ident', 'C', 20),
+              shapefile_zip_writer.DbfField('Parcels', 'N', 10),
+              shapefile_zip_writer.DbfField('Area_ha', 'N', 19, 11),
+              shapefile_zip_writer.DbfField('Surveyed', 'D', 8),
+              shapefile_zip_writer.DbfField('Valid', 'L', 1)]
+
+RECORD_LIST = [([rectangle(400000.0, 300000.0, 400100.0, 300050.0), hole(400010.0, 300010.0, 400020.0, 300020.0)], [u'SUB_1 Caf\xe9', 12, 0.49, datetime.date(2026, 3, 1), True]),
+               ([rectangle(400200.0, 300000.0, 400210.0, 300010.0), rectangle(400300.5, 299990.25, 400310.0, 300005.0)], [u'SUB_2', 3, 0.0245, datetime.date(2025, 12, 31), False]),
+               (None, [None, None, None, None, None])]
+
+class ShapefileZipWriterTests(unittest.TestCase):
+
+    def setUp(self):
+        self._folder = tempfile.mkdtemp(prefix='ShapefileZipWriterTest_')
+        self._zip_file_path = os.path.join(self._folder, 'Storage.zip')
+
+    def tearDown(self):
+        shutil.rmtree(self._folder, True)
+
+    def write_zip(self):
+        with shapefile_zip_writer.ShapefileZipWriter(self._zip_file_path, 'Storage', FIELD_LIST, 'PROJCS["British_National_Grid"]', 6, 1) as writer:
+            for rings, value_list in RECORD_LIST:
+                writer.add_record(rings, value_list)
+        return writer
+
+    def rewrite_member(self, extension, change_data):
+        ## Rewrites the zip with one member changed, as a damaged copy would be
+        with zipfile.ZipFile(self._zip_file_path, 'r') as zip_file:
+            member_dictionary = dict([(name, zip_file.read(name)) for name in zip_file.namelist()])
+        member_dictionary['Storage' + extension] = change_data(member_dictionary['Storage' + extension])
+        with zipfile.ZipFile(self._zip_file_path, 'w') as zip_file:
+            for name in member_dictionary:
+                zip_file.writestr(name, member_dictionary[name])
+
+    def test_members(self):
+        self.write_zip()
+        with zipfile.ZipFile(self._zip_file_path, 'r') as zip_file:
+            self.assertEqual(sorted(zip_file.namelist()), ['Storage.cpg', 'Storage.dbf', 'Storage.prj', 'Storage.shp', 'Storage.shx'])
+            self.assertEqual(zip_file.read('Storage.prj'), b'PROJCS["British_National_Grid"]')
+
+    def test_verify_matching_zip(self):
+        writer = self.write_zip()
+        self.assertEqual(writer.extent, (400000.0, 299990.25, 400310.0, 300050.0))
+        self.assertEqual(shapefile_zip_writer.verify_shapefile_zip(self._zip_file_path, 'Storage', writer), [])
+
+    def test_verify_changed_field_value(self):
+        writer = self.write_zip()
+        self.rewrite_member('.dbf', lambda data: data.replace(b'SUB_2', b'SUB_3'))
+        self.assertEqual(shapefile_zip_writer.verify_shapefile_zip(self._zip_file_path, 'Storage', writer), ['dbf field values differ from those written'])
+
+    def test_verify_truncated_shp(self):
+        writer = self.write_zip()
+        ## Drops the null shape record and the second polygon's last point
+        self.rewrite_member('.shp', lambda data: data[:-12 - 16])
+        problem_list = shapefile_zip_writer.verify_shapefile_zip(self._zip_file_path, 'Storage', writer)
+        self.assertTrue('2 shp records, expected 3' in problem_list)
+        self.assertTrue('shx offsets do not match the shp records' in problem_list)
+
+    def test_verify_changed_extent(self):
+        writer = self.write_zip()
+        self.rewrite_member('.shp', lambda data: data[:36] + b'\0' * 8 + data[44:])
+        problem_list = shapefile_zip_writer.verify_shapefile_zip(self._zip_file_path, 'Storage', writer)
+        self.assertEqual(len(problem_list), 1)
+        self.assertTrue(problem_list[0].startswith('shp header extent'))
+
+    def test_failed_open_removes_member_folder(self):
+        temporary_folder = tempfile.tempdir
+        tempfile.tempdir = self._folder
+        try:
+            ## The members cannot be created in a folder that does not exist
+            self.assertRaises(IOError, shapefile_zip_writer.ShapefileZipWriter, self._zip_file_path, os.path.join('Missing', 'Storage'), FIELD_LIST)
+        finally:
+            tempfile.tempdir = temporary_folder
+        self.assertEqual(os.listdir(self._folder), [])
+
+    @unittest.skipIf(shapefile is None, 'pyshp is not installed')
+    def test_pyshp_reads_records(self):
+        self.write_zip()
+        with zipfile.ZipFile(self._zip_file_path, 'r') as zip_file:
+            reader = shapefile.Reader(shp=io.BytesIO(zip_file.read('Storage.shp')), shx=io.BytesIO(zip_file.read('Storage.shx')), dbf=io.BytesIO(zip_file.read('Storage.dbf')), encoding='utf-8')
+        self.assertEqual(len(reader), len(RECORD_LIST))
+        self.assertEqual([field[0] for field in reader.fields[1:]], [field.name for field in FIELD_LIST])
+        self.assertEqual(list(reader.bbox), [400000.0, 299990.25, 400310.0, 300050.0])
+        for shape, record, (rings, value_list) in zip(reader.shapes(), reader.records(), RECORD_LIST):
+            if rings is None:
+                self.assertEqual(shape.shapeType, shapefile.NULL)
+                self.assertEqual(list(record), [u'', None, None, None, None])
+                continue
+            self.assertEqual(shape.shapeType, shapefile.POLYGON)
+            self.assertEqual([tuple(point) for point in shape.points], [point for ring in rings for point in ring])
+            self.assertEqual(list(shape.parts), [0, len(rings[0])])
+            self.assertEqual(list(shape.bbox), list(shapefile_zip_writer.rings_extent(rings)))
+            self.assertEqual(record[0], value_list[0])
+            self.assertEqual(record[1], value_list[1])
+            self.assertAlmostEqual(record[2], value_list[2], places=11)
+            self.assertEqual(record[3], value_list[3])
+            self.assertEqual(record[4], value_list[4])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import stage_executor
+
+## Stage functions have to be module level so that worker processes can find them
+
+def write_marker(file_path):
+    with open(file_path, 'w') as marker_file:
+        marker_file.write('done')
+
+def check_marker(file_path):
+    if not os.path.isfile(file_path):
+        raise ValueError('{} does not exist yet'.format(file_path))
+
+def raise_error(argument):
+    raise ValueError('Stage failed on {}'.format(argument))
+
+def exit_process(exit_code):
+    ## As when arcpy crashes the worker, the process ends without returning a result
+    os._exit(exit_code)
+
+class StageGraphTests(unittest.TestCase):
+
+    def setUp(self):
+        self._folder = tempfile.mkdtemp(prefix='StageExecutorTest_')
+
+    def tearDown(self):
+        shutil.rmtree(self._folder, True)
+
+    def marker_path(self, name):
+        return os.path.join(self._folder, name)
+
+    def test_dependencies_run_first(self):
+        for worker_count in (1, 3):
+            graph = stage_executor.StageGraph()
+            graph.add_stage("Write", write_marker, self.marker_path('write{}'.format(worker_count)))
+            graph.add_stage("Check", check_marker, self.marker_path('write{}'.format(worker_count)), ["Write"])
+            graph.add_stage("Other", write_marker, self.marker_path('other{}'.format(worker_count)))
+            results = graph.run(worker_count)
+            self.assertTrue(results.ok)
+            self.assertEqual(results.failed_results, [])
+
+    def test_failed_stage_skips_dependents(self):
+        for worker_count in (1, 3):
+            finished_list = list()
+            graph = stage_executor.StageGraph()
+            graph.add_stage("Fail", raise_error, 'purpose')
+            graph.add_stage("After", write_marker, self.marker_path('after'), ["Fail"])
+            graph.add_stage("AfterThat", write_marker, self.marker_path('after_that'), ["After"])
+            graph.add_stage("Other", write_marker, self.marker_path('other'))
+            results = graph.run(worker_count, finished_list.append)
+            self.assertFalse(results.ok)
+            self.assertEqual([result.stage_name for result in results.failed_results], ["Fail"])
+            self.assertTrue('Stage failed on purpose' in results.get_result("Fail").error)
+            self.assertEqual(results.skipped_names, ["After", "AfterThat"])
+            self.assertEqual(results.status("Other"), "done")
+            self.assertEqual(sorted([result.stage_name for result in finished_list]), ["Fail", "Other"])
+            self.assertFalse(os.path.exists(self.marker_path('after')))
+
+    def test_lost_worker_fails_stage(self):
+        graph = stage_executor.StageGraph()
+        graph.add_stage("Crash", exit_process, 3)
+        graph.add_stage("After", write_marker, self.marker_path('after'), ["Crash"])
+        graph.add_stage("Other", write_marker, self.marker_path('other'))
+        results = graph.run(2)
+        self.assertEqual(results.status("Crash"), "failed")
+        self.assertTrue('exited with code 3' in results.get_result("Crash").error)
+        self.assertEqual(results.skipped_names, ["After"])
+        self.assertEqual(results.status("Other"), "done")
+        self.assertTrue(os.path.isfile(self.marker_path('other')))
+
+    def test_worker_count_limits_running_stages(self):
+        graph = stage_executor.StageGraph()
+        for index in range(0, 5):
+            graph.add_stage("Stage{}".format(index), write_marker, self.marker_path('stage{}'.format(index)))
+        results = graph.run(2)
+        self.assertTrue(results.ok)
+        self.assertEqual(len(os.listdir(self._folder)), 5)
+
+    def test_unknown_dependency(self):
+        graph = stage_executor.StageGraph()
+        self.assertRaises(ValueError, graph.add_stage, "After", write_marker, 'unused', ["Missing"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,9 +2,96 @@ import arcpy
 import os
 import sys
 import datetime
+import multiprocessing
+import multiprocessing.util
+import tempfile
+import shutil
+## Modules shared by the tools live in the Common folder alongside this one
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'Common'))
+import substation_kml_writer
+import feature_buckets
+import kmz_manifest
+import run_journal
+import output_staging
+import polygon_rings
 
 Debug = False
 
+class TemplateCache:
+
+    def __init__(self, settings_dictionary):
+        self._template_mxd_path = settings_dictionary["BaseTemplateMxd"]
+        self._local_template_folder = tempfile.mkdtemp(prefix='SubstationTemplate_', dir=settings_dictionary["ScratchFolder"])
+        self._local_template_mxd_path = os.path.join(self._local_template_folder, os.path.basename(self._template_mxd_path))
+        self._substation_base_layer_path = settings_dictionary["BaseTemplateSubstationLayer"]
+        self._polygons_base_layer_path = settings_dictionary["BaseTemplatePolygonsLayer"]
+        self._substation_base_layer = None
+        self._polygons_base_layer = None
+        self._data_frame_name = None
+        self._loads_avoided = 0
+
+    def new_map_document(self):
+        if (os.path.isfile(self._local_template_mxd_path)):
+            self._loads_avoided = self._loads_avoided + 1
+        else:
+            output_message('Copying base template MXD ({}) to {}...'.format(self._template_mxd_path, self._local_template_mxd_path))
+            shutil.copyfile(self._template_mxd_path, self._local_template_mxd_path)
+        return arcpy.mapping.MapDocument(self._local_template_mxd_path)
+
+    def get_data_frame(self, mxd):
+        if (self._data_frame_name is None):
+            data_frame_list = arcpy.mapping.ListDataFrames(mxd, "la*")
+            if len(data_frame_list) == 0:
+                return None
+            self._data_frame_name = data_frame_list[0].name
+            return data_frame_list[0]
+        return arcpy.mapping.ListDataFrames(mxd, self._data_frame_name)[0]
+
+    @property
+    def substation_base_layer(self):
+        if (self._substation_base_layer is None):
+            self._substation_base_layer = arcpy.mapping.Layer(self._substation_base_layer_path)
+        else:
+            self._loads_avoided = self._loads_avoided + 1
+        return self._substation_base_layer
+
+    @property
+    def polygons_base_layer(self):
+        if (self._polygons_base_layer is None):
+            self._polygons_base_layer = arcpy.mapping.Layer(self._polygons_base_layer_path)
+        else:
+            self._loads_avoided = self._loads_avoided + 1
+        return self._polygons_base_layer
+
+    @property
+    def loads_avoided(self):
+        return self._loads_avoided
+
+    def close(self):
+        self._substation_base_layer = None
+        self._polygons_base_layer = None
+        shutil.rmtree(self._local_template_folder, True)
+
+## Template cache for the current process, created on first use
+template_cache = None
+
+def get_template_cache(settings_dictionary):
+    global template_cache
+    if (template_cache is None):
+        template_cache = TemplateCache(settings_dictionary)
+    return template_cache
+
+def template_loads_avoided():
+    if (template_cache is None):
+        return 0
+    return template_cache.loads_avoided
+
+def close_template_cache():
+    global template_cache
+    if (template_cache is not None):
+        template_cache.close()
+        template_cache = None
+
 def main():
     settings_dictionary = create_settings_dictionary()
     create_substation_kmzs(settings_dictionary)
@@ -33,6 +120,21 @@ def create_settings_dictionary():
     settings_dictionary["subStationStatusWhereClause"] = "Status IS NOT NULL"
     settings_dictionary["polygonValidWhereClause"] = 'Valid = 1'
     settings_dictionary["substationLoopWarningEveryXSubstations"] = 3
+    settings_dictionary["ScratchFolder"] = tempfile.gettempdir() ## Temporary MXDs are built on local disk
+    settings_dictionary["StagingRootFolder"] = os.path.join(tempfile.gettempdir(), 'SubstationKmzStaging') ## KMZs are staged here per run and published to the OutputFolder when the run ends
+    settings_dictionary["WorkerCount"] = 1 ## 1 processes substations serially, 0 uses one worker per CPU
+    settings_dictionary["OutputEngine"] = "MapToKML" ## "MapToKML" renders a temporary MXD, "Native" writes the KML directly from the feature classes
+    settings_dictionary["PolygonNameField"] = 'Site_Identifier'
+    settings_dictionary["IncrementalMode"] = not "--full-rebuild" in sys.argv ## Only rebuild substations whose fingerprint has changed since the last run
+    settings_dictionary["ManifestFilePath"] = os.path.join(tempfile.gettempdir(), 'SubstationKmzManifest.json') ## Kept on local disk, out of the user-facing Outbox; without it the next run rebuilds every substation
+    settings_dictionary["JournalFilePath"] = os.path.join(tempfile.gettempdir(), 'SubstationKmzJournal.jsonl') ## Kept on local disk with the staged KMZs it resumes, as it is synced for every substation
+    settings_dictionary["ResumeMode"] = "--resume" in sys.argv ## Continue the last run, processing the substations its journal still has pending
+    settings_dictionary["RetryFailedMode"] = "--retry-failed" in sys.argv ## Reprocess the substations the last run's journal has as failed
+    settings_dictionary["BucketSpillThreshold"] = 200000 ## Features held in memory by the Native engine before spilling to local disk
+    settings_dictionary["CompressionLevel"] = 6 ## Deflate level for Native engine KMZs, 0 stores doc.kml uncompressed
+    ## Native engine styles, matching the symbology of BaseTemplateSubstationLayer and BaseTemplatePolygonsLayer
+    settings_dictionary["SubstationKmlStyle"] = substation_kml_writer.KmlStyle('substation', substation_kml_writer.kml_colour(0, 0, 255), 2, icon_href='http://maps.google.com/mapfiles/kml/shapes/triangle.png')
+    settings_dictionary["PolygonsKmlStyle"] = substation_kml_writer.KmlStyle('polygons', substation_kml_writer.kml_colour(255, 0, 0), 2)
 
     return settings_dictionary
 
@@ -48,26 +150,263 @@ def get_current_timestamp():
 
 def create_substation_kmzs(settings_dictionary):
     output_warning('Creating substation KMZs in {}'.format(settings_dictionary["OutputFolder"]))
-    substation_name_list = get_substation_name_list(settings_dictionary)
+    journal = run_journal.RunJournal(settings_dictionary["JournalFilePath"])
+    resuming = False
+    if (settings_dictionary["ResumeMode"] or settings_dictionary["RetryFailedMode"]):
+        resuming = resume_from_journal(settings_dictionary, journal)
+    ## Keyed on the run's DateTimeStamp, so a resumed run publishes the KMZs staged before it stopped
+    staging_folder = os.path.join(settings_dictionary["StagingRootFolder"], settings_dictionary["DateTimeStamp"])
+    if not resuming:
+        shutil.rmtree(staging_folder, True)
+    staging = output_staging.OutputStaging(settings_dictionary["OutputFolder"], staging_folder)
+    settings_dictionary["StagingFolder"] = staging.staging_folder
+    ## Temporary MXDs, including each worker's, are made in one folder for the run that is removed when it ends
+    run_scratch_folder = tempfile.mkdtemp(prefix='SubstationKmz_', dir=settings_dictionary["ScratchFolder"])
+    settings_dictionary["ScratchFolder"] = run_scratch_folder
+    ## The staging folder is removed even if the run stops with an error, after which --resume remakes
+    ## the substations it had done. Only a run that is killed leaves its staged KMZs for --resume.
+    try:
+        ## Each feature class is scanned once: the Native engine fingerprints the features as it loads them
+        fingerprints = None
+        if (settings_dictionary["IncrementalMode"]):
+            fingerprints = kmz_manifest.FingerprintBuilder()
+        if (settings_dictionary["OutputEngine"] == "Native"):
+            substation_name_list = load_substation_features(settings_dictionary, fingerprints)
+        elif (fingerprints is not None):
+            substation_name_list = read_substation_fingerprints(settings_dictionary, fingerprints)
+        else:
+            substation_name_list = get_substation_name_list(settings_dictionary)
+        if (fingerprints is not None):
+            fingerprint_dictionary = substation_fingerprint_dictionary(substation_name_list, fingerprints)
+        substation_total = len(substation_name_list)
+        create_kmz_directory(settings_dictionary)
+        worker_count = get_worker_count(settings_dictionary)
+        if (settings_dictionary["IncrementalMode"]):
+            manifest = kmz_manifest.KmzManifest(settings_dictionary["ManifestFilePath"], settings_dictionary["OutputEngine"], template_fingerprint(settings_dictionary))
+            substation_name_list = reuse_unchanged_kmzs(settings_dictionary, staging, manifest, substation_name_list, fingerprint_dictionary)
+        if (resuming):
+            substation_name_list = substations_to_resume(settings_dictionary, journal, substation_name_list)
+        else:
+            journal.start(settings_dictionary["DateTimeStamp"], [substation_name for substation_name in substation_name_list if substation_name])
+        output_warning('{} substations to be processed...'.format(len(substation_name_list)))
+        if (worker_count > 1):
+            failed_substation_list, loads_avoided = process_substations_in_parallel(settings_dictionary, journal, substation_name_list, worker_count)
+        else:
+            failed_substation_list = process_substations_serially(settings_dictionary, journal, substation_name_list)
+            loads_avoided = template_loads_avoided()
+        publish_kmzs(settings_dictionary, staging)
+    finally:
+        close_substation_features(settings_dictionary)
+        close_template_cache()
+        shutil.rmtree(run_scratch_folder, True)
+        staging.discard()
+    if (settings_dictionary["IncrementalMode"]):
+        record_rebuilt_kmzs(settings_dictionary, manifest, journal.done_names, fingerprint_dictionary)
+    report_substation_failures(failed_substation_list, substation_total)
+    output_message('{} template loads avoided by the template cache'.format(loads_avoided))
+    output_warning('Journal {}: {} done, {} failed, {} pending'.format(settings_dictionary["JournalFilePath"], len(journal.done_names), len(journal.failed_names), len(journal.pending_names)))
+
+def resume_from_journal(settings_dictionary, journal):
+    if not journal.load():
+        output_warning('No journal found at {}, starting a new run'.format(settings_dictionary["JournalFilePath"]))
+        return False
+    ## Resumed runs write into the original run's output folder
+    settings_dictionary["DateTimeStamp"] = journal.date_time_stamp
+    output_warning('Resuming run {}: {} done, {} failed, {} pending'.format(journal.date_time_stamp, len(journal.done_names), len(journal.failed_names), len(journal.pending_names)))
+    return True
+
+def publish_kmzs(settings_dictionary, staging):
+    output_message("Publishing KMZs to {}...".format(substation_kmz_directory_path(settings_dictionary)))
+    published_file_list = staging.publish()
+    output_warning('{} KMZs published to {}'.format(len(published_file_list), substation_kmz_directory_path(settings_dictionary)))
+
+def substations_to_resume(settings_dictionary, journal, substation_name_list):
+    ## Substations done by a run on another machine, whose staged KMZs are not here, are made again
+    kmz_exists = lambda substation_name: os.path.isfile(staged_substation_kmz_file_path(settings_dictionary, substation_name)) or os.path.isfile(substation_kmz_file_path(settings_dictionary, substation_name))
+    resume_name_set = journal.names_to_resume(settings_dictionary["ResumeMode"], settings_dictionary["RetryFailedMode"], kmz_exists)
+    return [substation_name for substation_name in substation_name_list if substation_name in resume_name_set]
+
+def reuse_unchanged_kmzs(settings_dictionary, staging, manifest, substation_name_list, fingerprint_dictionary):
+    output_message("Checking substation fingerprints against {}...".format(settings_dictionary["ManifestFilePath"]))
+    if (manifest.template_changed):
+        output_warning('The templates or styles have changed since the last run, all substations will be rebuilt')
+    rebuild_name_list = list()
+    for substation_name in substation_name_list:
+        if (substation_name):
+            fingerprint = fingerprint_dictionary[substation_name]
+            if (manifest.is_unchanged(substation_name, fingerprint)):
+                kmz_file_path = substation_kmz_file_path(settings_dictionary, substation_name)
+                staging.add_existing(manifest.previous_kmz_file_path(substation_name), kmz_file_path)
+                manifest.record(substation_name, fingerprint, kmz_file_path)
+                continue
+        rebuild_name_list.append(substation_name)
+
+    output_message('{} unchanged substation KMZs reused'.format(len(substation_name_list) - len(rebuild_name_list)))
+    for substation_name in manifest.record_deleted_substations(fingerprint_dictionary.keys()):
+        output_warning('Substation {} has been deleted, its KMZ has been dropped'.format(substation_name))
+    return rebuild_name_list
+
+def read_substation_fingerprints(settings_dictionary, fingerprints):
+    ## Streams each feature class once, keeping a running fingerprint per substation rather than
+    ## its features. Every attribute column is included, as MapToKML writes them into the KMZ.
+    substation_name_list = list()
+
+    output_message("Fingerprinting substations...")
+    fields = substation_fingerprint_fields(settings_dictionary)
+    with arcpy.da.SearchCursor(settings_dictionary["SubstationFeatureClassPath"], fields, settings_dictionary["subStationStatusWhereClause"], kml_spatial_reference()) as cursor:
+        for row in cursor:
+            if row[1]:
+                substation_name_list.append(row[0])
+            if row[0]:
+                fingerprints.add(row[0], row)
+
+    output_message("Fingerprinting polygons...")
+    fields = polygon_fingerprint_fields(settings_dictionary)
+    with arcpy.da.SearchCursor(settings_dictionary["PolygonFeatureClassPath"], fields, settings_dictionary["polygonValidWhereClause"], kml_spatial_reference()) as cursor:
+        for row in cursor:
+            if row[0]:
+                fingerprints.add(row[0], row)
+
+    return substation_name_list
+
+def substation_fingerprint_fields(settings_dictionary):
+    ## Name, Status and SHAPE@XY come first, as load_substation_features reads them by position
+    fields = ['Name', 'Status', 'SHAPE@XY']
+    return fields + attribute_field_names(settings_dictionary["SubstationFeatureClassPath"], fields)
+
+def polygon_fingerprint_fields(settings_dictionary):
+    ## SubStation and SHAPE@WKB come first, as load_substation_features reads them by position
+    fields = ['SubStation', 'SHAPE@WKB']
+    return fields + attribute_field_names(settings_dictionary["PolygonFeatureClassPath"], fields)
+
+def substation_fingerprint_dictionary(substation_name_list, fingerprints):
+    fingerprint_dictionary = dict()
+    for substation_name in substation_name_list:
+        if (substation_name):
+            fingerprint_dictionary[substation_name] = fingerprints.fingerprint(substation_name)
+    return fingerprint_dictionary
+
+def attribute_field_names(feature_class_path, read_field_list):
+    ## Object IDs are left out, as reloading the same features renumbers them
+    read_field_set = set([field_name.upper() for field_name in read_field_list])
+    field_name_list = list()
+    for field in arcpy.ListFields(feature_class_path):
+        if not (field.type in ['OID', 'Geometry', 'Blob', 'Raster'] or field.name.upper() in read_field_set):
+            field_name_list.append(field.name)
+    return field_name_list
+
+def template_fingerprint(settings_dictionary):
+    if (settings_dictionary["OutputEngine"] == "Native"):
+        return kmz_manifest.template_fingerprint([], [
+            settings_dictionary["SubstationKmlStyle"].to_kml(),
+            settings_dictionary["PolygonsKmlStyle"].to_kml(),
+            settings_dictionary["CompressionLevel"]])
+    return kmz_manifest.template_fingerprint([
+        settings_dictionary["BaseTemplateMxd"],
+        settings_dictionary["BaseTemplateSubstationLayer"],
+        settings_dictionary["BaseTemplatePolygonsLayer"]], [])
+
+def record_rebuilt_kmzs(settings_dictionary, manifest, built_name_list, fingerprint_dictionary):
+    ## Only substations the journal has as done are recorded, so that the next run rebuilds any others
+    for substation_name in built_name_list:
+        if (substation_name in fingerprint_dictionary):
+            manifest.record(substation_name, fingerprint_dictionary[substation_name], substation_kmz_file_path(settings_dictionary, substation_name))
+    manifest.save()
+
+def get_worker_count(settings_dictionary):
+    worker_count = settings_dictionary["WorkerCount"]
+    if (worker_count <= 0):
+        worker_count = multiprocessing.cpu_count()
+    return worker_count
+
+def process_substations_serially(settings_dictionary, journal, substation_name_list):
+    failed_substation_list = list()
     substation_number = 1
     substation_total = len(substation_name_list)
-    output_warning('{} substations to be processed...'.format(substation_total))
     for substation_name in substation_name_list:
         if (substation_name):
-            process_substation(settings_dictionary, substation_name)
+            error = process_substation(settings_dictionary, substation_name)
+            journal.record(substation_name, error)
+            if (error):
+                output_error('Error whilst creating KMZ for {}: {}'.format(substation_name, error))
+                failed_substation_list.append((substation_name, error))
             if (substation_number%settings_dictionary["substationLoopWarningEveryXSubstations"] == 0):
                 output_warning('Processed {} out of {}...'.format(substation_number, substation_total))
         else:
             output_warning('Null substation name found for substation {}'.format(substation_number))
         substation_number = substation_number + 1
+    return failed_substation_list
+
+def process_substations_in_parallel(settings_dictionary, journal, substation_name_list, worker_count):
+    output_warning('Processing substations with {} workers...'.format(worker_count))
+    failed_substation_list = list()
+    named_substation_list = list()
+    substation_number = 1
+    for substation_name in substation_name_list:
+        if (substation_name):
+            named_substation_list.append(substation_name)
+        else:
+            output_warning('Null substation name found for substation {}'.format(substation_number))
+        substation_number = substation_number + 1
+
+    substation_total = len(named_substation_list)
+    loads_avoided_by_worker = dict()
+    pool = multiprocessing.Pool(worker_count, initialise_substation_worker, (settings_dictionary,))
+    try:
+        substation_number = 1
+        for substation_name, error, worker_id, worker_loads_avoided in pool.imap_unordered(process_substation_in_worker, named_substation_list):
+            loads_avoided_by_worker[worker_id] = max(worker_loads_avoided, loads_avoided_by_worker.get(worker_id, 0))
+            journal.record(substation_name, error)
+            if (error):
+                output_error('Error whilst creating KMZ for {}: {}'.format(substation_name, error))
+                failed_substation_list.append((substation_name, error))
+            if (substation_number%settings_dictionary["substationLoopWarningEveryXSubstations"] == 0):
+                output_warning('Processed {} out of {}...'.format(substation_number, substation_total))
+            substation_number = substation_number + 1
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return (failed_substation_list, sum(loads_avoided_by_worker.values()))
+
+## Settings for the current worker process, each with its own folder in the run's scratch folder so temporary MXDs never collide
+worker_settings_dictionary = None
+
+def initialise_substation_worker(settings_dictionary):
+    global worker_settings_dictionary
+    worker_settings_dictionary = dict(settings_dictionary)
+    worker_settings_dictionary["ScratchFolder"] = tempfile.mkdtemp(prefix='Worker_', dir=settings_dictionary["ScratchFolder"])
+    ## Run as the worker process exits, after the pool is closed
+    multiprocessing.util.Finalize(None, close_template_cache, exitpriority=0)
+
+def process_substation_in_worker(substation_name):
+    error = process_substation(worker_settings_dictionary, substation_name)
+    return (substation_name, error, os.getpid(), template_loads_avoided())
+
+def report_substation_failures(failed_substation_list, substation_total):
+    if (len(failed_substation_list) == 0):
+        output_warning('All {} substations processed successfully'.format(substation_total))
+        return
+    ## Each error has already been reported as it happened, so only the names are listed here
+    output_warning('{} out of {} substations failed: {}'.format(len(failed_substation_list), substation_total, ', '.join([substation_name for substation_name, error in failed_substation_list])))
 
 def process_substation(settings_dictionary, substation_name):
     try:
-        create_mxd_for_substation(settings_dictionary, substation_name)
-        export_mxd_to_kmz(settings_dictionary, substation_name)
-        remove_mxd_for_substation(settings_dictionary, substation_name)
+        if (settings_dictionary["OutputEngine"] == "Native"):
+            export_substation_to_kmz_natively(settings_dictionary, substation_name)
+        else:
+            create_mxd_for_substation(settings_dictionary, substation_name)
+            export_mxd_to_kmz(settings_dictionary, substation_name)
+            remove_mxd_for_substation(settings_dictionary, substation_name)
     except Exception as e:
-        output_error('Error whilst creating KMZ for {}: {}'.format(substation_name, e))
+        ## A partly written KMZ must not be published. The error is reported by the caller, as a worker process's messages do not reach the tool
+        staged_kmz_file_path = staged_substation_kmz_file_path(settings_dictionary, substation_name)
+        if (os.path.isfile(staged_kmz_file_path)):
+            os.remove(staged_kmz_file_path)
+        return str(e)
+    return None
 
 def get_substation_name_list(settings_dictionary):
     substation_name_list = list()
@@ -80,20 +419,71 @@ def get_substation_name_list(settings_dictionary):
 
     return substation_name_list
 
+def load_substation_features(settings_dictionary, fingerprints=None):
+    ## Reads the substation and sketch polygon classes once each, bucketing the features by substation
+    ## name. Given a FingerprintBuilder, the same scans also fingerprint each substation, with the
+    ## same rows as read_substation_fingerprints.
+    substation_name_list = list()
+    substation_point_buckets = feature_buckets.FeatureBuckets(settings_dictionary["BucketSpillThreshold"])
+    polygon_buckets = feature_buckets.FeatureBuckets(settings_dictionary["BucketSpillThreshold"])
+    settings_dictionary["SubstationPointBuckets"] = substation_point_buckets
+    settings_dictionary["PolygonBuckets"] = polygon_buckets
+
+    output_message("Reading substations...")
+    fields = ['Name', 'Status', 'SHAPE@XY']
+    if fingerprints is not None:
+        fields = substation_fingerprint_fields(settings_dictionary)
+    with arcpy.da.SearchCursor(settings_dictionary["SubstationFeatureClassPath"], fields, settings_dictionary["subStationStatusWhereClause"], kml_spatial_reference()) as cursor:
+        for row in cursor:
+            if row[1]:
+                substation_name_list.append(row[0])
+            if row[0] and row[2]:
+                substation_point_buckets.add(row[0], (row[0], row[2]))
+            if row[0] and fingerprints is not None:
+                fingerprints.add(row[0], row)
+
+    output_message("Reading polygons...")
+    ## The geometry and name are read after any fingerprint fields, and left out of the fingerprinted row
+    fields = ['SubStation']
+    if fingerprints is not None:
+        fields = polygon_fingerprint_fields(settings_dictionary)
+    fingerprint_field_count = len(fields)
+    fields = fields + ['SHAPE@', settings_dictionary["PolygonNameField"]]
+    with arcpy.da.SearchCursor(settings_dictionary["PolygonFeatureClassPath"], fields, settings_dictionary["polygonValidWhereClause"], kml_spatial_reference()) as cursor:
+        for row in cursor:
+            geometry = row[fingerprint_field_count]
+            if row[0] and geometry:
+                polygon_buckets.add(row[0], (row[fingerprint_field_count + 1], polygon_rings.geometry_parts(geometry)))
+            if row[0] and fingerprints is not None:
+                fingerprints.add(row[0], row[:fingerprint_field_count])
+
+    output_message('{} substation points and {} polygons read'.format(substation_point_buckets.feature_count, polygon_buckets.feature_count))
+    if (polygon_buckets.spilled):
+        output_message('Polygon buckets exceeded {} features and were spilled to local disk'.format(settings_dictionary["BucketSpillThreshold"]))
+
+    return substation_name_list
+
+def close_substation_features(settings_dictionary):
+    for key in ["SubstationPointBuckets", "PolygonBuckets"]:
+        if key in settings_dictionary:
+            settings_dictionary[key].close()
+            del settings_dictionary[key]
+
 def create_mxd_for_substation(settings_dictionary, substation_name):
     output_message("Creating temporary MXD for %s..." %(substation_name))
 
-    arcpy.env.workspace = settings_dictionary["OutputFolder"]
+    arcpy.env.workspace = settings_dictionary["ScratchFolder"]
     output_message('Opening base template MXD ({})...'.format(settings_dictionary["BaseTemplateMxd"])) #SDCBDBEUG
-    mxd = arcpy.mapping.MapDocument(settings_dictionary["BaseTemplateMxd"])
+    cache = get_template_cache(settings_dictionary)
+    mxd = cache.new_map_document()
     if not mxd:
         output_error('Cannot load base template MXD ({})'.format(settings_dictionary["BaseTemplateMxd"]))
         return
 
     output_message('Getting Layers data frame...') #SDCBDBEUG
-    data_frame_list = arcpy.mapping.ListDataFrames(mxd, "la*")
+    data_frame = cache.get_data_frame(mxd)
 
-    if len(data_frame_list) == 0:
+    if data_frame is None:
         output_error('No data frames found for Layers in base template MXD ({})'.format(settings_dictionary["BaseTemplateMxd"]))
         return
 
@@ -104,9 +494,7 @@ def create_mxd_for_substation(settings_dictionary, substation_name):
         substation_layer,
         substation_where_clause(settings_dictionary, substation_name))
     substation_layer_object = arcpy.mapping.Layer(substation_layer)
-    substation_base_layer = arcpy.mapping.Layer(settings_dictionary["BaseTemplateSubstationLayer"])
-    output_message('Selecting data frame...')  # SDCBDBEUG
-    data_frame = data_frame_list[0]
+    substation_base_layer = cache.substation_base_layer
     output_message('Updating layer...')  # SDCBDBEUG
     arcpy.mapping.UpdateLayer(data_frame, substation_layer_object, substation_base_layer, True)
     output_message('Adding layer...')  # SDCBDBEUG
@@ -122,7 +510,7 @@ def create_mxd_for_substation(settings_dictionary, substation_name):
         polygons_layer,
         polygons_where_clause(settings_dictionary, substation_name))
     polygons_layer_object = arcpy.mapping.Layer(polygons_layer)
-    polygons_base_layer = arcpy.mapping.Layer(settings_dictionary["BaseTemplatePolygonsLayer"])
+    polygons_base_layer = cache.polygons_base_layer
     output_message('Updating layer...')  # SDCBDBEUG
     arcpy.mapping.UpdateLayer(data_frame, polygons_layer_object, polygons_base_layer, True)
     output_message('Adding layer...')  # SDCBDBEUG
@@ -150,11 +538,9 @@ def polygons_layer_name(settings_dictionary, substation_name):
 def export_mxd_to_kmz(settings_dictionary, substation_name):
     output_message("Creating KMZ for %s..." %(substation_name))
     mxd_file_path = substation_mxd_file_path(settings_dictionary, substation_name)
-    kmz_file_path = substation_kmz_file_path(settings_dictionary, substation_name)
-    kmz_directory_path = substation_kmz_directory_path(settings_dictionary)
+    kmz_file_path = staged_substation_kmz_file_path(settings_dictionary, substation_name)
 
-    if (os.path.isdir(kmz_directory_path) == False):
-        os.mkdir(kmz_directory_path)
+    create_kmz_directory(settings_dictionary)
     arcpy.MapToKML_conversion(
         in_map_document=mxd_file_path,
         data_frame="Layers",
@@ -167,6 +553,35 @@ def export_mxd_to_kmz(settings_dictionary, substation_name):
         dpi_of_client="96",
         ignore_zvalue="CLAMPED_TO_GROUND")
 
+def export_substation_to_kmz_natively(settings_dictionary, substation_name):
+    output_message("Writing KMZ for %s..." %(substation_name))
+    kmz_file_path = staged_substation_kmz_file_path(settings_dictionary, substation_name)
+
+    create_kmz_directory(settings_dictionary)
+    feature_count = substation_kml_writer.write_substation_kmz(
+        kmz_file_path,
+        substation_name,
+        read_substation_points(settings_dictionary, substation_name),
+        read_substation_polygons(settings_dictionary, substation_name),
+        settings_dictionary["SubstationKmlStyle"],
+        settings_dictionary["PolygonsKmlStyle"],
+        settings_dictionary["CompressionLevel"])
+    output_message('{} features written to {}'.format(feature_count, kmz_file_path))
+
+def read_substation_points(settings_dictionary, substation_name):
+    return settings_dictionary["SubstationPointBuckets"].get(substation_name)
+
+def read_substation_polygons(settings_dictionary, substation_name):
+    return settings_dictionary["PolygonBuckets"].get(substation_name)
+
+def kml_spatial_reference():
+    return arcpy.SpatialReference(4326)
+
+def create_kmz_directory(settings_dictionary):
+    kmz_directory_path = output_staging.staged_file_path(settings_dictionary["OutputFolder"], settings_dictionary["StagingFolder"], substation_kmz_directory_path(settings_dictionary))
+    if (os.path.isdir(kmz_directory_path) == False):
+        os.makedirs(kmz_directory_path)
+
 def remove_mxd_for_substation(settings_dictionary, substation_name):
     output_message("Removing temporary MXD for %s..." %(substation_name))
     mxd_file_path = substation_mxd_file_path(settings_dictionary, substation_name)
@@ -174,7 +589,7 @@ def remove_mxd_for_substation(settings_dictionary, substation_name):
         os.remove(mxd_file_path)
 
 def substation_mxd_file_path(settings_dictionary, substation_name):
-    return r"%s\Substation_%s_%s.mxd" %(settings_dictionary["OutputFolder"],clean_substation_name(substation_name),settings_dictionary["DateTimeStamp"])
+    return r"%s\Substation_%s_%s.mxd" %(settings_dictionary["ScratchFolder"],clean_substation_name(substation_name),settings_dictionary["DateTimeStamp"])
 
 def substation_kmz_directory_path(settings_dictionary):
     return r"%s\%s" %(settings_dictionary["OutputFolder"],settings_dictionary["DateTimeStamp"])
@@ -182,6 +597,9 @@ def substation_kmz_directory_path(settings_dictionary):
 def substation_kmz_file_path(settings_dictionary, substation_name):
     return r"%s\Substation_%s.kmz" %(substation_kmz_directory_path(settings_dictionary),clean_substation_name(substation_name))
 
+def staged_substation_kmz_file_path(settings_dictionary, substation_name):
+    return output_staging.staged_file_path(settings_dictionary["OutputFolder"], settings_dictionary["StagingFolder"], substation_kmz_file_path(settings_dictionary, substation_name))
+
 def clean_substation_name(substation_name):
     return substation_name.replace('/', '')
 
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import hashlib
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+## Groups features by key (e.g. substation name) so that a feature class can be read in a
+## single scan and then handed out one group at a time. Once more than spill_threshold
+## features are held in memory, the buckets are appended to one file per key in a local
+## spill folder and read back on demand.
+
+class FeatureBuckets:
+
+    def __init__(self, spill_threshold):
+        self._spill_threshold = spill_threshold
+        self._bucket_dictionary = dict()
+        self._spilled_key_set = set()
+        self._spill_folder = None
+        self._in_memory_count = 0
+        self._feature_count = 0
+
+    def add(self, key, feature):
+        if not key in self._bucket_dictionary:
+            self._bucket_dictionary[key] = list()
+        self._bucket_dictionary[key].append(feature)
+        self._in_memory_count = self._in_memory_count + 1
+        self._feature_count = self._feature_count + 1
+        if (self._spill_threshold > 0 and self._in_memory_count > self._spill_threshold):
+            self._spill()
+
+    def get(self, key):
+        feature_list = list()
+        if key in self._spilled_key_set:
+            with open(self._spill_file_path(key), 'rb') as spill_file:
+                while True:
+                    try:
+                        feature_list.extend(pickle.load(spill_file))
+                    except EOFError:
+                        break
+        feature_list.extend(self._bucket_dictionary.get(key, list()))
+        return feature_list
+
+    def close(self):
+        if (self._spill_folder):
+            shutil.rmtree(self._spill_folder, True)
+            self._spill_folder = None
+        self._spilled_key_set = set()
+        self._bucket_dictionary = dict()
+        self._in_memory_count = 0
+
+    @property
+    def keys(self):
+        return set(self._bucket_dictionary.keys()) | self._spilled_key_set
+
+    @property
+    def feature_count(self):
+        return self._feature_count
+
+    @property
+    def spilled(self):
+        return self._spill_folder is not None
+
+    def _spill(self):
+        if (self._spill_folder is None):
+            self._spill_folder = tempfile.mkdtemp(prefix='FeatureBuckets_')
+        for key in self._bucket_dictionary:
+            with open(self._spill_file_path(key), 'ab') as spill_file:
+                pickle.dump(self._bucket_dictionary[key], spill_file, pickle.HIGHEST_PROTOCOL)
+            self._spilled_key_set.add(key)
+        self._bucket_dictionary = dict()
+        self._in_memory_count = 0
+
+    def _spill_file_path(self, key):
+        return os.path.join(self._spill_folder, hashlib.md5(repr(key).encode('utf-8')).hexdigest() + '.pkl')
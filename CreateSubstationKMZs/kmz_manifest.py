@@ -0,0 +1,92 @@
+import os
+import json
+import hashlib
+
+## Records a content fingerprint and KMZ path for each substation so that later runs only
+## rebuild the substations whose fingerprint has changed, and can link or copy the
+## unchanged KMZs into the new output folder when the run is published. The fingerprint of
+## the templates and styles the KMZs are drawn with is recorded for the whole run, and a
+## change to it rebuilds every substation.
+
+## Feature hashes are summed modulo 2^160, the size of a SHA-1 digest
+fingerprint_modulus = 2 ** 160
+
+class KmzManifest:
+
+    def __init__(self, manifest_file_path, output_engine, template_fingerprint):
+        self._manifest_file_path = manifest_file_path
+        self._output_engine = output_engine
+        self._template_fingerprint = template_fingerprint
+        self._template_changed = False
+        self._previous_substation_dictionary = dict()
+        self._substation_dictionary = dict()
+        self._deleted_substation_list = list()
+        if (os.path.isfile(manifest_file_path)):
+            with open(manifest_file_path, 'r') as manifest_file:
+                manifest = json.load(manifest_file)
+            if (manifest.get("OutputEngine") == output_engine):
+                if (manifest.get("TemplateFingerprint") == template_fingerprint):
+                    self._previous_substation_dictionary = manifest.get("Substations", dict())
+                else:
+                    self._template_changed = True
+
+    def is_unchanged(self, substation_name, fingerprint):
+        previous = self._previous_substation_dictionary.get(substation_name)
+        return (previous is not None and previous["Fingerprint"] == fingerprint and os.path.isfile(previous["KmzFilePath"]))
+
+    def previous_kmz_file_path(self, substation_name):
+        return self._previous_substation_dictionary[substation_name]["KmzFilePath"]
+
+    def record(self, substation_name, fingerprint, kmz_file_path):
+        self._substation_dictionary[substation_name] = {"Fingerprint": fingerprint, "KmzFilePath": kmz_file_path}
+
+    def record_deleted_substations(self, substation_name_list):
+        current_name_set = set(substation_name_list)
+        self._deleted_substation_list = sorted([name for name in self._previous_substation_dictionary if not name in current_name_set])
+        return self._deleted_substation_list
+
+    @property
+    def template_changed(self):
+        return self._template_changed
+
+    def save(self):
+        manifest = {
+            "OutputEngine": self._output_engine,
+            "TemplateFingerprint": self._template_fingerprint,
+            "Substations": self._substation_dictionary,
+            "DeletedSubstations": self._deleted_substation_list}
+        temporary_file_path = self._manifest_file_path + '.tmp'
+        with open(temporary_file_path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+        if (os.path.isfile(self._manifest_file_path)):
+            os.remove(self._manifest_file_path)
+        os.rename(temporary_file_path, self._manifest_file_path)
+
+class FingerprintBuilder:
+
+    ## Builds an order independent fingerprint per key in a single cursor pass. Only a running
+    ## sum of the feature hashes is held for each key, never the features themselves.
+
+    def __init__(self):
+        self._hash_sum_dictionary = dict()
+
+    def add(self, key, feature):
+        feature_hash = int(hashlib.sha1(repr(feature).encode('utf-8')).hexdigest(), 16)
+        self._hash_sum_dictionary[key] = (self._hash_sum_dictionary.get(key, 0) + feature_hash) % fingerprint_modulus
+
+    def fingerprint(self, key):
+        return '%040x' %(self._hash_sum_dictionary.get(key, 0))
+
+def template_fingerprint(file_path_list, setting_list):
+    ## Hashes the content of the template files, so a template saved over with the same
+    ## modification time is still noticed, and the repr of each style setting
+    fingerprint = hashlib.sha1()
+    for file_path in file_path_list:
+        with open(file_path, 'rb') as template_file:
+            for block in iter(lambda: template_file.read(1048576), b''):
+                fingerprint.update(block)
+        fingerprint.update(b'\n')
+    for setting in setting_list:
+        fingerprint.update(repr(setting).encode('utf-8'))
+        fingerprint.update(b'\n')
+    return fingerprint.hexdigest()
@@ -0,0 +1,103 @@
+import os
+import json
+
+## Durable per-run journal of substation results. The first line records the run's
+## DateTimeStamp and the substations it was asked to process, and each following line
+## records one substation as done or failed. Every line is flushed to disk as it is
+## written, so a run that dies part way through can be resumed from its journal.
+
+class RunJournal:
+
+    def __init__(self, journal_file_path):
+        self._journal_file_path = journal_file_path
+        self._date_time_stamp = None
+        self._substation_name_list = list()
+        self._status_dictionary = dict()
+        self._error_dictionary = dict()
+
+    def start(self, date_time_stamp, substation_name_list):
+        self._date_time_stamp = date_time_stamp
+        self._substation_name_list = list(substation_name_list)
+        self._status_dictionary = dict()
+        self._error_dictionary = dict()
+        with open(self._journal_file_path, 'w') as journal_file:
+            self._write_line(journal_file, {"DateTimeStamp": date_time_stamp, "Substations": self._substation_name_list})
+
+    def load(self):
+        ## Returns False when there is no journal, or only a partly written first line
+        if not os.path.isfile(self._journal_file_path):
+            return False
+        with open(self._journal_file_path, 'rb') as journal_file:
+            content = journal_file.read()
+        complete_length = content.rfind(b'\n') + 1
+        if (complete_length < len(content)):
+            ## Drops a partly written final line from a crash, so the next record starts on a line of its own
+            with open(self._journal_file_path, 'r+b') as journal_file:
+                journal_file.truncate(complete_length)
+        line_list = content[:complete_length].decode('utf-8').splitlines()
+        if len(line_list) == 0:
+            return False
+        try:
+            header = json.loads(line_list[0])
+        except ValueError:
+            return False
+        self._date_time_stamp = header["DateTimeStamp"]
+        self._substation_name_list = header["Substations"]
+        self._status_dictionary = dict()
+        self._error_dictionary = dict()
+        for line in line_list[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                ## A line damaged by a crash, leaving its substation pending
+                continue
+            self._status_dictionary[entry["Substation"]] = entry["Status"]
+            self._error_dictionary[entry["Substation"]] = entry.get("Error")
+        return True
+
+    def record(self, substation_name, error=None):
+        if (error):
+            entry = {"Substation": substation_name, "Status": "failed", "Error": error}
+        else:
+            entry = {"Substation": substation_name, "Status": "done"}
+        self._status_dictionary[substation_name] = entry["Status"]
+        self._error_dictionary[substation_name] = error
+        with open(self._journal_file_path, 'a') as journal_file:
+            self._write_line(journal_file, entry)
+
+    def names_to_resume(self, resume_pending, retry_failed, output_exists):
+        ## The pending substations when resuming and the failed ones when retrying, with any done
+        ## substation whose output output_exists cannot find, as when the run was on another machine
+        resume_name_set = set([name for name in self.done_names if not output_exists(name)])
+        if (resume_pending):
+            resume_name_set.update(self.pending_names)
+        if (retry_failed):
+            resume_name_set.update(self.failed_names)
+        return resume_name_set
+
+    def get_error(self, substation_name):
+        return self._error_dictionary.get(substation_name)
+
+    @property
+    def date_time_stamp(self):
+        return self._date_time_stamp
+
+    @property
+    def done_names(self):
+        return self._names_with_status("done")
+
+    @property
+    def failed_names(self):
+        return self._names_with_status("failed")
+
+    @property
+    def pending_names(self):
+        return self._names_with_status(None)
+
+    def _names_with_status(self, status):
+        return [name for name in self._substation_name_list if self._status_dictionary.get(name) == status]
+
+    def _write_line(self, journal_file, entry):
+        journal_file.write(json.dumps(entry) + '\n')
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
@@ -0,0 +1,99 @@
+import archive_writer
+from xml.sax.saxutils import escape
+
+## Writes substation KMZs directly from plain Python features, without an MXD or MapToKML.
+## Substation features are (name, (x, y)) and polygon features are (name, parts), where
+## parts is a list of polygon parts, each a list of rings of (x, y) WGS84 coordinates with
+## the exterior ring first. Either can be a list or an iterator, such as a cursor, and the
+## KML is compressed into the KMZ as it is written rather than built up in memory first.
+
+class KmlStyle:
+
+    def __init__(self, style_id, line_colour, line_width, fill_colour=None, icon_href=None):
+        self._style_id = style_id
+        self._line_colour = line_colour
+        self._line_width = line_width
+        self._fill_colour = fill_colour
+        self._icon_href = icon_href
+
+    @property
+    def style_id(self):
+        return self._style_id
+
+    def to_kml(self):
+        kml = u'<Style id="{}">'.format(escape(self._style_id))
+        if (self._icon_href):
+            kml = kml + u'<IconStyle><color>{}</color><Icon><href>{}</href></Icon></IconStyle>'.format(self._line_colour, escape(self._icon_href))
+        kml = kml + u'<LineStyle><color>{}</color><width>{}</width></LineStyle>'.format(self._line_colour, self._line_width)
+        if (self._fill_colour):
+            kml = kml + u'<PolyStyle><color>{}</color><fill>1</fill><outline>1</outline></PolyStyle>'.format(self._fill_colour)
+        else:
+            kml = kml + u'<PolyStyle><fill>0</fill><outline>1</outline></PolyStyle>'
+        return kml + u'</Style>'
+
+def kml_colour(red, green, blue, alpha=255):
+    return '%02x%02x%02x%02x' %(alpha, blue, green, red)
+
+def write_substation_kmz(kmz_file_path, substation_name, substation_features, polygon_features, substation_style, polygon_style, compression_level=6):
+    ## The member is written when the archive closes, so the count is collected from there
+    feature_count_list = list()
+    def write_kml(kml_stream):
+        feature_count_list.append(write_substation_kml(kml_stream, substation_name, substation_features, polygon_features, substation_style, polygon_style))
+    with archive_writer.ArchiveWriter(kmz_file_path, compression_level, 1) as kmz:
+        kmz.add_stream('doc.kml', write_kml)
+    return feature_count_list[0]
+
+def write_substation_kml(kml_stream, substation_name, substation_features, polygon_features, substation_style, polygon_style):
+    feature_count = 0
+    write_text(kml_stream, u'<?xml version="1.0" encoding="UTF-8"?>\n')
+    write_text(kml_stream, u'<kml xmlns="http://www.opengis.net/kml/2.2"><Document>')
+    write_text(kml_stream, u'<name>{}</name>'.format(escape(to_text(substation_name))))
+    write_text(kml_stream, substation_style.to_kml())
+    write_text(kml_stream, polygon_style.to_kml())
+
+    write_text(kml_stream, u'<Folder><name>Substation</name>')
+    for name, point in substation_features:
+        write_text(kml_stream, placemark_kml(name, substation_style, point_kml(point)))
+        feature_count = feature_count + 1
+    write_text(kml_stream, u'</Folder>')
+
+    write_text(kml_stream, u'<Folder><name>Polygons</name>')
+    for name, parts in polygon_features:
+        write_text(kml_stream, placemark_kml(name, polygon_style, polygon_parts_kml(parts)))
+        feature_count = feature_count + 1
+    write_text(kml_stream, u'</Folder>')
+
+    write_text(kml_stream, u'</Document></kml>\n')
+    return feature_count
+
+def placemark_kml(name, style, geometry_kml):
+    return u'<Placemark><name>{}</name><styleUrl>#{}</styleUrl>{}</Placemark>'.format(escape(to_text(name)), escape(style.style_id), geometry_kml)
+
+def point_kml(point):
+    return u'<Point><coordinates>{}</coordinates></Point>'.format(coordinates_kml([point]))
+
+def polygon_parts_kml(parts):
+    polygon_kml_list = list()
+    for rings in parts:
+        if len(rings) == 0:
+            continue
+        polygon_kml = u'<Polygon><outerBoundaryIs><LinearRing><coordinates>{}</coordinates></LinearRing></outerBoundaryIs>'.format(coordinates_kml(rings[0]))
+        for ring in rings[1:]:
+            polygon_kml = polygon_kml + u'<innerBoundaryIs><LinearRing><coordinates>{}</coordinates></LinearRing></innerBoundaryIs>'.format(coordinates_kml(ring))
+        polygon_kml_list.append(polygon_kml + u'</Polygon>')
+    if len(polygon_kml_list) == 1:
+        return polygon_kml_list[0]
+    return u'<MultiGeometry>{}</MultiGeometry>'.format(u''.join(polygon_kml_list))
+
+def coordinates_kml(coordinate_list):
+    return u' '.join([u'{!r},{!r},0'.format(float(x), float(y)) for x, y in coordinate_list])
+
+def to_text(value):
+    if value is None:
+        return u''
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return u'{}'.format(value)
+
+def write_text(stream, text):
+    stream.write(text.encode('utf-8'))
@@ -0,0 +1,60 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import feature_buckets
+
+def rectangle(xmin, ymin, xmax, ymax):
+    return [(xmin, ymin), (xmin, ymax), (xmax, ymax), (xmax, ymin), (xmin, ymin)]
+
+def polygon_feature(substation_name, index):
+    return (u'{}_{}'.format(substation_name, index), [[rectangle(index, 0, index + 1, 1)]])
+
+class FeatureBucketsTests(unittest.TestCase):
+
+    def fill(self, buckets, substation_name_list, feature_count):
+        ## Interleaves the substations, as the rows of a cursor would be
+        for index in range(0, feature_count):
+            for substation_name in substation_name_list:
+                buckets.add(substation_name, polygon_feature(substation_name, index))
+
+    def test_bucketing(self):
+        buckets = feature_buckets.FeatureBuckets(0)
+        self.fill(buckets, [u'SUB_1', u'SUB_2'], 3)
+        self.assertEqual(buckets.keys, set([u'SUB_1', u'SUB_2']))
+        self.assertEqual(buckets.feature_count, 6)
+        self.assertEqual(buckets.get(u'SUB_1'), [polygon_feature(u'SUB_1', index) for index in range(0, 3)])
+        self.assertEqual(buckets.get(u'SUB_3'), [])
+        ## A threshold of 0 keeps every feature in memory
+        self.assertFalse(buckets.spilled)
+        buckets.close()
+
+    def test_spill_to_disk(self):
+        buckets = feature_buckets.FeatureBuckets(4)
+        substation_name_list = [u'SUB_1', u'Caf\xe9', None]
+        self.fill(buckets, substation_name_list, 7)
+        self.assertTrue(buckets.spilled)
+        spill_folder = buckets._spill_folder
+        self.assertTrue(os.path.isdir(spill_folder))
+        self.assertEqual(buckets.keys, set(substation_name_list))
+        self.assertEqual(buckets.feature_count, 21)
+        ## The spilled features come back ahead of those still in memory, in the order they were added
+        for substation_name in substation_name_list:
+            self.assertEqual(buckets.get(substation_name), [polygon_feature(substation_name, index) for index in range(0, 7)])
+        buckets.close()
+        self.assertFalse(os.path.exists(spill_folder))
+        self.assertFalse(buckets.spilled)
+        self.assertEqual(buckets.keys, set())
+
+    def test_below_threshold(self):
+        buckets = feature_buckets.FeatureBuckets(10)
+        self.fill(buckets, [u'SUB_1'], 10)
+        self.assertFalse(buckets.spilled)
+        buckets.add(u'SUB_1', polygon_feature(u'SUB_1', 10))
+        self.assertTrue(buckets.spilled)
+        self.assertEqual(buckets.get(u'SUB_1'), [polygon_feature(u'SUB_1', index) for index in range(0, 11)])
+        buckets.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import kmz_manifest
+
+class FingerprintBuilderTests(unittest.TestCase):
+
+    def fingerprint(self, feature_list):
+        fingerprints = kmz_manifest.FingerprintBuilder()
+        for feature in feature_list:
+            fingerprints.add('SUB_1', feature)
+        return fingerprints.fingerprint('SUB_1')
+
+    def test_order_independent(self):
+        feature_list = [(u'SUB_1', (1.0, 2.0)), (u'SUB_1', u'Polygon A', 1.5), (u'SUB_1', u'Polygon B', 2.5)]
+        self.assertEqual(self.fingerprint(feature_list), self.fingerprint(list(reversed(feature_list))))
+
+    def test_changed_attribute(self):
+        self.assertNotEqual(self.fingerprint([(u'SUB_1', (1.0, 2.0), u'Operational')]),
+                            self.fingerprint([(u'SUB_1', (1.0, 2.0), u'Planned')]))
+
+    def test_added_and_repeated_features(self):
+        feature = (u'SUB_1', u'Polygon A', 1.5)
+        self.assertNotEqual(self.fingerprint([feature]), self.fingerprint([feature, feature]))
+        self.assertNotEqual(self.fingerprint([feature]), self.fingerprint([]))
+
+    def test_keys_kept_apart(self):
+        fingerprints = kmz_manifest.FingerprintBuilder()
+        fingerprints.add('SUB_1', (u'SUB_1', (1.0, 2.0)))
+        fingerprints.add('SUB_2', (u'SUB_2', (1.0, 2.0)))
+        self.assertNotEqual(fingerprints.fingerprint('SUB_1'), fingerprints.fingerprint('SUB_2'))
+        self.assertEqual(fingerprints.fingerprint('SUB_1'), self.fingerprint([(u'SUB_1', (1.0, 2.0))]))
+
+class KmzManifestTests(unittest.TestCase):
+
+    def setUp(self):
+        self._folder = tempfile.mkdtemp(prefix='KmzManifestTest_')
+        self._manifest_file_path = os.path.join(self._folder, 'manifest.json')
+        self._kmz_file_path = os.path.join(self._folder, 'Substation_SUB_1.kmz')
+        with open(self._kmz_file_path, 'wb') as kmz_file:
+            kmz_file.write(b'kmz')
+        manifest = kmz_manifest.KmzManifest(self._manifest_file_path, 'MapToKML', 'template 1')
+        manifest.record('SUB_1', 'fingerprint 1', self._kmz_file_path)
+        manifest.save()
+
+    def tearDown(self):
+        shutil.rmtree(self._folder, True)
+
+    def test_unchanged(self):
+        manifest = kmz_manifest.KmzManifest(self._manifest_file_path, 'MapToKML', 'template 1')
+        self.assertTrue(manifest.is_unchanged('SUB_1', 'fingerprint 1'))
+        self.assertFalse(manifest.is_unchanged('SUB_1', 'fingerprint 2'))
+        self.assertFalse(manifest.template_changed)
+
+    def test_changed_template_rebuilds_everything(self):
+        manifest = kmz_manifest.KmzManifest(self._manifest_file_path, 'MapToKML', 'template 2')
+        self.assertFalse(manifest.is_unchanged('SUB_1', 'fingerprint 1'))
+        self.assertTrue(manifest.template_changed)
+
+    def test_changed_engine_rebuilds_everything(self):
+        manifest = kmz_manifest.KmzManifest(self._manifest_file_path, 'Native', 'template 1')
+        self.assertFalse(manifest.is_unchanged('SUB_1', 'fingerprint 1'))
+
+    def test_template_fingerprint(self):
+        template_file_path = os.path.join(self._folder, 'BaseTemplate.mxd')
+        with open(template_file_path, 'wb') as template_file:
+            template_file.write(b'template')
+        fingerprint = kmz_manifest.template_fingerprint([template_file_path], [6])
+        self.assertEqual(fingerprint, kmz_manifest.template_fingerprint([template_file_path], [6]))
+        self.assertNotEqual(fingerprint, kmz_manifest.template_fingerprint([template_file_path], [9]))
+        with open(template_file_path, 'wb') as template_file:
+            template_file.write(b'template saved again')
+        self.assertNotEqual(fingerprint, kmz_manifest.template_fingerprint([template_file_path], [6]))
+
+if __name__ == '__main__':
+    unittest.main()
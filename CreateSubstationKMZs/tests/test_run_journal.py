@@ -0,0 +1,78 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import run_journal
+
+SUBSTATION_NAME_LIST = [u'SUB_A', u'SUB_B', u'SUB_C', u'SUB_D']
+
+class RunJournalTests(unittest.TestCase):
+
+    def setUp(self):
+        self._folder = tempfile.mkdtemp(prefix='RunJournalTest_')
+        self._journal_file_path = os.path.join(self._folder, 'SubstationKmzJournal.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self._folder, True)
+
+    def partial_run(self):
+        ## SUB_A done and SUB_B failed before the run stopped
+        journal = run_journal.RunJournal(self._journal_file_path)
+        journal.start('20261018_0900', SUBSTATION_NAME_LIST)
+        journal.record(u'SUB_A')
+        journal.record(u'SUB_B', 'MapToKML failed')
+
+    def load(self):
+        journal = run_journal.RunJournal(self._journal_file_path)
+        self.assertTrue(journal.load())
+        return journal
+
+    def test_resume_after_partial_run(self):
+        self.partial_run()
+        journal = self.load()
+        self.assertEqual(journal.date_time_stamp, '20261018_0900')
+        self.assertEqual((journal.done_names, journal.failed_names, journal.pending_names), ([u'SUB_A'], [u'SUB_B'], [u'SUB_C', u'SUB_D']))
+        self.assertEqual(journal.get_error(u'SUB_B'), 'MapToKML failed')
+        self.assertEqual(journal.names_to_resume(True, False, lambda name: True), set([u'SUB_C', u'SUB_D']))
+
+        ## The resumed run carries on appending to the same journal
+        journal.record(u'SUB_C')
+        journal.record(u'SUB_D')
+        self.assertEqual(self.load().pending_names, [])
+
+    def test_retry_failed_selects_only_failures(self):
+        self.partial_run()
+        journal = self.load()
+        self.assertEqual(journal.names_to_resume(False, True, lambda name: True), set([u'SUB_B']))
+        self.assertEqual(journal.names_to_resume(True, True, lambda name: True), set([u'SUB_B', u'SUB_C', u'SUB_D']))
+        ## A retried failure that succeeds is no longer failed
+        journal.record(u'SUB_B')
+        self.assertEqual(self.load().failed_names, [])
+
+    def test_done_without_output_is_resumed(self):
+        self.partial_run()
+        self.assertEqual(self.load().names_to_resume(False, True, lambda name: name != u'SUB_A'), set([u'SUB_A', u'SUB_B']))
+
+    def test_torn_last_line(self):
+        self.partial_run()
+        with open(self._journal_file_path, 'ab') as journal_file:
+            journal_file.write(b'{"Substation": "SUB_C", "Sta')
+        journal = self.load()
+        self.assertEqual((journal.done_names, journal.failed_names, journal.pending_names), ([u'SUB_A'], [u'SUB_B'], [u'SUB_C', u'SUB_D']))
+        ## The torn line is dropped, so the next record is not joined onto it
+        journal.record(u'SUB_C')
+        self.assertEqual(self.load().done_names, [u'SUB_A', u'SUB_C'])
+
+    def test_torn_header(self):
+        with open(self._journal_file_path, 'wb') as journal_file:
+            journal_file.write(b'{"DateTimeStamp": "20261018_0900", "Subst')
+        self.assertFalse(run_journal.RunJournal(self._journal_file_path).load())
+
+    def test_no_journal(self):
+        self.assertFalse(run_journal.RunJournal(self._journal_file_path).load())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import sys
+import shutil
+import zipfile
+import tempfile
+import unittest
+import xml.etree.ElementTree as ElementTree
+
+## The writer works from plain Python features, so these tests run without arcpy
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+## The archive writer is shared by the tools from the Common folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, 'Common'))
+import substation_kml_writer
+
+KML = '{http://www.opengis.net/kml/2.2}'
+
+def rectangle(xmin, ymin, xmax, ymax):
+    return [(xmin, ymin), (xmin, ymax), (xmax, ymax), (xmax, ymin), (xmin, ymin)]
+
+SUBSTATION_STYLE = substation_kml_writer.KmlStyle('substation', substation_kml_writer.kml_colour(0, 0, 255), 2, icon_href='http://maps.google.com/mapfiles/kml/shapes/triangle.png')
+POLYGONS_STYLE = substation_kml_writer.KmlStyle('polygons', substation_kml_writer.kml_colour(255, 0, 0), 2)
+
+class SubstationKmzTests(unittest.TestCase):
+
+    def setUp(self):
+        self._folder = tempfile.mkdtemp(prefix='SubstationKmlWriterTest_')
+        self._kmz_file_path = os.path.join(self._folder, 'Substation_SUB_1.kmz')
+
+    def tearDown(self):
+        shutil.rmtree(self._folder, True)
+
+    def write_kmz(self, substation_features, polygon_features, compression_level=6):
+        feature_count = substation_kml_writer.write_substation_kmz(self._kmz_file_path, u'SUB & 1', substation_features, polygon_features, SUBSTATION_STYLE, POLYGONS_STYLE, compression_level)
+        with zipfile.ZipFile(self._kmz_file_path, 'r') as kmz:
+            self.assertEqual(kmz.testzip(), None)
+            self.assertEqual(kmz.namelist(), ['doc.kml'])
+            kml = kmz.read('doc.kml')
+            compress_type = kmz.getinfo('doc.kml').compress_type
+        return (feature_count, ElementTree.fromstring(kml), compress_type)
+
+    def placemarks(self, document, folder_name):
+        for folder in document.iter(KML + 'Folder'):
+            if folder.find(KML + 'name').text == folder_name:
+                return folder.findall(KML + 'Placemark')
+        return []
+
+    def test_points_and_polygons(self):
+        polygon_with_hole = [[rectangle(-1.5, 51.0, -1.4, 51.1), list(reversed(rectangle(-1.48, 51.02, -1.46, 51.04)))]]
+        two_parts = [[rectangle(-1.3, 51.0, -1.2, 51.1)], [rectangle(-1.1, 51.0, -1.0, 51.1)]]
+        feature_count, document, compress_type = self.write_kmz([(u'SUB & 1', (-1.45, 51.05))], [(u'SUB_1_A', polygon_with_hole), (u'SUB_1_B', two_parts)])
+        self.assertEqual(feature_count, 3)
+        self.assertEqual(compress_type, zipfile.ZIP_DEFLATED)
+        self.assertEqual(document.find(KML + 'Document/' + KML + 'name').text, u'SUB & 1')
+
+        substation_list = self.placemarks(document, 'Substation')
+        self.assertEqual(len(substation_list), 1)
+        self.assertEqual(substation_list[0].find(KML + 'styleUrl').text, '#substation')
+        self.assertEqual(substation_list[0].find(KML + 'Point/' + KML + 'coordinates').text, '-1.45,51.05,0')
+
+        polygon_list = self.placemarks(document, 'Polygons')
+        self.assertEqual([placemark.find(KML + 'name').text for placemark in polygon_list], [u'SUB_1_A', u'SUB_1_B'])
+        hole_polygon = polygon_list[0].find(KML + 'Polygon')
+        self.assertEqual(len(hole_polygon.findall(KML + 'innerBoundaryIs')), 1)
+        outer_coordinates = hole_polygon.find(KML + 'outerBoundaryIs/' + KML + 'LinearRing/' + KML + 'coordinates').text
+        self.assertEqual(outer_coordinates.split(' ')[0:2], ['-1.5,51.0,0', '-1.5,51.1,0'])
+        self.assertEqual(len(polygon_list[1].findall(KML + 'MultiGeometry/' + KML + 'Polygon')), 2)
+
+    def test_features_from_iterators(self):
+        ## As when the features come straight from a cursor
+        polygon_count = 2000
+        substation_features = iter([(u'SUB_1', (-1.45, 51.05))])
+        polygon_features = ((u'SUB_1_{}'.format(index), [[rectangle(-1.5 + index * 0.001, 51.0, -1.4995 + index * 0.001, 51.001)]]) for index in range(0, polygon_count))
+        feature_count, document, compress_type = self.write_kmz(substation_features, polygon_features)
+        self.assertEqual(feature_count, polygon_count + 1)
+        self.assertEqual(len(self.placemarks(document, 'Polygons')), polygon_count)
+
+    def test_stored(self):
+        feature_count, document, compress_type = self.write_kmz([(u'SUB_1', (-1.45, 51.05))], [], 0)
+        self.assertEqual(feature_count, 1)
+        self.assertEqual(compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(self.placemarks(document, 'Polygons'), [])
+
+    def test_null_and_byte_names(self):
+        feature_count, document, compress_type = self.write_kmz([(None, (-1.45, 51.05))], [(u'Caf\xe9 <north>'.encode('utf-8'), [[rectangle(0, 0, 1, 1)]])])
+        self.assertEqual(self.placemarks(document, 'Substation')[0].find(KML + 'name').text, None)
+        self.assertEqual(self.placemarks(document, 'Polygons')[0].find(KML + 'name').text, u'Caf\xe9 <north>')
+
+class KmlColourTests(unittest.TestCase):
+
+    def test_alpha_blue_green_red_order(self):
+        self.assertEqual(substation_kml_writer.kml_colour(255, 0, 0), 'ff0000ff')
+        self.assertEqual(substation_kml_writer.kml_colour(1, 2, 3, 128), '80030201')
+
+if __name__ == '__main__':
+    unittest.main()
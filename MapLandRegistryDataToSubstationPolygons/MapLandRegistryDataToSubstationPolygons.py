@@ -1,236 +1,403 @@
 import arcpy
 import os
+import sys
+import multiprocessing
 from datetime import datetime
 import pyodbc
+## Modules shared by the tools live in the Common folder alongside this one
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'Common'))
+import polygon_rings
+import database_session
+import polygon_intersect_engine
+import mapping_row_aggregator
+import mapping_table_sync
+import polygon_fingerprint_cache
+import process_memory
 
 Debug = False
 
-class SiteIdentifierMappingDetails:
-
-    def __init__(self, polygon_id):
-        self._polygon_id = polygon_id
-        self._title_number_list = list()
-        self._tenure_list = list()
-        self._proprietor_list = list()
-        self._address_list = list()
-        self._land_registry_id_list = list()
-
-    def _contains_details(self, title_number, tenure, proprietor, address):
-        for index in range(0, len(self._title_number_list)):
-            if (self._title_number_list[index] == title_number and self._tenure_list[index] == tenure and self._proprietor_list[index] == proprietor and self._address_list[index] == address):
-                return True
-        return False
-
-    def _add_title_number(self, title_number):
-        self._title_number_list.append(title_number)
-
-    def _add_tenure(self, tenure):
-        self._tenure_list.append(tenure)
-
-    def _add_proprietor(self, proprietor):
-        self._proprietor_list.append(proprietor)
-
-    def _add_address(self, address):
-        self._address_list.append(address)
-
-    def _add_land_registry_id(self, id):
-        self._land_registry_id_list.append(id)
-
-    @property
-    def length(self):
-        return len(self._title_number_list)
-
-    @property
-    def polygon_id(self):
-        return self._polygon_id
-
-
-    def get_title_number(self, number):
-        return self._title_number_list[number]
-
-    def get_tenure(self, number):
-        return self._tenure_list[number]
-
-    def get_proprietor(self, number):
-        return self._proprietor_list[number]
-
-    def get_address(self, number):
-        return self._address_list[number]
-
-    def get_land_registry_id(self, number):
-        return self._land_registry_id_list[number]
-
+sketch_polygon_feature_class_path = r'\\kl-fs-003\gis_storage\Ancillary\RES_software_Services\GeoDB_UK.sde\GeoDB_UK.SDE.GB_Storage_Property_Sketch_Layer'
+sketch_polygon_where_clause = "Valid = 1 AND Download_Land_Data = 1"
+land_registry_feature_class_path = r'\\kl-fs-003\gis_storage\Ancillary\RES_software_Services\GeoDB_UK.sde\GeoDB_UK.SDE.ENG_Land_Registry_Parcels'
+fingerprint_cache_file_path = r'\\kl-fs-003\gis_storage\Projects\ENERGY_STORAGE\SITE_SELECTION\Python\Temporary\SketchPolygonFingerprints.json'
+database_connection_string = (
+    r'DRIVER={SQL Server};'
+    r'SERVER=kl-sql-005;'
+    r'DATABASE=GeoDB_UK;'
+    r'UID=sde;'
+    r'PWD=sde'
+    )
 def main():
 
+    connection_pool = database_session.ConnectionPool(connect_to_database)
     try:
-        mapping_shapefile_path = r'\\kl-fs-003\gis_storage\Projects\ENERGY_STORAGE\SITE_SELECTION\Python\Temporary\mapping.shp'
-
-        create_mapping_shapefile(mapping_shapefile_path)
-
-        populate_mapping_database_tables_from_shapefile(mapping_shapefile_path)
+        commit_batch_size = 0 ## 0 commits the whole run in one transaction, so the tables only change once it completes
+        executemany_batch_size = 1000 ## Rows sent to the server per executemany call
+        fast_executemany = False ## Send executemany batches with pyodbc's array binding, which needs ODBC Driver 13 for SQL Server or later
+        sync_mode = "Delta" ## "Delta" applies only the changed rows, "Reload" clears and rewrites the mapping tables
+        intersect_mode = "Geoprocessing" ## "Geoprocessing" runs Intersect_analysis into a temporary feature class, "Engine" intersects in process with a spatial index, "Sharded" runs the engine over spatial tiles in a process pool
+        shard_tile_columns = 4
+        shard_tile_rows = 4
+        shard_worker_count = 0 ## 0 uses one worker per CPU
+        in_memory_ceiling_megabytes = 1024 ## The Geoprocessing intersect spills to the local scratch GDB instead of in_memory when its output is estimated to need more than this
+        intersect_megabytes_per_sketch_polygon = 0.1 ## Estimated in_memory size of one sketch polygon's intersect output, used with the sketch polygon count for that estimate
+        full_rebuild = "--full-rebuild" in sys.argv ## Otherwise only polygons whose fingerprint has changed since the last run are intersected
+        aggregation_mode = "InMemory" ## "InMemory" groups every intersect row before writing, "Streaming" writes each polygon as soon as its rows are complete
+        compare_intersect = "--compare-intersect" in sys.argv ## Report where the Engine or Sharded intersect and Geoprocessing disagree, without changing the tables
+
+        if (aggregation_mode == "Streaming" and intersect_mode == "Engine"):
+            ## The engine yields rows in parcel order, which cannot be grouped by polygon without holding them all
+            output_warning("Streaming aggregation needs rows grouped by polygon, which the Engine intersect does not produce; using InMemory aggregation")
+            aggregation_mode = "InMemory"
+        parcel_version = read_land_registry_parcel_version()
+        current_fingerprint_dictionary = read_sketch_polygon_fingerprints()
+        polygon_scope = get_changed_polygon_scope(current_fingerprint_dictionary, parcel_version, full_rebuild)
+        if (polygon_scope is None):
+            polygon_where_clause = sketch_polygon_where_clause
+            intersect_polygon_count = len(current_fingerprint_dictionary)
+        else:
+            ## Only the rows of changed and deleted polygons are compared, so the tables are always synced by delta
+            sync_mode = "Delta"
+            polygon_where_clause = changed_polygon_where_clause(polygon_scope & set(current_fingerprint_dictionary.keys()))
+            intersect_polygon_count = len(polygon_scope & set(current_fingerprint_dictionary.keys()))
+        spill_to_disk = spill_intersect_to_disk(intersect_polygon_count, in_memory_ceiling_megabytes, intersect_megabytes_per_sketch_polygon)
+        if (aggregation_mode == "Streaming"):
+            ## Always intersect into the scratch GDB, where the rows can be read back ordered by polygon
+            spill_to_disk = True
+
+        if (compare_intersect):
+            if polygon_where_clause is not None:
+                compare_intersect_with_geoprocessing(polygon_where_clause, intersect_mode, shard_tile_columns, shard_tile_rows, shard_worker_count, spill_to_disk)
+            return
+
+        if (polygon_where_clause is None):
+            mapping_rows = list()
+        elif (intersect_mode == "Engine"):
+            mapping_rows = intersect_mapping_rows_with_engine(polygon_where_clause)
+        elif (intersect_mode == "Sharded"):
+            mapping_rows = intersect_mapping_rows_with_sharded_engine(polygon_where_clause, shard_tile_columns, shard_tile_rows, shard_worker_count)
+        else:
+            mapping_feature_class_path = create_mapping_feature_class(polygon_where_clause, spill_to_disk)
+            mapping_rows = read_mapping_feature_class_rows(mapping_feature_class_path, aggregation_mode == "Streaming")
+
+        if (fast_executemany and not database_session.driver_supports_fast_executemany(database_connection_string)):
+            output_warning("fast_executemany needs ODBC Driver 13 for SQL Server or later, which the connection string does not name; sending rows without it")
+            fast_executemany = False
+        with database_session.DatabaseSession(connection_pool, commit_batch_size, executemany_batch_size, fast_executemany) as session:
+            if (aggregation_mode == "Streaming"):
+                stream_mapping_database_tables(session, mapping_rows, sync_mode, polygon_scope, executemany_batch_size)
+            else:
+                populate_mapping_database_tables(session, mapping_rows, sync_mode, polygon_scope)
+            output_message('{} statements executed'.format(session.statement_count))
+        output_message('Peak memory use: {}'.format(process_memory.format_memory(process_memory.peak_memory_bytes())))
+
+        polygon_fingerprint_cache.save_fingerprint_cache(fingerprint_cache_file_path, parcel_version, current_fingerprint_dictionary)
 
     except Exception as e:
         output_error(e)
-
-def create_mapping_shapefile(mapping_shapefile_path):
-
-    if (mapping_shapefile_path.endswith('.shp') and os.path.isfile(mapping_shapefile_path)):
-        output_message("Deleting existing shapefile {}...".format(mapping_shapefile_path))
-        arcpy.Delete_management(mapping_shapefile_path)
+    finally:
+        connection_pool.close_all()
+
+def connect_to_database():
+    return pyodbc.connect(database_connection_string)
+
+def read_sketch_polygon_fingerprints():
+    output_message("Fingerprinting sketch polygons...")
+    fingerprint_dictionary = dict()
+    fields = ['OID@', 'Site_Identifier', 'SHAPE@']
+    with arcpy.da.SearchCursor(sketch_polygon_feature_class_path, fields, sketch_polygon_where_clause) as cursor:
+        for row in cursor:
+            rings = list()
+            if row[2]:
+                rings = polygon_rings.geometry_rings(row[2])
+            fingerprint_dictionary[row[0]] = polygon_fingerprint_cache.polygon_fingerprint(row[1], rings)
+    return fingerprint_dictionary
+
+def read_land_registry_parcel_version():
+    ## The parcel count and latest revision date, either of which changes when the Land Registry
+    ## parcels are refreshed. Both are answered by the database without reading the parcels.
+    parcel_count = int(arcpy.GetCount_management(land_registry_feature_class_path).getOutput(0))
+    latest_revision_date = None
+    with arcpy.da.SearchCursor(land_registry_feature_class_path, ['Revision_Date'], "Revision_Date IS NOT NULL", sql_clause=('TOP 1', 'ORDER BY Revision_Date DESC')) as cursor:
+        for row in cursor:
+            latest_revision_date = row[0]
+    return '{}|{}'.format(parcel_count, latest_revision_date)
+
+def get_changed_polygon_scope(current_fingerprint_dictionary, parcel_version, full_rebuild):
+    ## Returns the OIDs of new, changed and deleted polygons, or None when every polygon is to be processed
+    if (full_rebuild):
+        output_warning("Full rebuild requested, processing every sketch polygon")
+        return None
+    cache = polygon_fingerprint_cache.load_fingerprint_cache(fingerprint_cache_file_path)
+    if cache is None:
+        output_warning("No fingerprint cache found at {}, processing every sketch polygon".format(fingerprint_cache_file_path))
+        return None
+    previous_parcel_version, previous_fingerprint_dictionary = cache
+    if (previous_parcel_version != parcel_version):
+        output_warning("Land Registry parcels have changed since the last run, processing every sketch polygon")
+        return None
+    changed_oid_set, deleted_oid_set = polygon_fingerprint_cache.compare_fingerprints(previous_fingerprint_dictionary, current_fingerprint_dictionary)
+    output_warning('{} new or changed and {} deleted sketch polygons since the last run'.format(len(changed_oid_set), len(deleted_oid_set)))
+    return changed_oid_set | deleted_oid_set
+
+def changed_polygon_where_clause(changed_oid_set):
+    ## None when nothing needs intersecting
+    if len(changed_oid_set) == 0:
+        return None
+    return "{} AND OBJECTID IN ({})".format(sketch_polygon_where_clause, ", ".join([str(polygon_oid) for polygon_oid in sorted(changed_oid_set)]))
+
+def spill_intersect_to_disk(sketch_polygon_count, in_memory_ceiling_megabytes, intersect_megabytes_per_sketch_polygon):
+    ## Estimates the intersect output from the number of sketch polygons being processed, which
+    ## is already known from fingerprinting them, rather than counting the parcels they overlap
+    estimated_megabytes = sketch_polygon_count * intersect_megabytes_per_sketch_polygon
+    if (estimated_megabytes > in_memory_ceiling_megabytes):
+        output_message("Intersect output for {} sketch polygons is estimated at {:.0f} MB, above the in_memory ceiling of {} MB, spilling to local disk".format(sketch_polygon_count, estimated_megabytes, in_memory_ceiling_megabytes))
+        return True
+    return False
+
+def create_mapping_feature_class(polygon_where_clause, spill_to_disk):
 
     temp_polygon_path = r'\\kl-fs-003\gis_storage\Projects\ENERGY_STORAGE\SITE_SELECTION\Python\Temporary\filtered_polygon_lyr'
     temp_land_reg_path = r'\\kl-fs-003\gis_storage\Projects\ENERGY_STORAGE\SITE_SELECTION\Python\Temporary\land_reg_lyr'
 
     output_message("Creating local polygon layer...")
-    arcpy.MakeFeatureLayer_management(in_features=r'\\kl-fs-003\gis_storage\Ancillary\RES_software_Services\GeoDB_UK.sde\GeoDB_UK.SDE.GB_Storage_Property_Sketch_Layer', out_layer=temp_polygon_path, where_clause="Valid = 1 AND Download_Land_Data = 1")
+    arcpy.MakeFeatureLayer_management(in_features=sketch_polygon_feature_class_path, out_layer=temp_polygon_path, where_clause=polygon_where_clause)
     output_message("Creating local Land Registry layer...")
-    arcpy.MakeFeatureLayer_management(in_features=r'\\kl-fs-003\gis_storage\Ancillary\RES_software_Services\GeoDB_UK.sde\GeoDB_UK.SDE.ENG_Land_Registry_Parcels',out_layer=temp_land_reg_path, where_clause="", workspace="", field_info="OBJECTID OBJECTID VISIBLE NONE;TSLID TSLID VISIBLE NONE;TSLFgnKey TSLFgnKey VISIBLE NONE;TSLType TSLType VISIBLE NONE;LR_TITLE LR_TITLE VISIBLE NONE;Title_Number Title_Number VISIBLE NONE;Tenure Tenure VISIBLE NONE;Proprietor Proprietor VISIBLE NONE;Address Address VISIBLE NONE;Revision_Date Revision_Date VISIBLE NONE;NewSiteID NewSiteID VISIBLE NONE;SHAPE SHAPE VISIBLE NONE;SHAPE.STArea() SHAPE.STArea() VISIBLE NONE;SHAPE.STLength() SHAPE.STLength() VISIBLE NONE")
+    arcpy.MakeFeatureLayer_management(in_features=land_registry_feature_class_path,out_layer=temp_land_reg_path, where_clause="", workspace="", field_info="OBJECTID OBJECTID VISIBLE NONE;TSLID TSLID VISIBLE NONE;TSLFgnKey TSLFgnKey VISIBLE NONE;TSLType TSLType VISIBLE NONE;LR_TITLE LR_TITLE VISIBLE NONE;Title_Number Title_Number VISIBLE NONE;Tenure Tenure VISIBLE NONE;Proprietor Proprietor VISIBLE NONE;Address Address VISIBLE NONE;Revision_Date Revision_Date VISIBLE NONE;NewSiteID NewSiteID VISIBLE NONE;SHAPE SHAPE VISIBLE NONE;SHAPE.STArea() SHAPE.STArea() VISIBLE NONE;SHAPE.STLength() SHAPE.STLength() VISIBLE NONE")
 
-    output_message("Creating shapefile: {}...".format(mapping_shapefile_path))
-    arcpy.Intersect_analysis(in_features="{} #;{} #".format(temp_polygon_path, temp_land_reg_path), out_feature_class=mapping_shapefile_path, join_attributes="ALL", cluster_tolerance="-1 Unknown", output_type="INPUT")
+    if (spill_to_disk):
+        mapping_feature_class_path = os.path.join(arcpy.env.scratchGDB, 'mapping')
+    else:
+        mapping_feature_class_path = r'in_memory\mapping'
+    if (arcpy.Exists(mapping_feature_class_path)):
+        arcpy.Delete_management(mapping_feature_class_path)
+
+    output_message("Creating mapping feature class: {}...".format(mapping_feature_class_path))
+    arcpy.Intersect_analysis(in_features="{} #;{} #".format(temp_polygon_path, temp_land_reg_path), out_feature_class=mapping_feature_class_path, join_attributes="ALL", cluster_tolerance="-1 Unknown", output_type="INPUT")
 
     output_message("Removing local polygon layer...")
     arcpy.Delete_management(temp_polygon_path)
     output_message("Removing local Land Registry layer...")
     arcpy.Delete_management(temp_land_reg_path)
 
-def populate_mapping_database_tables_from_shapefile(mapping_shapefile_path):
-
-    output_message("Populate mapping database tables...")
+    return mapping_feature_class_path
 
-    clear_id_mapping_table()
-
-    fields = ['FID_GB_Sto', 'Site_Ident', 'Title_Numb', 'Tenure', 'Proprietor', 'Address', 'Revision_D', 'FID_ENG_La']
-
-    ## Create dictionary of mapping data
-    previous_polygon_oid = -1
-    mapping_dictionary = dict()
-    for row in arcpy.da.SearchCursor(mapping_shapefile_path, fields):
-        polygon_oid = row[0]
-        site_identifier = row[1]
-        title_number = row[2]
-        tenure = row[3]
-        proprietor = row[4]
-        address = row[5]
-        revision = row[6]
-        land_registry_id = row[7]
-        if not polygon_oid in mapping_dictionary:
-            mapping_dictionary[polygon_oid] = SiteIdentifierMappingDetails(polygon_oid)
-        # Avoid adding duplicates (title number, tenure, proprietor and address are all the same
-        if not mapping_dictionary[polygon_oid]._contains_details(title_number, tenure, proprietor, address):
-            mapping_dictionary[polygon_oid]._add_title_number(title_number)
-            mapping_dictionary[polygon_oid]._add_tenure(tenure)
-            mapping_dictionary[polygon_oid]._add_proprietor(proprietor)
-            mapping_dictionary[polygon_oid]._add_address(address)
-            mapping_dictionary[polygon_oid]._add_land_registry_id(land_registry_id)
-
-    for key in mapping_dictionary:
-        add_site_identifier_mapping_details_to_database(mapping_dictionary[key])
-        add_id_mapping_details_to_database(mapping_dictionary[key])
-
-def add_site_identifier_mapping_details_to_database(mapping_details):
-    length = mapping_details.length
-    polygon_oid = mapping_details.polygon_id
-
-
-    for index in range(0, 15):
-        if (index < length):
-            sql = generate_sql_for_tblStoragePolygonToLandRegistryMapping(
-                polygon_oid,
-                index + 1,
-                "'{}'".format(mapping_details.get_title_number(index)),
-                "'{}'".format(make_text_sql_compliant(mapping_details.get_tenure(index))),
-                "'{}'".format(make_text_sql_compliant(mapping_details.get_proprietor(index))),
-                "'{}'".format(make_text_sql_compliant(mapping_details.get_address(index))))
-        else:
-            sql = generate_sql_for_tblStoragePolygonToLandRegistryMapping(
-                polygon_oid,
-                index + 1,
-                "NULL",
-                "NULL",
-                "NULL",
-                "NULL")
-        execute_sql_on_tblStoragePolygonToLandRegistryMapping(sql)
-
-    if (length >= 16):
-        output_warning("Too many mapping items for polygon ID {} ({} found)".format(mapping_details.polygon_id, index + 1))
+def read_mapping_feature_class_rows(mapping_feature_class_path, order_by_polygon=False):
+    ## Intersect_analysis names the input FID fields after the input feature classes, in input order
+    fid_field_list = [field.name for field in arcpy.ListFields(mapping_feature_class_path, 'FID_*')]
+    fields = [fid_field_list[0], 'Site_Identifier', 'Title_Number', 'Tenure', 'Proprietor', 'Address', 'Revision_Date', fid_field_list[1]]
+    sql_clause = (None, None)
+    if (order_by_polygon):
+        ## ORDER BY is only honoured by a geodatabase, not in_memory
+        sql_clause = (None, 'ORDER BY {}, {}'.format(fid_field_list[0], fid_field_list[1]))
+    try:
+        with arcpy.da.SearchCursor(mapping_feature_class_path, fields, sql_clause=sql_clause) as cursor:
+            for row in cursor:
+                yield row
+    finally:
+        arcpy.Delete_management(mapping_feature_class_path)
+
+def intersect_mapping_rows_with_engine(polygon_where_clause):
+    ## Yields rows in the same order as read_mapping_feature_class_rows: polygon OID, site identifier,
+    ## title number, tenure, proprietor, address, revision date and Land Registry OID
+    spatial_reference = arcpy.Describe(land_registry_feature_class_path).spatialReference
+
+    output_message("Indexing sketch polygons...")
+    engine = polygon_intersect_engine.PolygonIntersectEngine(read_sketch_polygons(spatial_reference, polygon_where_clause))
+    output_message('{} sketch polygons indexed'.format(engine.polygon_count))
+
+    output_message("Intersecting Land Registry parcels...")
+    if (polygon_where_clause == sketch_polygon_where_clause):
+        for row in intersect_parcels(engine, land_registry_feature_class_path):
+            yield row
     else:
-        output_message('{} mapping items added for polygon ID {}'.format(length, mapping_details.polygon_id))
-
-def generate_sql_for_tblStoragePolygonToLandRegistryMapping(polygon_oid, mapping_number, title_number, tenure, proprietor, address):
-    return "UPDATE [sde].[tblStoragePolygonToLandRegistryMapping] SET [Title_Number_{}] = {} ,[Tenure_{}] = {}, [Proprietor_{}] = {},[Address_{}] = {} WHERE [Storage_Polygon_ID] = {}".format(
-        mapping_number, title_number,
-        mapping_number, tenure,
-        mapping_number, proprietor,
-        mapping_number, address,
-        polygon_oid)
-
-def make_text_sql_compliant(input_text):
-    return input_text.replace("'", "`")
-
-def execute_sql_on_tblStoragePolygonToLandRegistryMapping(sql):
+        ## When only some polygons are processed, let the database select the parcels near them
+        temp_polygon_layer = 'changed_polygon_lyr'
+        temp_land_reg_layer = 'changed_land_reg_lyr'
+        arcpy.MakeFeatureLayer_management(sketch_polygon_feature_class_path, temp_polygon_layer, polygon_where_clause)
+        arcpy.MakeFeatureLayer_management(land_registry_feature_class_path, temp_land_reg_layer)
+        try:
+            arcpy.SelectLayerByLocation_management(temp_land_reg_layer, "INTERSECT", temp_polygon_layer)
+            for row in intersect_parcels(engine, temp_land_reg_layer):
+                yield row
+        finally:
+            arcpy.Delete_management(temp_polygon_layer)
+            arcpy.Delete_management(temp_land_reg_layer)
+    output_message('{} parcels read, {} candidate pairs tested, {} intersections found'.format(engine.parcels_read, engine.candidates_tested, engine.matches))
+
+def intersect_mapping_rows_with_sharded_engine(polygon_where_clause, tile_columns, tile_rows, worker_count):
+    ## Each sketch polygon belongs to exactly one tile, so every (polygon OID, Land Registry OID)
+    ## pair comes from a single tile and the tile results are passed on as each tile finishes,
+    ## without being merged. Each tile's rows are sorted by polygon and then parcel, which groups
+    ## them by polygon for streaming aggregation and puts each polygon's parcels in the Land
+    ## Registry OID order that decides which of them fill its slots in every intersect mode.
+    spatial_reference = arcpy.Describe(land_registry_feature_class_path).spatialReference
+    polygon_list = read_sketch_polygons(spatial_reference, polygon_where_clause)
+    task_list = list()
+    for selection_envelope, tile_polygon_list in polygon_intersect_engine.shard_polygons(polygon_list, tile_columns, tile_rows):
+        task_list.append((selection_envelope, tile_polygon_list, spatial_reference.exportToString()))
+    if len(task_list) == 0:
+        return
+
+    if (worker_count <= 0):
+        worker_count = multiprocessing.cpu_count()
+    output_message('Intersecting {} sketch polygons over {} tiles with {} workers...'.format(len(polygon_list), len(task_list), worker_count))
+    row_count = 0
+    pool = multiprocessing.Pool(worker_count)
     try:
-        conn = pyodbc.connect(
-        r'DRIVER={SQL Server};'
-        r'SERVER=kl-sql-005;'
-        r'DATABASE=GeoDB_UK;'
-        r'UID=sde;'
-        r'PWD=sde'
-        )
-
-        cursor = conn.cursor()
-
-        table_name = "tblStoragePolygonToLandRegistryMapping"
-
-        cursor.execute(sql)
-        conn.commit()
-
-        conn.close()
-    except Exception as e:
-        output_error(e)
-        conn.close()
-
-def clear_id_mapping_table():
-    execute_sql_on_tblStoragePolygonIdToLandRegistryIdMapping(get_clear_tblStoragePolygonIdToLandRegistryIdMapping_sql())
-
-def add_id_mapping_details_to_database(mapping_details):
-    length = mapping_details.length
-    polygon_oid = mapping_details.polygon_id
-
-    if length > 0:
-        for index in range(0, length):
-            add_id_mapping_table_entry(polygon_oid, mapping_details.get_land_registry_id(index))
-
-def get_clear_tblStoragePolygonIdToLandRegistryIdMapping_sql():
-    return 'DELETE FROM tblStoragePolygonIdToLandRegistryIdMapping'
-
-def add_id_mapping_table_entry(polygon_oid, land_registry_id):
-    execute_sql_on_tblStoragePolygonIdToLandRegistryIdMapping(get_add_ids_tblStoragePolygonIdToLandRegistryIdMapping_sql(polygon_oid, land_registry_id))
-
-def get_add_ids_tblStoragePolygonIdToLandRegistryIdMapping_sql(polygon_oid, land_registry_id):
-    return 'INSERT INTO [sde].[tblStoragePolygonIdToLandRegistryIdMapping] ([Storage_Polygon_ID],[Land_Registry_ID]) VALUES ({} ,{})'.format(polygon_oid, land_registry_id)
-
-def execute_sql_on_tblStoragePolygonIdToLandRegistryIdMapping(sql):
+        for tile_row_list in pool.imap_unordered(intersect_tile, task_list):
+            row_count = row_count + len(tile_row_list)
+            for row in tile_row_list:
+                yield row
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    output_message('{} intersections found'.format(row_count))
+
+def intersect_tile(task):
+    selection_envelope, tile_polygon_list, spatial_reference_string = task
+    spatial_reference = arcpy.SpatialReference()
+    spatial_reference.loadFromString(spatial_reference_string)
+    xmin, ymin, xmax, ymax = selection_envelope
+    selection_polygon = arcpy.Polygon(arcpy.Array([arcpy.Point(xmin, ymin), arcpy.Point(xmin, ymax), arcpy.Point(xmax, ymax), arcpy.Point(xmax, ymin), arcpy.Point(xmin, ymin)]), spatial_reference)
+
+    parcel_layer = 'land_reg_tile_lyr_{}'.format(os.getpid())
+    arcpy.MakeFeatureLayer_management(land_registry_feature_class_path, parcel_layer)
     try:
-        conn = pyodbc.connect(
-        r'DRIVER={SQL Server};'
-        r'SERVER=kl-sql-005;'
-        r'DATABASE=GeoDB_UK;'
-        r'UID=sde;'
-        r'PWD=sde'
-        )
+        arcpy.SelectLayerByLocation_management(parcel_layer, "INTERSECT", selection_polygon)
+        engine = polygon_intersect_engine.PolygonIntersectEngine(tile_polygon_list)
+        tile_row_list = list(intersect_parcels(engine, parcel_layer))
+        tile_row_list.sort(key=lambda row: (row[0], row[7]))
+        return tile_row_list
+    finally:
+        arcpy.Delete_management(parcel_layer)
+
+def compare_intersect_with_geoprocessing(polygon_where_clause, intersect_mode, tile_columns, tile_rows, worker_count, spill_to_disk):
+    ## Intersects the same sketch polygons in process and with Intersect_analysis and reports the
+    ## (polygon OID, Land Registry OID) pairs found by only one of them
+    if (intersect_mode == "Engine"):
+        mapping_rows = intersect_mapping_rows_with_engine(polygon_where_clause)
+    elif (intersect_mode == "Sharded"):
+        mapping_rows = intersect_mapping_rows_with_sharded_engine(polygon_where_clause, tile_columns, tile_rows, worker_count)
+    else:
+        output_warning("The intersect mode is Geoprocessing, so there is nothing to compare it with")
+        return
+    engine_pair_set = set()
+    duplicate_count = 0
+    for row in mapping_rows:
+        if (row[0], row[7]) in engine_pair_set:
+            duplicate_count = duplicate_count + 1
+        engine_pair_set.add((row[0], row[7]))
+
+    geoprocessing_pair_set = set()
+    for row in read_mapping_feature_class_rows(create_mapping_feature_class(polygon_where_clause, spill_to_disk)):
+        geoprocessing_pair_set.add((row[0], row[7]))
+
+    engine_only_list = sorted(engine_pair_set - geoprocessing_pair_set)
+    geoprocessing_only_list = sorted(geoprocessing_pair_set - engine_pair_set)
+    for polygon_oid, land_registry_id in engine_only_list:
+        output_message('Only found by {}: polygon ID {}, Land Registry ID {}'.format(intersect_mode, polygon_oid, land_registry_id))
+    for polygon_oid, land_registry_id in geoprocessing_only_list:
+        output_message('Only found by Geoprocessing: polygon ID {}, Land Registry ID {}'.format(polygon_oid, land_registry_id))
+    output_warning('{} found {} pairs ({} duplicated) and Geoprocessing {}: {} only found by {}, {} only found by Geoprocessing'.format(
+        intersect_mode, len(engine_pair_set), duplicate_count, len(geoprocessing_pair_set), len(engine_only_list), intersect_mode, len(geoprocessing_only_list)))
+
+def read_sketch_polygons(spatial_reference, polygon_where_clause):
+    polygon_list = list()
+    fields = ['OID@', 'Site_Identifier', 'SHAPE@']
+    with arcpy.da.SearchCursor(sketch_polygon_feature_class_path, fields, polygon_where_clause, spatial_reference) as cursor:
+        for row in cursor:
+            if row[2]:
+                polygon_list.append((row[0], row[1], polygon_rings.geometry_rings(row[2])))
+    return polygon_list
+
+def intersect_parcels(engine, parcel_source):
+    fields = ['SHAPE@', 'Title_Number', 'Tenure', 'Proprietor', 'Address', 'Revision_Date', 'OID@']
+    with arcpy.da.SearchCursor(parcel_source, fields) as cursor:
+        parcels = ((row[0], row[1:]) for row in cursor)
+        for polygon_oid, site_identifier, parcel_attributes in engine.intersect(parcels, geometry_envelope, polygon_rings.geometry_rings):
+            yield (polygon_oid, site_identifier) + tuple(parcel_attributes)
+
+def geometry_envelope(geometry):
+    extent = geometry.extent
+    return (extent.XMin, extent.YMin, extent.XMax, extent.YMax)
+
+def populate_mapping_database_tables(session, mapping_rows, sync_mode, polygon_scope=None):
+    ## polygon_scope is the set of polygon OIDs to sync, or None for every polygon
 
-        cursor = conn.cursor()
+    output_message("Populate mapping database tables...")
 
-        table_name = "tblStoragePolygonIdToLandRegistryIdMapping"
+    ## Create dictionary of mapping data. The intersect modes produce rows in different orders,
+    ## so each polygon's parcels are put in Land Registry OID order before filling its slots.
+    mapping_dictionary = mapping_row_aggregator.aggregate_rows_in_parcel_order(mapping_rows)
 
-        cursor.execute(sql)
-        conn.commit()
+    ## Scoped polygons that no longer intersect any parcel need their slots and ID rows cleared
+    if polygon_scope is not None:
+        for polygon_oid in polygon_scope:
+            if not polygon_oid in mapping_dictionary:
+                mapping_dictionary[polygon_oid] = mapping_row_aggregator.SiteIdentifierMappingDetails(polygon_oid)
 
-        conn.close()
-    except Exception as e:
-        output_error(e)
-        conn.close()
+    mapping_details_list = [mapping_dictionary[key] for key in mapping_dictionary]
+    if (sync_mode == "Delta"):
+        sync_mapping_details_to_database(session, mapping_details_list, polygon_scope)
+    else:
+        mapping_table_sync.clear_id_mapping_table(session)
+        add_site_identifier_mapping_details_to_database(session, mapping_details_list)
+        add_id_mapping_details_to_database(session, mapping_details_list)
+
+def stream_mapping_database_tables(session, mapping_rows, sync_mode, polygon_scope, batch_size):
+    ## mapping_rows must be grouped by polygon OID
+    output_message("Streaming mapping rows into the database tables...")
+    aggregator = mapping_row_aggregator.MappingRowAggregator()
+    writer = mapping_table_sync.MappingDetailsStreamWriter(session, sync_mode, polygon_scope, batch_size)
+    for mapping_details in aggregator.aggregate(mapping_rows):
+        report_mapping_details(mapping_details)
+        writer.write(mapping_details)
+
+    ## Scoped polygons that no longer intersect any parcel need their slots and ID rows cleared
+    if polygon_scope is not None:
+        for polygon_oid in sorted(polygon_scope - aggregator.polygon_oid_set):
+            mapping_details = mapping_row_aggregator.SiteIdentifierMappingDetails(polygon_oid)
+            report_mapping_details(mapping_details)
+            writer.write(mapping_details)
+    writer.finish()
+
+    output_message('{} intersect rows aggregated into {} polygons, at most {} rows held for one polygon'.format(aggregator.row_count, aggregator.polygon_count, aggregator.peak_row_count))
+    output_warning('{} sync: {} polygons updated in tblStoragePolygonToLandRegistryMapping, {} rows inserted and {} rows deleted in tblStoragePolygonIdToLandRegistryIdMapping'.format(sync_mode, writer.updated_count, writer.inserted_count, writer.deleted_count))
+
+def add_site_identifier_mapping_details_to_database(session, mapping_details_list):
+    parameter_list = list()
+    for mapping_details in mapping_details_list:
+        parameter_list.append(mapping_table_sync.get_tblStoragePolygonToLandRegistryMapping_parameters(mapping_details))
+        report_mapping_details(mapping_details)
+
+    output_message('Updating {} polygons in tblStoragePolygonToLandRegistryMapping...'.format(len(parameter_list)))
+    session.executemany(mapping_table_sync.get_update_tblStoragePolygonToLandRegistryMapping_sql(), parameter_list)
+
+def report_mapping_details(mapping_details):
+    if (mapping_details.length > mapping_table_sync.mapping_slot_count):
+        output_warning("Too many mapping items for polygon ID {} ({} found)".format(mapping_details.polygon_id, mapping_details.length))
+    else:
+        output_message('{} mapping items added for polygon ID {}'.format(mapping_details.length, mapping_details.polygon_id))
+
+def sync_mapping_details_to_database(session, mapping_details_list, polygon_scope=None):
+    for mapping_details in mapping_details_list:
+        report_mapping_details(mapping_details)
+    output_message('Reading current mapping table rows...')
+    updated_count = mapping_table_sync.sync_site_identifier_mapping_details_to_database(session, mapping_details_list)
+    inserted_count, deleted_count = mapping_table_sync.sync_id_mapping_details_to_database(session, mapping_details_list, polygon_scope)
+    output_warning('Delta sync: {} polygons updated in tblStoragePolygonToLandRegistryMapping, {} rows inserted and {} rows deleted in tblStoragePolygonIdToLandRegistryIdMapping'.format(updated_count, inserted_count, deleted_count))
+
+def add_id_mapping_details_to_database(session, mapping_details_list):
+    parameter_list = list()
+    for mapping_details in mapping_details_list:
+        parameter_list.extend(mapping_table_sync.get_tblStoragePolygonIdToLandRegistryIdMapping_parameters(mapping_details))
+
+    output_message('Inserting {} rows into tblStoragePolygonIdToLandRegistryIdMapping...'.format(len(parameter_list)))
+    session.executemany(mapping_table_sync.get_add_ids_tblStoragePolygonIdToLandRegistryIdMapping_sql(), parameter_list)
 
 def output_message(message):
     if (Debug == True):
@@ -0,0 +1,76 @@
+import os
+import sys
+import timeit
+
+## Times the duplicate checks made while aggregating one heavily overlapped polygon's intersect
+## rows, comparing SiteIdentifierMappingDetails with the list based class it replaced. It only
+## needs the pure Python aggregator module, so runs without ArcGIS:
+##
+##     python benchmark_mapping_details.py [row count] [unique parcel count]
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import mapping_row_aggregator
+
+class ListSiteIdentifierMappingDetails:
+
+    ## The previous implementation: five parallel lists, searched end to end for every row
+
+    def __init__(self, polygon_id):
+        self._polygon_id = polygon_id
+        self._title_number_list = list()
+        self._tenure_list = list()
+        self._proprietor_list = list()
+        self._address_list = list()
+        self._land_registry_id_list = list()
+
+    def _contains_details(self, title_number, tenure, proprietor, address):
+        for index in range(0, len(self._title_number_list)):
+            if (self._title_number_list[index] == title_number and self._tenure_list[index] == tenure and self._proprietor_list[index] == proprietor and self._address_list[index] == address):
+                return True
+        return False
+
+    def add_details(self, title_number, tenure, proprietor, address, land_registry_id):
+        if (self._contains_details(title_number, tenure, proprietor, address)):
+            return False
+        self._title_number_list.append(title_number)
+        self._tenure_list.append(tenure)
+        self._proprietor_list.append(proprietor)
+        self._address_list.append(address)
+        self._land_registry_id_list.append(land_registry_id)
+        return True
+
+    @property
+    def length(self):
+        return len(self._title_number_list)
+
+def create_rows(row_count, unique_count):
+    ## Each parcel appears row_count / unique_count times, as when a polygon overlaps many split parcels
+    return [('T{}'.format(index % unique_count), 'Freehold', 'OWNER {}'.format(index % unique_count), 'ADDRESS {}'.format(index % unique_count), index) for index in range(0, row_count)]
+
+def aggregate(details_class, row_list):
+    mapping_details = details_class(1)
+    for title_number, tenure, proprietor, address, land_registry_id in row_list:
+        mapping_details.add_details(title_number, tenure, proprietor, address, land_registry_id)
+    return mapping_details.length
+
+def best_time(function, repeat=3):
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+def main():
+    row_count = 3000
+    unique_count = 1500
+    if len(sys.argv) > 2:
+        row_count = int(sys.argv[1])
+        unique_count = int(sys.argv[2])
+    row_list = create_rows(row_count, unique_count)
+    if (aggregate(ListSiteIdentifierMappingDetails, row_list) != aggregate(mapping_row_aggregator.SiteIdentifierMappingDetails, row_list)):
+        raise ValueError('The two implementations kept different numbers of details')
+
+    list_seconds = best_time(lambda: aggregate(ListSiteIdentifierMappingDetails, row_list))
+    set_seconds = best_time(lambda: aggregate(mapping_row_aggregator.SiteIdentifierMappingDetails, row_list))
+    print('{} intersect rows, {} unique parcels'.format(row_count, unique_count))
+    print('List based details:    {:.4f}s'.format(list_seconds))
+    print('Hash indexed details:  {:.4f}s'.format(set_seconds))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+import re
+
+## Database session layer for the mapping writer. Works with any DB-API 2.0 connection
+## factory (pyodbc against SQL Server, sqlite3 for local testing) using qmark parameters.
+
+class ConnectionPool:
+
+    def __init__(self, connection_factory, max_idle_connections=1):
+        self._connection_factory = connection_factory
+        self._max_idle_connections = max_idle_connections
+        self._idle_connection_list = list()
+        self._connections_opened = 0
+
+    def acquire(self):
+        if len(self._idle_connection_list) > 0:
+            return self._idle_connection_list.pop()
+        self._connections_opened = self._connections_opened + 1
+        return self._connection_factory()
+
+    def release(self, connection):
+        if len(self._idle_connection_list) < self._max_idle_connections:
+            self._idle_connection_list.append(connection)
+        else:
+            connection.close()
+
+    def close_all(self):
+        for connection in self._idle_connection_list:
+            connection.close()
+        self._idle_connection_list = list()
+
+    @property
+    def connections_opened(self):
+        return self._connections_opened
+
+class DatabaseSession:
+
+    ## Runs every statement on one pooled connection inside an explicit transaction. With a
+    ## commit_batch_size of 0 the whole session is one transaction, committed when the session
+    ## closes without error; otherwise a commit is made after every commit_batch_size statements.
+    ## executemany sends its rows in batches of executemany_batch_size (0 sends them all at
+    ## once). fast_executemany turns on pyodbc's array binding, which only the Microsoft ODBC
+    ## Driver 13 for SQL Server and later support; see driver_supports_fast_executemany.
+
+    def __init__(self, connection_pool, commit_batch_size=0, executemany_batch_size=0, fast_executemany=False):
+        self._connection_pool = connection_pool
+        self._commit_batch_size = commit_batch_size
+        self._executemany_batch_size = executemany_batch_size
+        self._connection = connection_pool.acquire()
+        self._cursor = self._connection.cursor()
+        if (fast_executemany and hasattr(self._cursor, 'fast_executemany')):
+            self._cursor.fast_executemany = True
+        self._statement_count = 0
+        self._uncommitted_count = 0
+        self._commit_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close(exception_type is None)
+        return False
+
+    def execute(self, sql, parameters=None):
+        if parameters is None:
+            self._cursor.execute(sql)
+        else:
+            self._cursor.execute(sql, parameters)
+        self._statement_executed(1)
+
+    def executemany(self, sql, parameter_list):
+        parameter_list = list(parameter_list)
+        batch_size = self._executemany_batch_size
+        if (batch_size <= 0):
+            batch_size = max(len(parameter_list), 1)
+        for start in range(0, len(parameter_list), batch_size):
+            batch = parameter_list[start:start + batch_size]
+            self._cursor.executemany(sql, batch)
+            self._statement_executed(len(batch))
+
+    def fetchall(self, sql, parameters=None):
+        if parameters is None:
+            self._cursor.execute(sql)
+        else:
+            self._cursor.execute(sql, parameters)
+        return self._cursor.fetchall()
+
+    def commit(self):
+        self._connection.commit()
+        self._uncommitted_count = 0
+        self._commit_count = self._commit_count + 1
+
+    def rollback(self):
+        self._connection.rollback()
+        self._uncommitted_count = 0
+
+    def close(self, commit=True):
+        if self._connection is None:
+            return
+        try:
+            if (commit):
+                self.commit()
+            else:
+                self.rollback()
+        finally:
+            self._cursor.close()
+            self._connection_pool.release(self._connection)
+            self._connection = None
+            self._cursor = None
+
+    @property
+    def cursor(self):
+        return self._cursor
+
+    @property
+    def statement_count(self):
+        return self._statement_count
+
+    @property
+    def commit_count(self):
+        return self._commit_count
+
+    def _statement_executed(self, count):
+        self._statement_count = self._statement_count + count
+        self._uncommitted_count = self._uncommitted_count + count
+        if (self._commit_batch_size > 0 and self._uncommitted_count >= self._commit_batch_size):
+            self.commit()
+
+def driver_supports_fast_executemany(connection_string):
+    ## pyodbc has the fast_executemany attribute whatever the driver, but the legacy
+    ## {SQL Server} driver and ODBC Driver 11 do not support array binding
+    match = re.search(r'DRIVER=\{?ODBC Driver (\d+) for SQL Server', connection_string, re.IGNORECASE)
+    return (match is not None and int(match.group(1)) >= 13)
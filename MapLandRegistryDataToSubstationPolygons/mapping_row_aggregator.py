@@ -0,0 +1,119 @@
+## Groups the polygon/parcel intersect rows into one SiteIdentifierMappingDetails per sketch
+## polygon. Rows are (polygon OID, site identifier, title number, tenure, proprietor, address,
+## revision date, Land Registry OID), as produced by every intersect mode.
+##
+## Only the first 15 parcels of a polygon fill its mapping slots, so both ways of grouping give
+## each polygon its parcels in Land Registry OID order, keeping the lowest OID of duplicates,
+## whatever order the intersect produced them in.
+
+class SiteIdentifierMappingDetails(object):
+
+    ## One (title number, tenure, proprietor, address, land registry id) tuple per mapping,
+    ## in insertion order, with a key set for constant time duplicate checks
+    __slots__ = ('_polygon_id', '_record_list', '_key_set')
+
+    def __init__(self, polygon_id):
+        self._polygon_id = polygon_id
+        self._record_list = list()
+        self._key_set = set()
+
+    def _contains_details(self, title_number, tenure, proprietor, address):
+        return (title_number, tenure, proprietor, address) in self._key_set
+
+    def add_details(self, title_number, tenure, proprietor, address, land_registry_id):
+        key = (title_number, tenure, proprietor, address)
+        if key in self._key_set:
+            return False
+        self._key_set.add(key)
+        self._record_list.append((title_number, tenure, proprietor, address, land_registry_id))
+        return True
+
+    @property
+    def length(self):
+        return len(self._record_list)
+
+    @property
+    def polygon_id(self):
+        return self._polygon_id
+
+    def get_title_number(self, number):
+        return self._record_list[number][0]
+
+    def get_tenure(self, number):
+        return self._record_list[number][1]
+
+    def get_proprietor(self, number):
+        return self._record_list[number][2]
+
+    def get_address(self, number):
+        return self._record_list[number][3]
+
+    def get_land_registry_id(self, number):
+        return self._record_list[number][4]
+
+def aggregate_rows_in_parcel_order(mapping_rows):
+    ## Groups rows in any order, returning a dictionary of SiteIdentifierMappingDetails by
+    ## polygon OID. Only the lowest Land Registry OID of each distinct set of details is held
+    ## until every row has been read.
+    parcel_dictionary = dict()
+    for row in mapping_rows:
+        land_registry_id_dictionary = parcel_dictionary.setdefault(row[0], dict())
+        key = (row[2], row[3], row[4], row[5])
+        if not key in land_registry_id_dictionary or row[7] < land_registry_id_dictionary[key]:
+            land_registry_id_dictionary[key] = row[7]
+
+    mapping_dictionary = dict()
+    for polygon_oid in parcel_dictionary:
+        mapping_details = SiteIdentifierMappingDetails(polygon_oid)
+        for key, land_registry_id in sorted(parcel_dictionary[polygon_oid].items(), key=lambda item: item[1]):
+            mapping_details.add_details(key[0], key[1], key[2], key[3], land_registry_id)
+        mapping_dictionary[polygon_oid] = mapping_details
+    return mapping_dictionary
+
+class MappingRowAggregator(object):
+
+    ## Turns intersect rows grouped by polygon OID into one finished SiteIdentifierMappingDetails
+    ## per polygon, so that only the current polygon's details are held in memory. Within each
+    ## polygon the rows must be in Land Registry OID order.
+
+    def __init__(self):
+        self._polygon_oid_set = set()
+        self._row_count = 0
+        self._peak_row_count = 0
+
+    def aggregate(self, mapping_rows):
+        mapping_details = None
+        polygon_row_count = 0
+        for row in mapping_rows:
+            polygon_oid = row[0]
+            if mapping_details is None or mapping_details.polygon_id != polygon_oid:
+                if mapping_details is not None:
+                    yield mapping_details
+                if polygon_oid in self._polygon_oid_set:
+                    raise ValueError('Intersect rows are not grouped by polygon, polygon ID {} seen twice'.format(polygon_oid))
+                self._polygon_oid_set.add(polygon_oid)
+                mapping_details = SiteIdentifierMappingDetails(polygon_oid)
+                polygon_row_count = 0
+            # Avoid adding duplicates (title number, tenure, proprietor and address are all the same)
+            mapping_details.add_details(row[2], row[3], row[4], row[5], row[7])
+            polygon_row_count = polygon_row_count + 1
+            self._row_count = self._row_count + 1
+            self._peak_row_count = max(self._peak_row_count, polygon_row_count)
+        if mapping_details is not None:
+            yield mapping_details
+
+    @property
+    def polygon_oid_set(self):
+        return self._polygon_oid_set
+
+    @property
+    def polygon_count(self):
+        return len(self._polygon_oid_set)
+
+    @property
+    def row_count(self):
+        return self._row_count
+
+    @property
+    def peak_row_count(self):
+        return self._peak_row_count
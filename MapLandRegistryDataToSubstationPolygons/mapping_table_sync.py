@@ -0,0 +1,214 @@
+## Writes the sketch polygon to Land Registry mappings to the two database tables, through a
+## database_session.DatabaseSession. The Delta functions compare each polygon's details with
+## the current table rows and only send the slot updates, ID inserts and ID deletes needed.
+##
+## tblStoragePolygonToLandRegistryMapping has one row per sketch polygon, with slots for its
+## first mapping_slot_count parcels. tblStoragePolygonIdToLandRegistryIdMapping has a row for
+## every (polygon, parcel) pair.
+
+## Number of Title_Number_n/Tenure_n/Proprietor_n/Address_n slots in tblStoragePolygonToLandRegistryMapping
+mapping_slot_count = 15
+
+class MappingDetailsStreamWriter(object):
+
+    ## Queues the statements for each polygon as it arrives and sends them in batches of batch_size.
+    ## In Delta mode the current table rows are read lookup_batch_size polygons at a time as their
+    ## details arrive, so only those polygons' rows are held rather than the whole tables.
+
+    def __init__(self, session, sync_mode, polygon_scope, batch_size, lookup_batch_size=500):
+        self._session = session
+        self._sync_mode = sync_mode
+        self._polygon_scope = polygon_scope
+        self._batch_size = max(batch_size, 1)
+        ## SQL Server allows at most 2100 parameters in a statement
+        self._lookup_batch_size = max(min(lookup_batch_size, 2000), 1)
+        self._pending_details_list = list()
+        self._written_polygon_id_set = set()
+        self._update_parameter_list = list()
+        self._insert_parameter_list = list()
+        self._delete_parameter_list = list()
+        self._updated_count = 0
+        self._inserted_count = 0
+        self._deleted_count = 0
+        if (sync_mode != "Delta"):
+            clear_id_mapping_table(session)
+
+    def write(self, mapping_details):
+        if (self._sync_mode == "Delta"):
+            self._written_polygon_id_set.add(mapping_details.polygon_id)
+            self._pending_details_list.append(mapping_details)
+            if len(self._pending_details_list) >= self._lookup_batch_size:
+                self._sync_pending_details()
+        else:
+            self._update_parameter_list.append(get_tblStoragePolygonToLandRegistryMapping_parameters(mapping_details))
+            self._insert_parameter_list.extend(get_tblStoragePolygonIdToLandRegistryIdMapping_parameters(mapping_details))
+        self._flush(False)
+
+    def finish(self):
+        if (self._sync_mode == "Delta"):
+            self._sync_pending_details()
+            if self._polygon_scope is None:
+                self._delete_unwritten_polygon_ids()
+        self._flush(True)
+
+    @property
+    def updated_count(self):
+        return self._updated_count
+
+    @property
+    def inserted_count(self):
+        return self._inserted_count
+
+    @property
+    def deleted_count(self):
+        return self._deleted_count
+
+    def _sync_pending_details(self):
+        if len(self._pending_details_list) == 0:
+            return
+        polygon_id_list = [mapping_details.polygon_id for mapping_details in self._pending_details_list]
+        current_slot_dictionary = dict()
+        for row in self._session.fetchall(get_select_tblStoragePolygonToLandRegistryMapping_sql(len(polygon_id_list)), polygon_id_list):
+            current_slot_dictionary[row[0]] = tuple(row[1:])
+        current_id_dictionary = self._read_current_ids(polygon_id_list)
+
+        for mapping_details in self._pending_details_list:
+            parameters = get_tblStoragePolygonToLandRegistryMapping_parameters(mapping_details)
+            polygon_oid = mapping_details.polygon_id
+            ## Polygons without a row in the table are skipped, as the UPDATE would not change them
+            if (polygon_oid in current_slot_dictionary and current_slot_dictionary[polygon_oid] != parameters[:-1]):
+                self._update_parameter_list.append(parameters)
+            current_id_set = current_id_dictionary.get(polygon_oid, set())
+            required_id_set = set()
+            for id_parameters in get_tblStoragePolygonIdToLandRegistryIdMapping_parameters(mapping_details):
+                required_id_set.add(id_parameters[1])
+                if not id_parameters[1] in current_id_set:
+                    self._insert_parameter_list.append(id_parameters)
+            self._delete_parameter_list.extend([(polygon_oid, land_registry_id) for land_registry_id in sorted(current_id_set - required_id_set)])
+        self._pending_details_list = list()
+
+    def _delete_unwritten_polygon_ids(self):
+        ## With every polygon in scope, the ID rows of polygons that produced no intersect rows go.
+        ## Only their IDs are read for the whole table; their rows are read a batch at a time.
+        unwritten_polygon_id_list = list()
+        for row in self._session.fetchall(get_select_polygon_ids_tblStoragePolygonIdToLandRegistryIdMapping_sql()):
+            if not row[0] in self._written_polygon_id_set:
+                unwritten_polygon_id_list.append(row[0])
+        for start in range(0, len(unwritten_polygon_id_list), self._lookup_batch_size):
+            polygon_id_list = unwritten_polygon_id_list[start:start + self._lookup_batch_size]
+            current_id_dictionary = self._read_current_ids(polygon_id_list)
+            for polygon_oid in polygon_id_list:
+                self._delete_parameter_list.extend([(polygon_oid, land_registry_id) for land_registry_id in sorted(current_id_dictionary.get(polygon_oid, set()))])
+            self._flush(False)
+
+    def _read_current_ids(self, polygon_id_list):
+        current_id_dictionary = dict()
+        for row in self._session.fetchall(get_select_tblStoragePolygonIdToLandRegistryIdMapping_sql(len(polygon_id_list)), polygon_id_list):
+            current_id_dictionary.setdefault(row[0], set()).add(row[1])
+        return current_id_dictionary
+
+    def _flush(self, force):
+        if (force or len(self._update_parameter_list) >= self._batch_size):
+            self._session.executemany(get_update_tblStoragePolygonToLandRegistryMapping_sql(), self._update_parameter_list)
+            self._updated_count = self._updated_count + len(self._update_parameter_list)
+            self._update_parameter_list = list()
+        if (force or len(self._delete_parameter_list) >= self._batch_size):
+            self._session.executemany(get_delete_ids_tblStoragePolygonIdToLandRegistryIdMapping_sql(), self._delete_parameter_list)
+            self._deleted_count = self._deleted_count + len(self._delete_parameter_list)
+            self._delete_parameter_list = list()
+        if (force or len(self._insert_parameter_list) >= self._batch_size):
+            self._session.executemany(get_add_ids_tblStoragePolygonIdToLandRegistryIdMapping_sql(), self._insert_parameter_list)
+            self._inserted_count = self._inserted_count + len(self._insert_parameter_list)
+            self._insert_parameter_list = list()
+
+def sync_site_identifier_mapping_details_to_database(session, mapping_details_list):
+    current_slot_dictionary = dict()
+    for row in session.fetchall(get_select_tblStoragePolygonToLandRegistryMapping_sql()):
+        current_slot_dictionary[row[0]] = tuple(row[1:])
+
+    ## Polygons without a row in the table are skipped, as the UPDATE would not change them
+    parameter_list = list()
+    for mapping_details in mapping_details_list:
+        parameters = get_tblStoragePolygonToLandRegistryMapping_parameters(mapping_details)
+        polygon_oid = mapping_details.polygon_id
+        if (polygon_oid in current_slot_dictionary and current_slot_dictionary[polygon_oid] != parameters[:-1]):
+            parameter_list.append(parameters)
+
+    session.executemany(get_update_tblStoragePolygonToLandRegistryMapping_sql(), parameter_list)
+    return len(parameter_list)
+
+def get_select_tblStoragePolygonToLandRegistryMapping_sql(polygon_id_count=0):
+    ## With a polygon_id_count, only the rows of that many polygon IDs passed as parameters are read
+    column_list = list()
+    for mapping_number in range(1, mapping_slot_count + 1):
+        column_list.append("[Title_Number_{0}], [Tenure_{0}], [Proprietor_{0}], [Address_{0}]".format(mapping_number))
+    return "SELECT [Storage_Polygon_ID], {} FROM [sde].[tblStoragePolygonToLandRegistryMapping]{}".format(", ".join(column_list), polygon_id_where_clause(polygon_id_count))
+
+def get_update_tblStoragePolygonToLandRegistryMapping_sql():
+    ## One wide, parameterised UPDATE covering every slot, so SQL Server can reuse a single cached plan
+    set_list = list()
+    for mapping_number in range(1, mapping_slot_count + 1):
+        set_list.append("[Title_Number_{0}] = ?, [Tenure_{0}] = ?, [Proprietor_{0}] = ?, [Address_{0}] = ?".format(mapping_number))
+    return "UPDATE [sde].[tblStoragePolygonToLandRegistryMapping] SET {} WHERE [Storage_Polygon_ID] = ?".format(", ".join(set_list))
+
+def get_tblStoragePolygonToLandRegistryMapping_parameters(mapping_details):
+    parameters = list()
+    for index in range(0, mapping_slot_count):
+        if (index < mapping_details.length):
+            parameters.extend([
+                mapping_details.get_title_number(index),
+                make_text_sql_compliant(mapping_details.get_tenure(index)),
+                make_text_sql_compliant(mapping_details.get_proprietor(index)),
+                make_text_sql_compliant(mapping_details.get_address(index))])
+        else:
+            parameters.extend([None, None, None, None])
+    parameters.append(mapping_details.polygon_id)
+    return tuple(parameters)
+
+def make_text_sql_compliant(input_text):
+    return input_text.replace("'", "`")
+
+def clear_id_mapping_table(session):
+    session.execute(get_clear_tblStoragePolygonIdToLandRegistryIdMapping_sql())
+
+def sync_id_mapping_details_to_database(session, mapping_details_list, polygon_scope=None):
+    ## Rows of polygons outside polygon_scope were not recalculated, so are left alone
+    current_row_set = set()
+    for row in session.fetchall(get_select_tblStoragePolygonIdToLandRegistryIdMapping_sql()):
+        if polygon_scope is None or row[0] in polygon_scope:
+            current_row_set.add((row[0], row[1]))
+
+    required_row_list = list()
+    for mapping_details in mapping_details_list:
+        required_row_list.extend(get_tblStoragePolygonIdToLandRegistryIdMapping_parameters(mapping_details))
+    required_row_set = set(required_row_list)
+
+    insert_parameter_list = [row for row in required_row_list if not row in current_row_set]
+    delete_parameter_list = sorted(current_row_set - required_row_set)
+
+    session.executemany(get_delete_ids_tblStoragePolygonIdToLandRegistryIdMapping_sql(), delete_parameter_list)
+    session.executemany(get_add_ids_tblStoragePolygonIdToLandRegistryIdMapping_sql(), insert_parameter_list)
+    return (len(insert_parameter_list), len(delete_parameter_list))
+
+def get_tblStoragePolygonIdToLandRegistryIdMapping_parameters(mapping_details):
+    return [(mapping_details.polygon_id, mapping_details.get_land_registry_id(index)) for index in range(0, mapping_details.length)]
+
+def get_clear_tblStoragePolygonIdToLandRegistryIdMapping_sql():
+    return 'DELETE FROM tblStoragePolygonIdToLandRegistryIdMapping'
+
+def get_select_tblStoragePolygonIdToLandRegistryIdMapping_sql(polygon_id_count=0):
+    return 'SELECT [Storage_Polygon_ID], [Land_Registry_ID] FROM [sde].[tblStoragePolygonIdToLandRegistryIdMapping]{}'.format(polygon_id_where_clause(polygon_id_count))
+
+def get_select_polygon_ids_tblStoragePolygonIdToLandRegistryIdMapping_sql():
+    return 'SELECT DISTINCT [Storage_Polygon_ID] FROM [sde].[tblStoragePolygonIdToLandRegistryIdMapping]'
+
+def polygon_id_where_clause(polygon_id_count):
+    if (polygon_id_count <= 0):
+        return ''
+    return ' WHERE [Storage_Polygon_ID] IN ({})'.format(', '.join(['?'] * polygon_id_count))
+
+def get_delete_ids_tblStoragePolygonIdToLandRegistryIdMapping_sql():
+    return 'DELETE FROM [sde].[tblStoragePolygonIdToLandRegistryIdMapping] WHERE [Storage_Polygon_ID] = ? AND [Land_Registry_ID] = ?'
+
+def get_add_ids_tblStoragePolygonIdToLandRegistryIdMapping_sql():
+    return 'INSERT INTO [sde].[tblStoragePolygonIdToLandRegistryIdMapping] ([Storage_Polygon_ID],[Land_Registry_ID]) VALUES (?, ?)'
@@ -0,0 +1,48 @@
+import os
+import json
+import hashlib
+
+## Persists a fingerprint of each sketch polygon's site identifier and geometry between runs,
+## so that only new, changed or deleted polygons need to be intersected again. The version of
+## the Land Registry parcels the polygons were mapped against is kept with them, as a parcel
+## refresh changes the mapping of unchanged polygons too.
+
+def polygon_fingerprint(site_identifier, rings):
+    fingerprint = hashlib.sha1()
+    fingerprint.update(repr(site_identifier).encode('utf-8'))
+    for ring in rings:
+        fingerprint.update(b'|')
+        for x, y in ring:
+            fingerprint.update(('%r,%r;' %(float(x), float(y))).encode('ascii'))
+    return fingerprint.hexdigest()
+
+def load_fingerprint_cache(cache_file_path):
+    ## Returns the parcel version and the fingerprint of each polygon OID, or None when there is
+    ## no previous cache, meaning every polygon has to be processed. A cache written before the
+    ## parcel version was kept has a version of None.
+    if not os.path.isfile(cache_file_path):
+        return None
+    with open(cache_file_path, 'r') as cache_file:
+        cache = json.load(cache_file)
+    polygon_dictionary = cache.get("Polygons", dict())
+    return (cache.get("ParcelVersion"), dict([(int(polygon_oid), polygon_dictionary[polygon_oid]) for polygon_oid in polygon_dictionary]))
+
+def save_fingerprint_cache(cache_file_path, parcel_version, fingerprint_dictionary):
+    cache = {
+        "ParcelVersion": parcel_version,
+        "Polygons": dict([(str(polygon_oid), fingerprint_dictionary[polygon_oid]) for polygon_oid in fingerprint_dictionary])}
+    temporary_file_path = cache_file_path + '.tmp'
+    with open(temporary_file_path, 'w') as cache_file:
+        json.dump(cache, cache_file, indent=1, sort_keys=True)
+    if (os.path.isfile(cache_file_path)):
+        os.remove(cache_file_path)
+    os.rename(temporary_file_path, cache_file_path)
+
+def compare_fingerprints(previous_fingerprint_dictionary, current_fingerprint_dictionary):
+    ## Returns the sets of new or changed polygon OIDs and of deleted polygon OIDs
+    changed_oid_set = set()
+    for polygon_oid in current_fingerprint_dictionary:
+        if previous_fingerprint_dictionary.get(polygon_oid) != current_fingerprint_dictionary[polygon_oid]:
+            changed_oid_set.add(polygon_oid)
+    deleted_oid_set = set(previous_fingerprint_dictionary.keys()) - set(current_fingerprint_dictionary.keys())
+    return (changed_oid_set, deleted_oid_set)
@@ -0,0 +1,273 @@
+## In-process polygon/parcel intersect. The comparatively few sketch polygons are held in a
+## packed STR R-tree, and the Land Registry parcels are streamed past it; each parcel's
+## envelope is checked against the tree before any exact geometry test is made.
+##
+## Geometries are plain lists of closed rings, each a list of (x, y) tuples. Parts and holes
+## are all just rings, since the exact test uses the even-odd rule.
+
+class PackedRTree:
+
+    def __init__(self, item_list, node_capacity=16):
+        ## item_list holds (envelope, value) pairs, envelopes being (xmin, ymin, xmax, ymax)
+        self._node_capacity = node_capacity
+        level = [(envelope, True, value) for envelope, value in item_list]
+        while len(level) > node_capacity:
+            level = self._pack_level(level)
+        self._root_list = level
+
+    def query(self, envelope):
+        value_list = list()
+        stack = list(self._root_list)
+        while len(stack) > 0:
+            node_envelope, is_leaf, content = stack.pop()
+            if envelopes_intersect(node_envelope, envelope):
+                if (is_leaf):
+                    value_list.append(content)
+                else:
+                    stack.extend(content)
+        return value_list
+
+    def _pack_level(self, node_list):
+        ## Sort-Tile-Recursive: sort by x centre into vertical slices, then by y centre within each slice
+        node_count = len(node_list)
+        parent_count = (node_count + self._node_capacity - 1) // self._node_capacity
+        slice_count = int(parent_count ** 0.5) + 1
+        slice_size = slice_count * self._node_capacity
+        node_list = sorted(node_list, key=lambda node: node[0][0] + node[0][2])
+        parent_list = list()
+        for slice_start in range(0, node_count, slice_size):
+            slice_node_list = sorted(node_list[slice_start:slice_start + slice_size], key=lambda node: node[0][1] + node[0][3])
+            for start in range(0, len(slice_node_list), self._node_capacity):
+                child_list = slice_node_list[start:start + self._node_capacity]
+                parent_list.append((union_envelope([child[0] for child in child_list]), False, child_list))
+        return parent_list
+
+class PolygonIntersectEngine:
+
+    def __init__(self, polygon_list, node_capacity=16):
+        ## polygon_list holds (polygon_oid, site_identifier, rings) tuples
+        item_list = list()
+        for polygon_oid, site_identifier, rings in polygon_list:
+            envelope = rings_envelope(rings)
+            if envelope is not None:
+                item_list.append((envelope, (polygon_oid, site_identifier, rings, envelope)))
+        self._polygon_count = len(item_list)
+        self._index = PackedRTree(item_list, node_capacity)
+        self._parcels_read = 0
+        self._candidates_tested = 0
+        self._matches = 0
+
+    def intersect(self, parcel_iterable, envelope_function=None, rings_function=None):
+        ## parcel_iterable yields (geometry, parcel_attributes). By default the geometry is a list of
+        ## rings; other geometry types can be used by passing functions that return its envelope
+        ## and its rings, so rings are only built for parcels that pass the envelope check.
+        if envelope_function is None:
+            envelope_function = rings_envelope
+        for geometry, parcel_attributes in parcel_iterable:
+            self._parcels_read = self._parcels_read + 1
+            if geometry is None:
+                continue
+            parcel_envelope = envelope_function(geometry)
+            if parcel_envelope is None:
+                continue
+            candidate_list = self._index.query(parcel_envelope)
+            if len(candidate_list) == 0:
+                continue
+            if rings_function is None:
+                parcel_rings = geometry
+            else:
+                parcel_rings = rings_function(geometry)
+            for polygon_oid, site_identifier, polygon_rings, polygon_envelope in candidate_list:
+                self._candidates_tested = self._candidates_tested + 1
+                if rings_intersect(polygon_rings, polygon_envelope, parcel_rings, parcel_envelope):
+                    self._matches = self._matches + 1
+                    yield (polygon_oid, site_identifier, parcel_attributes)
+
+    @property
+    def polygon_count(self):
+        return self._polygon_count
+
+    @property
+    def parcels_read(self):
+        return self._parcels_read
+
+    @property
+    def candidates_tested(self):
+        return self._candidates_tested
+
+    @property
+    def matches(self):
+        return self._matches
+
+def rings_envelope(rings):
+    xmin = ymin = float('inf')
+    xmax = ymax = float('-inf')
+    for ring in rings:
+        for x, y in ring:
+            if x < xmin: xmin = x
+            if x > xmax: xmax = x
+            if y < ymin: ymin = y
+            if y > ymax: ymax = y
+    if xmin > xmax:
+        return None
+    return (xmin, ymin, xmax, ymax)
+
+def union_envelope(envelope_list):
+    return (min([envelope[0] for envelope in envelope_list]),
+            min([envelope[1] for envelope in envelope_list]),
+            max([envelope[2] for envelope in envelope_list]),
+            max([envelope[3] for envelope in envelope_list]))
+
+def envelopes_intersect(envelope_a, envelope_b):
+    return not (envelope_a[2] < envelope_b[0] or envelope_b[2] < envelope_a[0] or envelope_a[3] < envelope_b[1] or envelope_b[3] < envelope_a[1])
+
+def rings_intersect(rings_a, envelope_a, rings_b, envelope_b):
+    ## Two polygons intersect when they overlap over a positive area, as with Intersect_analysis.
+    ## Polygons that only share an edge or a vertex, as neighbouring parcels do, do not intersect.
+    shared_envelope = (max(envelope_a[0], envelope_b[0]), max(envelope_a[1], envelope_b[1]), min(envelope_a[2], envelope_b[2]), min(envelope_a[3], envelope_b[3]))
+    if (shared_envelope[0] >= shared_envelope[2] or shared_envelope[1] >= shared_envelope[3]):
+        return False
+    edge_list_a = ring_edges_in_envelope(rings_a, shared_envelope)
+    edge_list_b = ring_edges_in_envelope(rings_b, shared_envelope)
+    ## Boundaries crossing at a point inside both edges always enclose some area of overlap
+    for edge_a in edge_list_a:
+        for edge_b in edge_list_b:
+            if segments_cross(edge_a[0], edge_a[1], edge_b[0], edge_b[1]):
+                return True
+    ## Otherwise the boundaries at most touch, and the polygons overlap when part of one's boundary
+    ## lies inside the other, or both lie on the same side of a boundary they share
+    return (boundary_overlaps(edge_list_a, rings_a, edge_list_b, rings_b) or
+            boundary_overlaps(edge_list_b, rings_b, edge_list_a, rings_a))
+
+def ring_edges_in_envelope(rings, envelope):
+    edge_list = list()
+    for ring in rings:
+        for index in range(0, len(ring) - 1):
+            start = ring[index]
+            end = ring[index + 1]
+            edge_envelope = (min(start[0], end[0]), min(start[1], end[1]), max(start[0], end[0]), max(start[1], end[1]))
+            if envelopes_intersect(edge_envelope, envelope):
+                edge_list.append((start, end))
+    return edge_list
+
+def boundary_overlaps(edge_list, rings, other_edge_list, other_rings):
+    ## Each edge is split wherever the other boundary touches it, so every piece lies wholly
+    ## inside, wholly outside or along the other boundary and its midpoint decides which
+    for start, end in edge_list:
+        if start == end:
+            continue
+        for piece_start, piece_end in split_edge(start, end, other_edge_list):
+            midpoint = ((piece_start[0] + piece_end[0]) / 2.0, (piece_start[1] + piece_end[1]) / 2.0)
+            if (point_on_collinear_edge(midpoint, start, end, other_edge_list)):
+                for side_point in side_points(piece_start, piece_end, midpoint):
+                    if point_in_rings(side_point, rings) and point_in_rings(side_point, other_rings):
+                        return True
+            elif point_in_rings(midpoint, other_rings):
+                return True
+    return False
+
+def split_edge(start, end, other_edge_list):
+    ## Returns the pieces of the edge between the points where other edges touch or cross it
+    position_set = set([0.0, 1.0])
+    for other_start, other_end in other_edge_list:
+        d1 = orientation(other_start, other_end, start)
+        d2 = orientation(other_start, other_end, end)
+        if (d1 == 0 and d2 == 0):
+            ## Collinear edges: split at the other edge's ends where they lie on this edge
+            for point in (other_start, other_end):
+                if on_segment(start, end, point):
+                    position_set.add(edge_position(start, end, point))
+            continue
+        if (d1 > 0 and d2 > 0) or (d1 < 0 and d2 < 0):
+            continue
+        d3 = orientation(start, end, other_start)
+        d4 = orientation(start, end, other_end)
+        if (d3 > 0 and d4 > 0) or (d3 < 0 and d4 < 0):
+            continue
+        position_set.add(d1 / float(d1 - d2))
+    position_list = sorted([position for position in position_set if 0.0 <= position <= 1.0])
+    point_list = [interpolate(start, end, position) for position in position_list]
+    return [(point_list[index], point_list[index + 1]) for index in range(0, len(point_list) - 1) if point_list[index] != point_list[index + 1]]
+
+def edge_position(start, end, point):
+    if (abs(end[0] - start[0]) >= abs(end[1] - start[1])):
+        return (point[0] - start[0]) / float(end[0] - start[0])
+    return (point[1] - start[1]) / float(end[1] - start[1])
+
+def interpolate(start, end, position):
+    if position == 0.0:
+        return start
+    if position == 1.0:
+        return end
+    return (start[0] + (end[0] - start[0]) * position, start[1] + (end[1] - start[1]) * position)
+
+def point_on_collinear_edge(point, start, end, other_edge_list):
+    for other_start, other_end in other_edge_list:
+        if (orientation(other_start, other_end, start) == 0 and orientation(other_start, other_end, end) == 0 and on_segment(other_start, other_end, point)):
+            return True
+    return False
+
+def side_points(start, end, midpoint):
+    ## Points just either side of the middle of a piece of shared boundary
+    offset = 1e-6
+    dx = (end[0] - start[0]) * offset
+    dy = (end[1] - start[1]) * offset
+    return ((midpoint[0] - dy, midpoint[1] + dx), (midpoint[0] + dy, midpoint[1] - dx))
+
+def point_in_rings(point, rings):
+    ## Even-odd rule across every ring, so holes and multiple parts are handled together
+    x, y = point
+    inside = False
+    for ring in rings:
+        for index in range(0, len(ring) - 1):
+            x1, y1 = ring[index]
+            x2, y2 = ring[index + 1]
+            if ((y1 > y) != (y2 > y)) and (x < (x2 - x1) * (y - y1) / float(y2 - y1) + x1):
+                inside = not inside
+    return inside
+
+def segments_cross(p1, p2, q1, q2):
+    ## True only when the segments cross at a single point inside both of them
+    d1 = orientation(q1, q2, p1)
+    d2 = orientation(q1, q2, p2)
+    d3 = orientation(p1, p2, q1)
+    d4 = orientation(p1, p2, q2)
+    return ((d1 > 0 and d2 < 0) or (d1 < 0 and d2 > 0)) and ((d3 > 0 and d4 < 0) or (d3 < 0 and d4 > 0))
+
+def orientation(a, b, c):
+    return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+
+def on_segment(a, b, c):
+    return min(a[0], b[0]) <= c[0] <= max(a[0], b[0]) and min(a[1], b[1]) <= c[1] <= max(a[1], b[1])
+
+def shard_polygons(polygon_list, tile_columns, tile_rows):
+    ## Splits the polygons' extent into a grid of tiles and puts each polygon in the one tile
+    ## holding its envelope's centre. Every polygon/parcel pair is then found by exactly one
+    ## tile, so the tile results need no de-duplication. Returns a (selection envelope, polygon
+    ## list) pair for each tile holding any polygons, the selection envelope covering all of the
+    ## tile's polygons so that it can be used to select the tile's candidate parcels.
+    entry_list = list()
+    for polygon in polygon_list:
+        envelope = rings_envelope(polygon[2])
+        if envelope is not None:
+            entry_list.append((polygon, envelope))
+    if len(entry_list) == 0:
+        return list()
+    extent = union_envelope([envelope for polygon, envelope in entry_list])
+    tile_width = (extent[2] - extent[0]) / float(tile_columns)
+    tile_height = (extent[3] - extent[1]) / float(tile_rows)
+    tile_dictionary = dict()
+    for polygon, envelope in entry_list:
+        column = tile_position((envelope[0] + envelope[2]) / 2.0, extent[0], tile_width, tile_columns)
+        row = tile_position((envelope[1] + envelope[3]) / 2.0, extent[1], tile_height, tile_rows)
+        tile_dictionary.setdefault((column, row), list()).append((polygon, envelope))
+    shard_list = list()
+    for tile_key in sorted(tile_dictionary):
+        tile_entry_list = tile_dictionary[tile_key]
+        shard_list.append((union_envelope([envelope for polygon, envelope in tile_entry_list]), [polygon for polygon, envelope in tile_entry_list]))
+    return shard_list
+
+def tile_position(value, start, tile_size, tile_count):
+    if (tile_size <= 0):
+        return 0
+    return max(0, min(int((value - start) / tile_size), tile_count - 1))
@@ -0,0 +1,50 @@
+import sys
+
+## Peak memory use of the current process, for reporting. Uses the peak working set on
+## Windows and ru_maxrss elsewhere, and returns None where neither is available.
+
+def peak_memory_bytes():
+    if (sys.platform == 'win32'):
+        return _windows_peak_working_set()
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if (sys.platform == 'darwin'):
+        return peak
+    ## Linux reports kilobytes
+    return peak * 1024
+
+def format_memory(byte_count):
+    if byte_count is None:
+        return 'unknown'
+    return '{:.1f} MB'.format(byte_count / (1024.0 * 1024.0))
+
+def _windows_peak_working_set():
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ('cb', wintypes.DWORD),
+            ('PageFaultCount', wintypes.DWORD),
+            ('PeakWorkingSetSize', ctypes.c_size_t),
+            ('WorkingSetSize', ctypes.c_size_t),
+            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+            ('PagefileUsage', ctypes.c_size_t),
+            ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(ProcessMemoryCounters)
+    process_handle = ctypes.windll.kernel32.GetCurrentProcess()
+    try:
+        get_process_memory_info = ctypes.windll.psapi.GetProcessMemoryInfo
+    except (AttributeError, OSError):
+        get_process_memory_info = ctypes.windll.kernel32.K32GetProcessMemoryInfo
+    if not get_process_memory_info(process_handle, ctypes.byref(counters), counters.cb):
+        return None
+    return counters.PeakWorkingSetSize
@@ -0,0 +1,69 @@
+import os
+import sys
+import sqlite3
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import database_session
+
+class FastExecutemanyCursor:
+
+    ## Stands in for a pyodbc cursor, which has the attribute whatever the driver
+    def __init__(self):
+        self.fast_executemany = False
+
+class FastExecutemanyConnection:
+
+    def __init__(self):
+        self.cursor_list = list()
+
+    def cursor(self):
+        self.cursor_list.append(FastExecutemanyCursor())
+        return self.cursor_list[-1]
+
+class DriverSupportTests(unittest.TestCase):
+
+    def test_supported_drivers(self):
+        self.assertTrue(database_session.driver_supports_fast_executemany('DRIVER={ODBC Driver 13 for SQL Server};SERVER=kl-sql-005;'))
+        self.assertTrue(database_session.driver_supports_fast_executemany('Driver={ODBC Driver 17 for SQL Server};Server=kl-sql-005;'))
+        self.assertTrue(database_session.driver_supports_fast_executemany('DRIVER=ODBC Driver 18 for SQL Server;SERVER=kl-sql-005;'))
+
+    def test_unsupported_drivers(self):
+        self.assertFalse(database_session.driver_supports_fast_executemany('DRIVER={SQL Server};SERVER=kl-sql-005;'))
+        self.assertFalse(database_session.driver_supports_fast_executemany('DRIVER={SQL Server Native Client 11.0};SERVER=kl-sql-005;'))
+        self.assertFalse(database_session.driver_supports_fast_executemany('DRIVER={ODBC Driver 11 for SQL Server};SERVER=kl-sql-005;'))
+
+class DatabaseSessionTests(unittest.TestCase):
+
+    def test_fast_executemany_off_by_default(self):
+        connection = FastExecutemanyConnection()
+        pool = database_session.ConnectionPool(lambda: connection)
+        database_session.DatabaseSession(pool)
+        database_session.DatabaseSession(pool, fast_executemany=True)
+        self.assertEqual([cursor.fast_executemany for cursor in connection.cursor_list], [False, True])
+
+    def test_executemany_batches_and_commits(self):
+        connection = sqlite3.connect(':memory:')
+        connection.execute('CREATE TABLE mapping (polygon_id INTEGER, title_number TEXT)')
+        pool = database_session.ConnectionPool(lambda: connection)
+        with database_session.DatabaseSession(pool, commit_batch_size=4, executemany_batch_size=3) as session:
+            session.executemany('INSERT INTO mapping VALUES (?, ?)', [(index, 'T{}'.format(index)) for index in range(0, 10)])
+            self.assertEqual(session.statement_count, 10)
+            self.assertEqual(session.commit_count, 2)
+            self.assertEqual(session.fetchall('SELECT COUNT(*) FROM mapping'), [(10,)])
+
+    def test_rollback_on_error(self):
+        connection = sqlite3.connect(':memory:')
+        connection.execute('CREATE TABLE mapping (polygon_id INTEGER)')
+        connection.commit()
+        pool = database_session.ConnectionPool(lambda: connection)
+        try:
+            with database_session.DatabaseSession(pool) as session:
+                session.execute('INSERT INTO mapping VALUES (?)', (1,))
+                raise ValueError('Intersect failed')
+        except ValueError:
+            pass
+        self.assertEqual(connection.execute('SELECT COUNT(*) FROM mapping').fetchall(), [(0,)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import mapping_row_aggregator
+
+def mapping_row(polygon_oid, land_registry_id, title_number=None):
+    if title_number is None:
+        title_number = 'T{}'.format(land_registry_id)
+    return (polygon_oid, 'SUB_{}'.format(polygon_oid), title_number, 'Freehold', 'OWNER', 'ADDRESS', None, land_registry_id)
+
+def land_registry_ids(mapping_details):
+    return [mapping_details.get_land_registry_id(index) for index in range(0, mapping_details.length)]
+
+class FlushObservingRows:
+
+    ## Yields the rows while recording how many had been read each time the aggregator passed on a polygon
+    def __init__(self, row_list):
+        self._row_list = row_list
+        self.read_count = 0
+
+    def __iter__(self):
+        for row in self._row_list:
+            self.read_count = self.read_count + 1
+            yield row
+
+class MappingRowAggregatorTests(unittest.TestCase):
+
+    def test_polygon_flushed_when_polygon_changes(self):
+        rows = FlushObservingRows([mapping_row(1, 10), mapping_row(1, 11), mapping_row(2, 20), mapping_row(3, 30)])
+        aggregator = mapping_row_aggregator.MappingRowAggregator()
+        flushed_list = list()
+        for mapping_details in aggregator.aggregate(rows):
+            flushed_list.append((mapping_details.polygon_id, land_registry_ids(mapping_details), rows.read_count))
+        ## Each polygon is passed on as soon as the first row of the next one is read
+        self.assertEqual(flushed_list, [(1, [10, 11], 3), (2, [20], 4), (3, [30], 4)])
+
+    def test_last_polygon_flushed_at_end(self):
+        aggregator = mapping_row_aggregator.MappingRowAggregator()
+        mapping_details_list = list(aggregator.aggregate(iter([mapping_row(7, 70), mapping_row(7, 71)])))
+        self.assertEqual([(mapping_details.polygon_id, land_registry_ids(mapping_details)) for mapping_details in mapping_details_list], [(7, [70, 71])])
+        self.assertEqual(aggregator.polygon_oid_set, set([7]))
+        self.assertEqual((aggregator.polygon_count, aggregator.row_count, aggregator.peak_row_count), (1, 2, 2))
+
+    def test_no_rows(self):
+        aggregator = mapping_row_aggregator.MappingRowAggregator()
+        self.assertEqual(list(aggregator.aggregate(iter([]))), [])
+        self.assertEqual((aggregator.polygon_count, aggregator.row_count, aggregator.peak_row_count), (0, 0, 0))
+
+    def test_duplicate_details_dropped(self):
+        ## A parcel split into several features has the same title details under each Land Registry ID
+        aggregator = mapping_row_aggregator.MappingRowAggregator()
+        mapping_details_list = list(aggregator.aggregate([mapping_row(1, 10, 'T1'), mapping_row(1, 11, 'T1'), mapping_row(1, 12, 'T2')]))
+        self.assertEqual(land_registry_ids(mapping_details_list[0]), [10, 12])
+        self.assertEqual(aggregator.peak_row_count, 3)
+
+    def test_more_parcels_than_slots(self):
+        ## Every parcel is kept in intersect order, for the ID mapping table, and the first
+        ## 15 are the ones that fill the mapping table's slots
+        row_list = [mapping_row(1, land_registry_id) for land_registry_id in range(100, 120)]
+        mapping_details = list(mapping_row_aggregator.MappingRowAggregator().aggregate(row_list))[0]
+        self.assertEqual(land_registry_ids(mapping_details), list(range(100, 120)))
+        self.assertEqual([mapping_details.get_title_number(index) for index in range(0, 15)], ['T{}'.format(land_registry_id) for land_registry_id in range(100, 115)])
+
+    def test_rows_not_grouped_by_polygon(self):
+        aggregator = mapping_row_aggregator.MappingRowAggregator()
+        mapping_details_iterator = aggregator.aggregate([mapping_row(1, 10), mapping_row(2, 20), mapping_row(1, 11)])
+        self.assertRaises(ValueError, list, mapping_details_iterator)
+
+class ParcelOrderTests(unittest.TestCase):
+
+    def details_tuples(self, mapping_details):
+        return [(mapping_details.get_title_number(index), mapping_details.get_land_registry_id(index)) for index in range(0, mapping_details.length)]
+
+    def test_any_row_order_matches_sorted_stream(self):
+        ## Polygon 1 has 20 parcels, more than the slots, and parcels 5 and 25 share their details
+        row_list = [mapping_row(1, land_registry_id) for land_registry_id in range(1, 21)] + [mapping_row(1, 25, 'T5'), mapping_row(2, 40), mapping_row(2, 30)]
+        sorted_details_list = list(mapping_row_aggregator.MappingRowAggregator().aggregate(sorted(row_list, key=lambda row: (row[0], row[7]))))
+        expected_dictionary = dict([(mapping_details.polygon_id, self.details_tuples(mapping_details)) for mapping_details in sorted_details_list])
+        self.assertEqual(expected_dictionary[2], [('T30', 30), ('T40', 40)])
+        shuffled_row_list = list(row_list)
+        random_generator = random.Random(12)
+        for attempt in range(0, 5):
+            random_generator.shuffle(shuffled_row_list)
+            mapping_dictionary = mapping_row_aggregator.aggregate_rows_in_parcel_order(shuffled_row_list)
+            self.assertEqual(dict([(polygon_oid, self.details_tuples(mapping_dictionary[polygon_oid])) for polygon_oid in mapping_dictionary]), expected_dictionary)
+
+    def test_lowest_land_registry_id_kept_for_duplicates(self):
+        mapping_dictionary = mapping_row_aggregator.aggregate_rows_in_parcel_order([mapping_row(1, 12, 'T1'), mapping_row(1, 11, 'T2'), mapping_row(1, 10, 'T1')])
+        self.assertEqual(self.details_tuples(mapping_dictionary[1]), [('T1', 10), ('T2', 11)])
+
+if __name__ == '__main__':
+    unittest.main()
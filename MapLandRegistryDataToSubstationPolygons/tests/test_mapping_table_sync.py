@@ -0,0 +1,158 @@
+import os
+import sys
+import sqlite3
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import database_session
+import mapping_row_aggregator
+import mapping_table_sync
+
+def create_connection():
+    ## The tables live in an attached database named sde, so the [sde].[table] names resolve
+    connection = sqlite3.connect(':memory:')
+    connection.execute("ATTACH DATABASE ':memory:' AS sde")
+    column_list = ['[Title_Number_{0}] TEXT, [Tenure_{0}] TEXT, [Proprietor_{0}] TEXT, [Address_{0}] TEXT'.format(mapping_number) for mapping_number in range(1, mapping_table_sync.mapping_slot_count + 1)]
+    connection.execute('CREATE TABLE [sde].[tblStoragePolygonToLandRegistryMapping] ([Storage_Polygon_ID] INTEGER, {})'.format(', '.join(column_list)))
+    connection.execute('CREATE TABLE [sde].[tblStoragePolygonIdToLandRegistryIdMapping] ([Storage_Polygon_ID] INTEGER, [Land_Registry_ID] INTEGER)')
+    connection.commit()
+    return connection
+
+def parcel(land_registry_id):
+    return ('T{}'.format(land_registry_id), 'Freehold', "O'NEILL {}".format(land_registry_id), 'ADDRESS {}'.format(land_registry_id), land_registry_id)
+
+def mapping_details(polygon_id, land_registry_id_list):
+    details = mapping_row_aggregator.SiteIdentifierMappingDetails(polygon_id)
+    for land_registry_id in land_registry_id_list:
+        details.add_details(*parcel(land_registry_id))
+    return details
+
+def slot_values(land_registry_id_list):
+    ## The slot columns as written for the parcels, padded with NULLs
+    value_list = list()
+    for land_registry_id in land_registry_id_list[:mapping_table_sync.mapping_slot_count]:
+        title_number, tenure, proprietor, address, land_registry_id = parcel(land_registry_id)
+        value_list.extend([title_number, tenure, proprietor.replace("'", "`"), address])
+    return tuple(value_list + [None] * (4 * mapping_table_sync.mapping_slot_count - len(value_list)))
+
+class MappingTableSyncTestCase(unittest.TestCase):
+
+    ## Seeds the tables with:
+    ##   polygon 1: slots and IDs for parcels 10 and 11
+    ##   polygon 2: slots and IDs for parcel 20
+    ##   polygon 3: empty slots and no IDs
+    ##   polygon 9: slots and IDs for parcel 90
+    current_parcel_dictionary = {1: [10, 11], 2: [20], 3: [], 9: [90]}
+
+    def setUp(self):
+        self._connection = create_connection()
+        slot_parameter_list = list()
+        for polygon_id in sorted(self.current_parcel_dictionary):
+            slot_parameter_list.append(slot_values(self.current_parcel_dictionary[polygon_id]) + (polygon_id,))
+            for land_registry_id in self.current_parcel_dictionary[polygon_id]:
+                self._connection.execute('INSERT INTO [sde].[tblStoragePolygonIdToLandRegistryIdMapping] VALUES (?, ?)', (polygon_id, land_registry_id))
+        self._connection.executemany('INSERT INTO [sde].[tblStoragePolygonToLandRegistryMapping] VALUES ({})'.format(', '.join(['?'] * (4 * mapping_table_sync.mapping_slot_count + 1))),
+                                     [(parameters[-1],) + parameters[:-1] for parameters in slot_parameter_list])
+        self._connection.commit()
+        self._pool = database_session.ConnectionPool(lambda: self._connection)
+
+    def tearDown(self):
+        self._connection.close()
+
+    def slot_rows(self):
+        return dict([(row[0], tuple(row[1:])) for row in self._connection.execute('SELECT * FROM [sde].[tblStoragePolygonToLandRegistryMapping]')])
+
+    def id_rows(self):
+        return sorted(self._connection.execute('SELECT * FROM [sde].[tblStoragePolygonIdToLandRegistryIdMapping]').fetchall())
+
+    def assert_slots(self, parcel_dictionary):
+        slot_dictionary = self.slot_rows()
+        for polygon_id in parcel_dictionary:
+            self.assertEqual(slot_dictionary[polygon_id], slot_values(parcel_dictionary[polygon_id]))
+
+class SyncFunctionTests(MappingTableSyncTestCase):
+
+    def test_slot_updates_only_for_changed_polygons(self):
+        ## Polygon 1 is unchanged, polygon 2 gains a parcel and polygon 4 has no row to update
+        with database_session.DatabaseSession(self._pool) as session:
+            updated_count = mapping_table_sync.sync_site_identifier_mapping_details_to_database(session, [mapping_details(1, [10, 11]), mapping_details(2, [20, 21]), mapping_details(4, [40])])
+        self.assertEqual(updated_count, 1)
+        self.assertEqual(sorted(self.slot_rows().keys()), [1, 2, 3, 9])
+        self.assert_slots({1: [10, 11], 2: [20, 21], 3: [], 9: [90]})
+
+    def test_id_rows_for_every_polygon(self):
+        ## Polygon 9 is not in the details, so with no scope its rows go
+        with database_session.DatabaseSession(self._pool) as session:
+            inserted_count, deleted_count = mapping_table_sync.sync_id_mapping_details_to_database(session, [mapping_details(1, [10, 12]), mapping_details(2, [20]), mapping_details(3, [30])])
+        self.assertEqual((inserted_count, deleted_count), (2, 2))
+        self.assertEqual(self.id_rows(), [(1, 10), (1, 12), (2, 20), (3, 30)])
+
+    def test_id_rows_within_polygon_scope(self):
+        ## Only polygons 1 and 3 were recalculated, so the rows of 2 and 9 are left alone
+        with database_session.DatabaseSession(self._pool) as session:
+            inserted_count, deleted_count = mapping_table_sync.sync_id_mapping_details_to_database(session, [mapping_details(1, [12]), mapping_details(3, [])], set([1, 3]))
+        self.assertEqual((inserted_count, deleted_count), (1, 2))
+        self.assertEqual(self.id_rows(), [(1, 12), (2, 20), (9, 90)])
+
+    def test_slot_cap(self):
+        land_registry_id_list = list(range(100, 120))
+        with database_session.DatabaseSession(self._pool) as session:
+            mapping_table_sync.sync_site_identifier_mapping_details_to_database(session, [mapping_details(3, land_registry_id_list)])
+            inserted_count, deleted_count = mapping_table_sync.sync_id_mapping_details_to_database(session, [mapping_details(3, land_registry_id_list)], set([3]))
+        ## Only the first 15 parcels fit the slots, but every parcel gets an ID row
+        self.assertEqual(self.slot_rows()[3], slot_values(land_registry_id_list[:15]))
+        self.assertEqual(len(mapping_table_sync.get_tblStoragePolygonToLandRegistryMapping_parameters(mapping_details(3, land_registry_id_list))), 4 * 15 + 1)
+        self.assertEqual((inserted_count, deleted_count), (20, 0))
+        self.assertEqual([row for row in self.id_rows() if row[0] == 3], [(3, land_registry_id) for land_registry_id in land_registry_id_list])
+
+class StreamWriterTests(MappingTableSyncTestCase):
+
+    def write(self, sync_mode, polygon_scope, mapping_details_list):
+        ## Batches of one polygon and one statement exercise every flush
+        with database_session.DatabaseSession(self._pool) as session:
+            writer = mapping_table_sync.MappingDetailsStreamWriter(session, sync_mode, polygon_scope, 1, 1)
+            for details in mapping_details_list:
+                writer.write(details)
+            writer.finish()
+        return (writer.updated_count, writer.inserted_count, writer.deleted_count)
+
+    def test_delta_for_every_polygon(self):
+        counts = self.write("Delta", None, [mapping_details(1, [10, 12]), mapping_details(2, [20]), mapping_details(3, [30])])
+        ## Polygon 9 produced no intersect rows, so its ID rows go, but its slots are left as they were
+        self.assertEqual(counts, (2, 2, 2))
+        self.assert_slots({1: [10, 12], 2: [20], 3: [30], 9: [90]})
+        self.assertEqual(self.id_rows(), [(1, 10), (1, 12), (2, 20), (3, 30)])
+
+    def test_delta_within_polygon_scope(self):
+        ## Polygon 3 was in scope but no longer intersects any parcel, so is written with no details
+        counts = self.write("Delta", set([1, 3]), [mapping_details(1, [11, 12]), mapping_details(3, [])])
+        self.assertEqual(counts, (1, 1, 1))
+        self.assert_slots({1: [11, 12], 2: [20], 3: [], 9: [90]})
+        self.assertEqual(self.id_rows(), [(1, 11), (1, 12), (2, 20), (9, 90)])
+
+    def test_delta_unchanged(self):
+        counts = self.write("Delta", None, [mapping_details(polygon_id, self.current_parcel_dictionary[polygon_id]) for polygon_id in sorted(self.current_parcel_dictionary)])
+        self.assertEqual(counts, (0, 0, 0))
+        self.assertEqual(self.id_rows(), [(1, 10), (1, 11), (2, 20), (9, 90)])
+
+    def test_delta_matches_sync_functions(self):
+        mapping_details_list = [mapping_details(1, [12]), mapping_details(2, [20, 21, 22]), mapping_details(3, [])]
+        stream_counts = self.write("Delta", set([1, 2, 3]), mapping_details_list)
+        stream_tables = (self.slot_rows(), self.id_rows())
+        self.tearDown()
+        self.setUp()
+        with database_session.DatabaseSession(self._pool) as session:
+            updated_count = mapping_table_sync.sync_site_identifier_mapping_details_to_database(session, mapping_details_list)
+            inserted_count, deleted_count = mapping_table_sync.sync_id_mapping_details_to_database(session, mapping_details_list, set([1, 2, 3]))
+        self.assertEqual(stream_counts, (updated_count, inserted_count, deleted_count))
+        self.assertEqual(stream_tables, (self.slot_rows(), self.id_rows()))
+
+    def test_reload(self):
+        counts = self.write("Reload", None, [mapping_details(1, [10]), mapping_details(2, [20])])
+        ## Every written polygon's slots are updated and the ID table is rewritten from the start
+        self.assertEqual(counts, (2, 2, 0))
+        self.assert_slots({1: [10], 2: [20], 3: [], 9: [90]})
+        self.assertEqual(self.id_rows(), [(1, 10), (2, 20)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import polygon_fingerprint_cache
+
+def rectangle(xmin, ymin, xmax, ymax):
+    return [(xmin, ymin), (xmin, ymax), (xmax, ymax), (xmax, ymin), (xmin, ymin)]
+
+class PolygonFingerprintTests(unittest.TestCase):
+
+    def test_same_polygon(self):
+        self.assertEqual(polygon_fingerprint_cache.polygon_fingerprint(u'SUB_1_A', [rectangle(0, 0, 1, 1)]),
+                         polygon_fingerprint_cache.polygon_fingerprint(u'SUB_1_A', [rectangle(0, 0, 1, 1)]))
+
+    def test_changed_site_identifier_or_geometry(self):
+        fingerprint = polygon_fingerprint_cache.polygon_fingerprint(u'SUB_1_A', [rectangle(0, 0, 1, 1)])
+        self.assertNotEqual(polygon_fingerprint_cache.polygon_fingerprint(u'SUB_1_B', [rectangle(0, 0, 1, 1)]), fingerprint)
+        self.assertNotEqual(polygon_fingerprint_cache.polygon_fingerprint(u'SUB_1_A', [rectangle(0, 0, 1, 2)]), fingerprint)
+        self.assertNotEqual(polygon_fingerprint_cache.polygon_fingerprint(u'SUB_1_A', [rectangle(0, 0, 1, 1), rectangle(2, 2, 3, 3)]), fingerprint)
+
+    def test_non_ascii_and_missing_site_identifier(self):
+        self.assertNotEqual(polygon_fingerprint_cache.polygon_fingerprint(u'Caf\xe9', []), polygon_fingerprint_cache.polygon_fingerprint(None, []))
+
+class CompareFingerprintsTests(unittest.TestCase):
+
+    def test_new_changed_and_deleted(self):
+        previous_fingerprint_dictionary = {1: 'a', 2: 'b', 3: 'c'}
+        current_fingerprint_dictionary = {1: 'a', 2: 'changed', 4: 'd'}
+        changed_oid_set, deleted_oid_set = polygon_fingerprint_cache.compare_fingerprints(previous_fingerprint_dictionary, current_fingerprint_dictionary)
+        self.assertEqual(changed_oid_set, set([2, 4]))
+        self.assertEqual(deleted_oid_set, set([3]))
+
+    def test_unchanged(self):
+        self.assertEqual(polygon_fingerprint_cache.compare_fingerprints({1: 'a'}, {1: 'a'}), (set(), set()))
+
+class FingerprintCacheFileTests(unittest.TestCase):
+
+    def setUp(self):
+        self._folder = tempfile.mkdtemp(prefix='PolygonFingerprintCacheTest_')
+        self._cache_file_path = os.path.join(self._folder, 'SketchPolygonFingerprints.json')
+
+    def tearDown(self):
+        shutil.rmtree(self._folder, True)
+
+    def test_round_trip(self):
+        fingerprint_dictionary = {1: 'a', 20: 'b', 300: 'c'}
+        polygon_fingerprint_cache.save_fingerprint_cache(self._cache_file_path, '1200|2026-09-30 00:00:00', fingerprint_dictionary)
+        ## Saving again replaces the previous cache
+        polygon_fingerprint_cache.save_fingerprint_cache(self._cache_file_path, '1201|2026-10-01 00:00:00', fingerprint_dictionary)
+        self.assertEqual(polygon_fingerprint_cache.load_fingerprint_cache(self._cache_file_path), ('1201|2026-10-01 00:00:00', fingerprint_dictionary))
+        self.assertEqual(os.listdir(self._folder), ['SketchPolygonFingerprints.json'])
+
+    def test_no_cache(self):
+        self.assertEqual(polygon_fingerprint_cache.load_fingerprint_cache(self._cache_file_path), None)
+
+    def test_cache_without_parcel_version(self):
+        ## As written before the parcel version was kept, which has to be treated as out of date
+        with open(self._cache_file_path, 'w') as cache_file:
+            json.dump({"1": 'a'}, cache_file)
+        self.assertEqual(polygon_fingerprint_cache.load_fingerprint_cache(self._cache_file_path), (None, dict()))
+
+if __name__ == '__main__':
+    unittest.main()
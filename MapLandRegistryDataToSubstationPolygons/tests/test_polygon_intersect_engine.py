@@ -0,0 +1,141 @@
+import os
+import sys
+import unittest
+
+## The engine is pure Python, so these tests run without arcpy
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import polygon_intersect_engine
+
+def rectangle(xmin, ymin, xmax, ymax):
+    ## Clockwise, as ArcGIS stores exterior rings
+    return [(xmin, ymin), (xmin, ymax), (xmax, ymax), (xmax, ymin), (xmin, ymin)]
+
+def hole(xmin, ymin, xmax, ymax):
+    return list(reversed(rectangle(xmin, ymin, xmax, ymax)))
+
+def rings_intersect(rings_a, rings_b):
+    return polygon_intersect_engine.rings_intersect(rings_a, polygon_intersect_engine.rings_envelope(rings_a),
+                                                    rings_b, polygon_intersect_engine.rings_envelope(rings_b))
+
+class RingsIntersectTests(unittest.TestCase):
+
+    def assert_intersect(self, rings_a, rings_b, expected):
+        self.assertEqual(rings_intersect(rings_a, rings_b), expected)
+        self.assertEqual(rings_intersect(rings_b, rings_a), expected)
+
+    def test_crossing(self):
+        self.assert_intersect([rectangle(0, 0, 2, 2)], [rectangle(1, 1, 3, 3)], True)
+
+    def test_crossing_without_vertex_inside(self):
+        ## A plus sign: neither rectangle has a vertex inside the other
+        self.assert_intersect([rectangle(0, 1, 3, 2)], [rectangle(1, 0, 2, 3)], True)
+
+    def test_disjoint(self):
+        self.assert_intersect([rectangle(0, 0, 1, 1)], [rectangle(2, 0, 3, 1)], False)
+
+    def test_disjoint_with_overlapping_envelopes(self):
+        l_shape = [[(0, 0), (0, 3), (1, 3), (1, 1), (3, 1), (3, 0), (0, 0)]]
+        self.assert_intersect(l_shape, [rectangle(2, 2, 3, 3)], False)
+
+    def test_containment(self):
+        self.assert_intersect([rectangle(0, 0, 10, 10)], [rectangle(4, 4, 5, 5)], True)
+
+    def test_containment_sharing_an_edge(self):
+        self.assert_intersect([rectangle(0, 0, 10, 10)], [rectangle(0, 4, 5, 5)], True)
+
+    def test_identical(self):
+        self.assert_intersect([rectangle(0, 0, 1, 1)], [rectangle(0, 0, 1, 1)], True)
+
+    def test_inscribed_touching_at_every_vertex(self):
+        diamond = [[(1, -1), (-1, 1), (1, 3), (3, 1), (1, -1)]]
+        self.assert_intersect(diamond, [rectangle(0, 0, 2, 2)], True)
+
+    def test_inside_hole(self):
+        donut = [rectangle(0, 0, 10, 10), hole(2, 2, 8, 8)]
+        self.assert_intersect(donut, [rectangle(4, 4, 6, 6)], False)
+
+    def test_filling_hole(self):
+        donut = [rectangle(0, 0, 10, 10), hole(2, 2, 8, 8)]
+        self.assert_intersect(donut, [rectangle(2, 2, 8, 8)], False)
+
+    def test_across_hole_edge(self):
+        donut = [rectangle(0, 0, 10, 10), hole(2, 2, 8, 8)]
+        self.assert_intersect(donut, [rectangle(1, 4, 3, 6)], True)
+
+    def test_touching_edge(self):
+        self.assert_intersect([rectangle(0, 0, 1, 1)], [rectangle(1, 0, 2, 1)], False)
+
+    def test_touching_part_of_edge(self):
+        self.assert_intersect([rectangle(0, 0, 1, 1)], [rectangle(1, 0.5, 2, 3)], False)
+
+    def test_touching_vertex(self):
+        self.assert_intersect([rectangle(0, 0, 1, 1)], [rectangle(1, 1, 2, 2)], False)
+
+    def test_vertex_touching_edge(self):
+        triangle = [[(1, 1), (2, 2), (2, 0), (1, 1)]]
+        self.assert_intersect([rectangle(0, 0, 1, 2)], triangle, False)
+
+    def test_multipart(self):
+        two_parts = [rectangle(0, 0, 1, 1), rectangle(5, 5, 6, 6)]
+        self.assert_intersect(two_parts, [rectangle(5.5, 5.5, 7, 7)], True)
+        self.assert_intersect(two_parts, [rectangle(2, 2, 4, 4)], False)
+
+class PolygonIntersectEngineTests(unittest.TestCase):
+
+    def test_neighbouring_parcels_are_not_matched(self):
+        engine = polygon_intersect_engine.PolygonIntersectEngine([(1, 'SUB_1', [rectangle(0, 0, 2, 2)])])
+        parcel_list = [([rectangle(1, 1, 3, 3)], 'overlapping'),
+                       ([rectangle(2, 0, 3, 2)], 'touching edge'),
+                       ([rectangle(-1, -1, 0, 0)], 'touching vertex'),
+                       ([rectangle(0.5, 0.5, 1, 1)], 'inside'),
+                       ([rectangle(5, 5, 6, 6)], 'apart')]
+        result_list = list(engine.intersect(parcel_list))
+        self.assertEqual(result_list, [(1, 'SUB_1', 'overlapping'), (1, 'SUB_1', 'inside')])
+        self.assertEqual(engine.parcels_read, 5)
+        self.assertEqual(engine.matches, 2)
+
+    def test_index_matches_brute_force(self):
+        polygon_list = [(index, 'SUB_{}'.format(index), [rectangle(index % 10, index // 10, index % 10 + 1, index // 10 + 1)]) for index in range(0, 100)]
+        engine = polygon_intersect_engine.PolygonIntersectEngine(polygon_list, node_capacity=4)
+        parcel = rectangle(2.5, 3.5, 4.5, 5)
+        matched_oid_list = sorted([result[0] for result in engine.intersect([([parcel], None)])])
+        expected_oid_list = [polygon[0] for polygon in polygon_list if rings_intersect(polygon[2], [parcel])]
+        self.assertEqual(matched_oid_list, expected_oid_list)
+        self.assertEqual(matched_oid_list, [32, 33, 34, 42, 43, 44])
+
+class ShardPolygonsTests(unittest.TestCase):
+
+    def setUp(self):
+        ## Sketch polygons along parcel boundaries, with parcels straddling the tile edges
+        self.polygon_list = [(index, 'SUB_{}'.format(index), [rectangle(index % 7 * 3, index // 7 * 3, index % 7 * 3 + 4, index // 7 * 3 + 2)]) for index in range(0, 49)]
+        self.parcel_list = [([rectangle(x, y, x + 2.5, y + 1.5)], (x, y)) for x in range(-2, 24, 2) for y in range(-2, 24, 2)]
+
+    def sharded_rows(self, tile_columns, tile_rows):
+        row_list = list()
+        for selection_envelope, tile_polygon_list in polygon_intersect_engine.shard_polygons(self.polygon_list, tile_columns, tile_rows):
+            ## Stands in for selecting the tile's parcels by location
+            tile_parcel_list = [parcel for parcel in self.parcel_list if polygon_intersect_engine.envelopes_intersect(polygon_intersect_engine.rings_envelope(parcel[0]), selection_envelope)]
+            row_list.extend(polygon_intersect_engine.PolygonIntersectEngine(tile_polygon_list).intersect(tile_parcel_list))
+        return row_list
+
+    def test_each_polygon_in_one_tile(self):
+        shard_list = polygon_intersect_engine.shard_polygons(self.polygon_list, 4, 3)
+        sharded_oid_list = sorted([polygon[0] for selection_envelope, tile_polygon_list in shard_list for polygon in tile_polygon_list])
+        self.assertEqual(sharded_oid_list, list(range(0, 49)))
+        self.assertTrue(len(shard_list) > 1)
+
+    def test_matches_single_engine_without_duplicates(self):
+        single_row_list = list(polygon_intersect_engine.PolygonIntersectEngine(self.polygon_list).intersect(self.parcel_list))
+        for tile_columns, tile_rows in ((1, 1), (2, 2), (4, 3), (10, 10)):
+            sharded_row_list = self.sharded_rows(tile_columns, tile_rows)
+            self.assertEqual(len(sharded_row_list), len(set(sharded_row_list)))
+            self.assertEqual(sorted(sharded_row_list), sorted(single_row_list))
+
+    def test_single_point_extent(self):
+        polygon_list = [(1, 'SUB_1', [rectangle(0, 0, 1, 1)]), (2, 'SUB_2', [rectangle(0, 0, 1, 1)])]
+        shard_list = polygon_intersect_engine.shard_polygons(polygon_list, 4, 4)
+        self.assertEqual(shard_list, [((0, 0, 1, 1), polygon_list)])
+        self.assertEqual(polygon_intersect_engine.shard_polygons([], 4, 4), [])
+
+if __name__ == '__main__':
+    unittest.main()
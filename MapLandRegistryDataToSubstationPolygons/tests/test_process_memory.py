@@ -0,0 +1,24 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import process_memory
+
+class ProcessMemoryTests(unittest.TestCase):
+
+    def test_peak_memory_grows(self):
+        peak_bytes = process_memory.peak_memory_bytes()
+        if peak_bytes is None:
+            self.skipTest('Peak memory is not available on this platform')
+        self.assertTrue(peak_bytes > 0)
+        ## A block the size of the previous peak takes the process past it whatever it uses now
+        block = bytearray(peak_bytes)
+        self.assertTrue(process_memory.peak_memory_bytes() > peak_bytes)
+
+    def test_format_memory(self):
+        self.assertEqual(process_memory.format_memory(3 * 1024 * 1024 + 512 * 1024), '3.5 MB')
+        self.assertEqual(process_memory.format_memory(None), 'unknown')
+
+if __name__ == '__main__':
+    unittest.main()
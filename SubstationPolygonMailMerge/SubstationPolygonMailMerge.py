@@ -4,84 +4,14 @@ import sys
 import datetime
 import csv
 import pyodbc
+## Modules shared by the tools live in the Common folder alongside this one
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'Common'))
+import output_staging
+import proprietor_parser
+import landowner_records
 
 Debug = False
 
-class LandownerDetails:
-
-    def __init__(self, polygon_name, title_number, tenure, landowner, address_text, site_location):
-        self._polygon_name = polygon_name
-        self._title_number = title_number
-        self._tenure= tenure
-        self._landowner = landowner.title()
-
-        self._address_list = list()
-        for address_element in address_text.split(','):
-            self._address_list.append(address_element)
-
-        self._site_location = site_location
-
-    @property
-    def polygon_name(self):
-        return self._polygon_name
-
-    @property
-    def title_number(self):
-        return self._title_number
-
-    @property
-    def tenure(self):
-        return self._tenure
-
-    @property
-    def landowner(self):
-        return self._landowner
-
-    @property
-    def site_location(self):
-        return self._site_location
-
-    @property
-    def address1(self):
-        if len(self._address_list) >= 1:
-            return self._address_list[0]
-        else:
-            return ''
-
-    @property
-    def address2(self):
-        if len(self._address_list) >= 2:
-            return self._address_list[1]
-        else:
-            return ''
-
-    @property
-    def address3(self):
-        if len(self._address_list) >= 3:
-            return self._address_list[2]
-        else:
-            return ''
-    @property
-    def address4(self):
-        if len(self._address_list) >= 4:
-            return self._address_list[3]
-        else:
-            return ''
-
-    @property
-    def address5(self):
-        if len(self._address_list) >= 5:
-            return self._address_list[4]
-        else:
-            return ''
-
-    @property
-    def address6(self):
-        if len(self._address_list) >= 6:
-            return self._address_list[5]
-        else:
-            return ''
-
 def main():
     settings_dictionary = create_settings_dictionary()
     create_mail_merge_csv(settings_dictionary)
@@ -98,6 +28,9 @@ def create_settings_dictionary():
     settings_dictionary["DateTimeStamp"] = get_current_timestamp()
     outputCsvFileName = "MailMerge_%s.csv" %(settings_dictionary["DateTimeStamp"])
     settings_dictionary["outputCsvFilePath"] = os.path.join(settings_dictionary["OutputFolder"],outputCsvFileName)
+    settings_dictionary["StreamingMode"] = True # Stream rows from the view to the csv file rather than building the whole mailing in memory first
+    settings_dictionary["FetchBatchSize"] = 1000 # Rows read from the view per fetchmany call in streaming mode
+    settings_dictionary["ProprietorCacheSize"] = 4096 # Parsed proprietors kept for reuse by later titles, 0 to parse every title afresh
 
     return settings_dictionary
 
@@ -113,34 +46,32 @@ def get_current_timestamp():
 
 def create_mail_merge_csv(settings_dictionary):
     output_message(r'Creating mail merge file {}'.format(settings_dictionary["outputCsvFilePath"]))
-    landowner_details_list = get_landowner_details_list_from_view(settings_dictionary)
-    csv_line_list = generate_csv_line_list(landowner_details_list)
-    write_csv_file(settings_dictionary, csv_line_list)
+    parser = proprietor_parser.ProprietorParser(settings_dictionary["ProprietorCacheSize"])
+    if (settings_dictionary["StreamingMode"]):
+        csv_line_list = generate_csv_lines(generate_landowner_details_from_view(settings_dictionary, parser))
+    else:
+        landowner_details_list = get_landowner_details_list_from_view(settings_dictionary, parser)
+        csv_line_list = generate_csv_line_list(landowner_details_list)
+    # Write the file locally and publish it into the Outbox complete
+    staging = output_staging.OutputStaging(settings_dictionary["OutputFolder"], prefix='MailMerge_')
+    try:
+        write_csv_file(staging.staged_path(settings_dictionary["outputCsvFilePath"]), csv_line_list)
+        staging.publish()
+    finally:
+        staging.discard()
+    output_message(parser.statistics_message())
     output_warning(r'Created mail merge file {}'.format(settings_dictionary["outputCsvFilePath"]))
 
-def get_landowner_details_list_from_view(settings_dictionary):
+def get_landowner_details_list_from_view(settings_dictionary, parser):
     landowner_details_list = list()
     output_message(r'Getting landowner details from database call...')
     try:
-        conn = pyodbc.connect(
-        r'DRIVER={SQL Server};'
-        r'SERVER=kl-sql-005;'
-        r'DATABASE=GeoDB_UK;'
-        r'UID=sde;'
-        r'PWD=sde'
-        )
+        conn = connect_to_database()
 
         cursor = conn.cursor()
 
         cursor.execute(sql_for_view_call())
-        for row in cursor.fetchall():
-            if (row[0]):
-                polygon_name = row[0].strip()
-                title_number = row[1]
-                tenure = row[2]
-                proprietor = row[3]
-                address = row[4]
-                landowner_details_list = add_landowner_details(landowner_details_list, polygon_name, title_number, tenure, proprietor, address)
+        landowner_details_list = landowner_records.create_landowner_details_from_rows(cursor.fetchall(), parser)
 
         conn.close()
 
@@ -150,39 +81,55 @@ def get_landowner_details_list_from_view(settings_dictionary):
         output_error(e)
         conn.close()
 
+def generate_landowner_details_from_view(settings_dictionary, parser):
+    output_message(r'Streaming landowner details from database call in batches of {}...'.format(settings_dictionary["FetchBatchSize"]))
+    conn = connect_to_database()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql_for_view_call())
+        while True:
+            row_list = cursor.fetchmany(settings_dictionary["FetchBatchSize"])
+            if not row_list:
+                break
+            for landowner_details in landowner_records.create_landowner_details_from_rows(row_list, parser):
+                yield landowner_details
+    except Exception as e:
+        output_error(e)
+        raise
+    finally:
+        conn.close()
+
+def connect_to_database():
+    return pyodbc.connect(
+        r'DRIVER={SQL Server};'
+        r'SERVER=kl-sql-005;'
+        r'DATABASE=GeoDB_UK;'
+        r'UID=sde;'
+        r'PWD=sde'
+        )
+
 def sql_for_view_call():
     return r"SELECT polygon.[Site_Identifier], land.Title_Number, land.Tenure, land.Proprietor, land.[Address], land.Revision_Date, land.NewSiteID FROM [sde].[tblStoragePolygonIdToLandRegistryIdMapping] map INNER JOIN [sde].[GB_STORAGE_PROPERTY_SKETCH_LAYER] polygon ON map.Storage_Polygon_ID = polygon.[OBJECTID] INNER JOIN [sde].[ENG_Land_Registry_Parcels_evw] land ON map.Land_Registry_ID = land.OBJECTID INNER JOIN [sde].[GB_STORAGE_SUBSTATION_201708] sub ON sub.Name = left(polygon.[Site_Identifier], charindex('_', polygon.[Site_Identifier]) - 1) WHERE polygon.Valid = 1 AND polygon.[Site_Identifier] IS NOT NULL AND sub.Status IS NOT NULL ORDER BY Site_Identifier"
 
-def add_landowner_details(landowner_details_list, polygon_name, title_number, tenure, proprietor, site_location):
-    for proprietor_details_text in proprietor.split(' AND '):
-        split_text = proprietor_details_text.strip().split('  ')
-        landowner = split_text[0]
-        if len(split_text) >= 2:
-            address_text = split_text[1]
-        else:
-            address_text = ''
-        landowner_details = LandownerDetails(polygon_name, title_number, tenure, landowner, address_text, site_location)
-        landowner_details_list.append(landowner_details)
-    return landowner_details_list
-
 def generate_csv_line_list(landowner_details_list):
     output_message(r'Generating csv line data...')
-    csv_line_list = list()
-    csv_line_list.append(['Substation','Title Number','Tenure','Name Prefix','Landowner first name','Address 1','Address 2','Address 3','Address 4','Address 5','Address 6','Location of site'])
-    for landowner_details in landowner_details_list:
-        csv_line_list.append(csv_line_from_landowner_details(landowner_details))
-    return csv_line_list
-
-def csv_line_from_landowner_details(landowner_details):
-    csv_line = [landowner_details.polygon_name, landowner_details.title_number, landowner_details.tenure, '', landowner_details.landowner, landowner_details.address1, landowner_details.address2, landowner_details.address3, landowner_details.address4, landowner_details.address5, landowner_details.address6, landowner_details.site_location ]
-    return csv_line
-
-def write_csv_file(settings_dictionary, csv_line_list):
-    output_message(r'Writing {}...'.format(settings_dictionary["outputCsvFilePath"]))
-    with open(settings_dictionary["outputCsvFilePath"], 'w') as csvfile:
+    return list(generate_csv_lines(landowner_details_list))
+
+def generate_csv_lines(landowner_details_iterable):
+    yield ['Substation','Title Number','Tenure','Name Prefix','Landowner first name','Address 1','Address 2','Address 3','Address 4','Address 5','Address 6','Location of site']
+    for landowner_details in landowner_details_iterable:
+        yield landowner_records.csv_line_from_landowner_details(landowner_details)
+
+def write_csv_file(csv_file_path, csv_line_iterable):
+    # csv_line_iterable may be a generator, in which case lines are written as they are produced
+    output_message(r'Writing {}...'.format(csv_file_path))
+    line_count = 0
+    with open(csv_file_path, 'w') as csvfile:
         csv_file_writer = csv.writer(csvfile, delimiter=',', lineterminator='\n')
-        for csv_line in csv_line_list:
+        for csv_line in csv_line_iterable:
             csv_file_writer.writerow(csv_line)
+            line_count = line_count + 1
+    output_message(r'{} lines written'.format(line_count))
 
 def output_message(message):
     if (Debug == True):
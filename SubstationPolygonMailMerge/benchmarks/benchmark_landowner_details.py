@@ -0,0 +1,182 @@
+import os
+import sys
+import time
+
+## Measures the per-record cost and memory of the mail merge's landowner records, comparing the
+## current slotted LandownerDetails, built through the proprietor parser, with the class it
+## replaced. Needs neither arcpy nor pyodbc:
+##
+##     python benchmark_landowner_details.py [row count] [distinct proprietor count]
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import landowner_records
+import proprietor_parser
+
+## LandownerDetails, add_landowner_details and csv_line_from_landowner_details as they were
+## before the change, copied unaltered from the tool
+
+class LandownerDetails:
+
+    def __init__(self, polygon_name, title_number, tenure, landowner, address_text, site_location):
+        self._polygon_name = polygon_name
+        self._title_number = title_number
+        self._tenure= tenure
+        self._landowner = landowner.title()
+
+        self._address_list = list()
+        for address_element in address_text.split(','):
+            self._address_list.append(address_element)
+
+        self._site_location = site_location
+
+    @property
+    def polygon_name(self):
+        return self._polygon_name
+
+    @property
+    def title_number(self):
+        return self._title_number
+
+    @property
+    def tenure(self):
+        return self._tenure
+
+    @property
+    def landowner(self):
+        return self._landowner
+
+    @property
+    def site_location(self):
+        return self._site_location
+
+    @property
+    def address1(self):
+        if len(self._address_list) >= 1:
+            return self._address_list[0]
+        else:
+            return ''
+
+    @property
+    def address2(self):
+        if len(self._address_list) >= 2:
+            return self._address_list[1]
+        else:
+            return ''
+
+    @property
+    def address3(self):
+        if len(self._address_list) >= 3:
+            return self._address_list[2]
+        else:
+            return ''
+    @property
+    def address4(self):
+        if len(self._address_list) >= 4:
+            return self._address_list[3]
+        else:
+            return ''
+
+    @property
+    def address5(self):
+        if len(self._address_list) >= 5:
+            return self._address_list[4]
+        else:
+            return ''
+
+    @property
+    def address6(self):
+        if len(self._address_list) >= 6:
+            return self._address_list[5]
+        else:
+            return ''
+
+def add_landowner_details(landowner_details_list, polygon_name, title_number, tenure, proprietor, site_location):
+    for proprietor_details_text in proprietor.split(' AND '):
+        split_text = proprietor_details_text.strip().split('  ')
+        landowner = split_text[0]
+        if len(split_text) >= 2:
+            address_text = split_text[1]
+        else:
+            address_text = ''
+        landowner_details = LandownerDetails(polygon_name, title_number, tenure, landowner, address_text, site_location)
+        landowner_details_list.append(landowner_details)
+    return landowner_details_list
+
+def csv_line_from_landowner_details(landowner_details):
+    csv_line = [landowner_details.polygon_name, landowner_details.title_number, landowner_details.tenure, '', landowner_details.landowner, landowner_details.address1, landowner_details.address2, landowner_details.address3, landowner_details.address4, landowner_details.address5, landowner_details.address6, landowner_details.site_location ]
+    return csv_line
+
+def baseline_landowner_details_from_rows(row_list):
+    ## The baseline tool's loop over the fetched view rows
+    landowner_details_list = list()
+    for row in row_list:
+        if (row[0]):
+            polygon_name = row[0].strip()
+            title_number = row[1]
+            tenure = row[2]
+            proprietor = row[3]
+            address = row[4]
+            landowner_details_list = add_landowner_details(landowner_details_list, polygon_name, title_number, tenure, proprietor, address)
+    return landowner_details_list
+
+def baseline_record_bytes(landowner_details):
+    return sys.getsizeof(landowner_details) + sys.getsizeof(landowner_details.__dict__) + sys.getsizeof(landowner_details._address_list)
+
+def slotted_record_bytes(landowner_details):
+    ## The parsed landowner is shared by every record with the same proprietor, so is counted separately
+    return sys.getsizeof(landowner_details)
+
+def parsed_landowner_bytes(parsed_landowner):
+    return sys.getsizeof(parsed_landowner) + sys.getsizeof(parsed_landowner.address_columns)
+
+def create_rows(row_count, proprietor_count):
+    row_list = list()
+    for index in range(0, row_count):
+        owner_number = index % proprietor_count
+        proprietor = 'OWNER {0} LIMITED  {0} High Street, Town, County, AB1 2CD AND JANE DOE {0}  2 Low Road, Village'.format(owner_number)
+        row_list.append(('SUB_{} '.format(index), 'T{}'.format(index), 'Freehold', proprietor, 'Site {}'.format(index)))
+    return row_list
+
+def best_time(repeat_count, function, *arguments):
+    ## The fastest of several runs, as the others include noise from the rest of the machine
+    best_seconds = None
+    for repeat in range(0, repeat_count):
+        start_time = time.time()
+        result = function(*arguments)
+        seconds = time.time() - start_time
+        if (best_seconds is None or seconds < best_seconds):
+            best_seconds = seconds
+    return (result, best_seconds)
+
+def report(name, record_count, build_seconds, line_seconds, record_bytes):
+    print('{:<28} {:>8.2f} us {:>8.2f} us {:>8.0f}'.format(name, build_seconds / record_count * 1e6, line_seconds / record_count * 1e6, record_bytes))
+
+def main():
+    row_count = 50000
+    proprietor_count = 500
+    repeat_count = 5
+    if len(sys.argv) > 2:
+        row_count = int(sys.argv[1])
+        proprietor_count = int(sys.argv[2])
+    row_list = create_rows(row_count, proprietor_count)
+
+    before_list, before_build_seconds = best_time(repeat_count, baseline_landowner_details_from_rows, row_list)
+    before_lines, before_line_seconds = best_time(repeat_count, lambda: [csv_line_from_landowner_details(landowner_details) for landowner_details in before_list])
+    record_count = len(before_list)
+    print('{} rows, {} distinct proprietors, {} records, best of {} runs'.format(row_count, proprietor_count, record_count, repeat_count))
+    print('{:<28} {:>11} {:>11} {:>8}'.format('', 'build/rec', 'csv/rec', 'bytes/rec'))
+    report('Baseline records', record_count, before_build_seconds, before_line_seconds, baseline_record_bytes(before_list[0]))
+
+    for cache_size in (4096, 0):
+        ## Each run starts from an empty cache
+        after_list, after_build_seconds = best_time(repeat_count, lambda: landowner_records.create_landowner_details_from_rows(row_list, proprietor_parser.ProprietorParser(cache_size)))
+        after_lines, after_line_seconds = best_time(repeat_count, lambda: [landowner_records.csv_line_from_landowner_details(landowner_details) for landowner_details in after_list])
+        if (after_lines != before_lines):
+            raise ValueError('The slotted records give different csv lines')
+        ## Shared parsed landowners are spread over the records that use them
+        shared_bytes = sum([parsed_landowner_bytes(parsed_landowner) for parsed_landowner in dict((id(landowner_details._parsed_landowner), landowner_details._parsed_landowner) for landowner_details in after_list).values()])
+        record_bytes = slotted_record_bytes(after_list[0]) + shared_bytes / float(len(after_list))
+        report('Slotted records, cache {}'.format(cache_size), len(after_list), after_build_seconds, after_line_seconds, record_bytes)
+
+if __name__ == '__main__':
+    main()
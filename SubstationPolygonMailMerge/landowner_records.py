@@ -0,0 +1,80 @@
+## The mail merge's landowner records: one LandownerDetails per landowner of each title, built
+## from the view rows through a ProprietorParser, and the csv line written for each. Kept apart
+## from the tool so that they can be tested and benchmarked without arcpy or pyodbc.
+
+class LandownerDetails(object):
+
+    __slots__ = ('_polygon_name', '_title_number', '_tenure', '_parsed_landowner', '_site_location')
+
+    def __init__(self, polygon_name, title_number, tenure, parsed_landowner, site_location):
+        self._polygon_name = polygon_name
+        self._title_number = title_number
+        self._tenure= tenure
+        # The parsed landowner is shared by every title with the same proprietor
+        self._parsed_landowner = parsed_landowner
+        self._site_location = site_location
+
+    @property
+    def polygon_name(self):
+        return self._polygon_name
+
+    @property
+    def title_number(self):
+        return self._title_number
+
+    @property
+    def tenure(self):
+        return self._tenure
+
+    @property
+    def landowner(self):
+        return self._parsed_landowner.landowner
+
+    @property
+    def site_location(self):
+        return self._site_location
+
+    @property
+    def address_columns(self):
+        return self._parsed_landowner.address_columns
+
+    @property
+    def address1(self):
+        return self._parsed_landowner.address_columns[0]
+
+    @property
+    def address2(self):
+        return self._parsed_landowner.address_columns[1]
+
+    @property
+    def address3(self):
+        return self._parsed_landowner.address_columns[2]
+
+    @property
+    def address4(self):
+        return self._parsed_landowner.address_columns[3]
+
+    @property
+    def address5(self):
+        return self._parsed_landowner.address_columns[4]
+
+    @property
+    def address6(self):
+        return self._parsed_landowner.address_columns[5]
+
+def create_landowner_details_from_rows(row_list, parser):
+    # Builds the landowner details for a batch of view rows (site identifier, title number, tenure, proprietor, address)
+    landowner_details_list = list()
+    parse = parser.parse
+    for row in row_list:
+        if (row[0]):
+            polygon_name = row[0].strip()
+            for parsed_landowner in parse(row[3]):
+                landowner_details_list.append(LandownerDetails(polygon_name, row[1], row[2], parsed_landowner, row[4]))
+    return landowner_details_list
+
+def csv_line_from_landowner_details(landowner_details):
+    csv_line = [landowner_details.polygon_name, landowner_details.title_number, landowner_details.tenure, '', landowner_details.landowner]
+    csv_line.extend(landowner_details.address_columns)
+    csv_line.append(landowner_details.site_location)
+    return csv_line
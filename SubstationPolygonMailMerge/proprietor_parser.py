@@ -0,0 +1,121 @@
+import collections
+
+## Parses the Land Registry Proprietor text into landowners for the mail merge. A proprietor
+## holds one or more landowners separated by ' AND ', each a name followed by a double space
+## and a comma separated address.
+##
+## Estates, utilities and councils own hundreds of titles, so the same proprietor text comes
+## up again and again. Parsed proprietors are kept in a bounded least recently used cache and
+## are returned as tuples of ParsedLandowner, which are immutable and so can be shared by
+## every title that uses them.
+
+landowner_separator = ' AND '
+address_separator = '  '
+address_line_separator = ','
+
+## Number of Address n columns in the mail merge file
+address_column_count = 6
+empty_address_tuple = ('',) * address_column_count
+
+ParsedLandowner = collections.namedtuple('ParsedLandowner', ['landowner', 'address_columns'])
+
+## Fields of a cache entry, [previous entry, next entry, proprietor, parsed landowner tuple]
+PREVIOUS, NEXT, KEY, RESULT = 0, 1, 2, 3
+
+class ProprietorParser:
+
+    def __init__(self, cache_size=4096):
+        ## A cache_size of 0 parses every proprietor afresh
+        self._cache_size = cache_size
+        ## Entries are found through the dictionary and kept in use order on a circular list
+        ## running from the least recently used after the root to the most recently used before
+        ## it. OrderedDict would do the same, but is pure Python and too slow for a hit.
+        self._entry_dictionary = dict()
+        self._root = list()
+        self.clear()
+
+    def parse(self, proprietor):
+        ## Returns a tuple of ParsedLandowner
+        entry = self._entry_dictionary.get(proprietor)
+        root = self._root
+        if entry is not None:
+            self._hit_count = self._hit_count + 1
+            # Move the entry to the most recently used end
+            entry[PREVIOUS][NEXT] = entry[NEXT]
+            entry[NEXT][PREVIOUS] = entry[PREVIOUS]
+            entry[PREVIOUS] = root[PREVIOUS]
+            entry[NEXT] = root
+            root[PREVIOUS][NEXT] = entry
+            root[PREVIOUS] = entry
+            return entry[RESULT]
+        self._miss_count = self._miss_count + 1
+        parsed_landowner_tuple = parse_proprietor(proprietor)
+        if (self._cache_size <= 0):
+            return parsed_landowner_tuple
+        if (len(self._entry_dictionary) >= self._cache_size):
+            oldest_entry = root[NEXT]
+            oldest_entry[NEXT][PREVIOUS] = root
+            root[NEXT] = oldest_entry[NEXT]
+            del self._entry_dictionary[oldest_entry[KEY]]
+        entry = [root[PREVIOUS], root, proprietor, parsed_landowner_tuple]
+        root[PREVIOUS][NEXT] = entry
+        root[PREVIOUS] = entry
+        self._entry_dictionary[proprietor] = entry
+        return parsed_landowner_tuple
+
+    def clear(self):
+        self._entry_dictionary.clear()
+        self._root[:] = [self._root, self._root, None, None]
+        self._hit_count = 0
+        self._miss_count = 0
+
+    def cached_proprietors(self):
+        ## Least recently used first
+        proprietor_list = list()
+        entry = self._root[NEXT]
+        while entry is not self._root:
+            proprietor_list.append(entry[KEY])
+            entry = entry[NEXT]
+        return proprietor_list
+
+    @property
+    def cache_size(self):
+        return self._cache_size
+
+    @property
+    def cached_count(self):
+        return len(self._entry_dictionary)
+
+    @property
+    def hit_count(self):
+        return self._hit_count
+
+    @property
+    def miss_count(self):
+        return self._miss_count
+
+    @property
+    def hit_ratio(self):
+        lookup_count = self._hit_count + self._miss_count
+        if lookup_count == 0:
+            return 0.0
+        return float(self._hit_count) / lookup_count
+
+    def statistics_message(self):
+        return 'Proprietor cache: {} hits, {} misses ({:.1%} hit ratio), {} of {} proprietors cached'.format(
+            self._hit_count, self._miss_count, self.hit_ratio, len(self._entry_dictionary), self._cache_size)
+
+def parse_proprietor(proprietor):
+    parsed_landowner_list = list()
+    for proprietor_details_text in proprietor.split(landowner_separator):
+        split_text = proprietor_details_text.strip().split(address_separator)
+        if len(split_text) >= 2:
+            address_text = split_text[1]
+        else:
+            address_text = ''
+        parsed_landowner_list.append(ParsedLandowner(split_text[0].title(), address_columns_from_text(address_text)))
+    return tuple(parsed_landowner_list)
+
+def address_columns_from_text(address_text):
+    # Pad (or cut) the address to its six columns
+    return (tuple(address_text.split(address_line_separator)) + empty_address_tuple)[:address_column_count]
@@ -0,0 +1,40 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import landowner_records
+import proprietor_parser
+
+def csv_lines(row_list, cache_size=4096):
+    landowner_details_list = landowner_records.create_landowner_details_from_rows(row_list, proprietor_parser.ProprietorParser(cache_size))
+    return [landowner_records.csv_line_from_landowner_details(landowner_details) for landowner_details in landowner_details_list]
+
+class CreateLandownerDetailsTests(unittest.TestCase):
+
+    def test_fewer_than_six_address_lines_are_padded(self):
+        csv_line_list = csv_lines([('SUB_1_A ', 'T1', 'Freehold', 'JOHN SMITH  1 HIGH STREET,TOWN', 'Site 1')])
+        self.assertEqual(csv_line_list, [['SUB_1_A', 'T1', 'Freehold', '', 'John Smith', '1 HIGH STREET', 'TOWN', '', '', '', '', 'Site 1']])
+
+    def test_landowner_without_address(self):
+        csv_line_list = csv_lines([('SUB_1_A', 'T1', 'Leasehold', 'ACME LIMITED', 'Site 1')])
+        self.assertEqual(csv_line_list, [['SUB_1_A', 'T1', 'Leasehold', '', 'Acme Limited', '', '', '', '', '', '', 'Site 1']])
+
+    def test_more_than_six_address_lines_are_cut(self):
+        landowner_details = landowner_records.create_landowner_details_from_rows([('SUB_1_A', 'T1', 'Freehold', 'JOHN SMITH  1,2,3,4,5,6,7', 'Site 1')], proprietor_parser.ProprietorParser())[0]
+        self.assertEqual(landowner_details.address_columns, ('1', '2', '3', '4', '5', '6'))
+        self.assertEqual([landowner_details.address1, landowner_details.address6], ['1', '6'])
+
+    def test_one_record_per_landowner(self):
+        csv_line_list = csv_lines([('SUB_1_A', 'T1', 'Freehold', 'JOHN SMITH  1 HIGH STREET AND JANE SMITH  2 LOW ROAD,VILLAGE', 'Site 1')])
+        self.assertEqual([csv_line[4:8] for csv_line in csv_line_list], [['John Smith', '1 HIGH STREET', '', ''], ['Jane Smith', '2 LOW ROAD', 'VILLAGE', '']])
+
+    def test_rows_without_site_identifier_are_skipped(self):
+        self.assertEqual(csv_lines([(None, 'T1', 'Freehold', 'JOHN SMITH', 'Site 1'), ('', 'T2', 'Freehold', 'JANE SMITH', 'Site 2')]), [])
+
+    def test_same_lines_with_and_without_cache(self):
+        row_list = [('SUB_{}'.format(index), 'T{}'.format(index), 'Freehold', 'OWNER {}  1 HIGH STREET,TOWN'.format(index % 3), 'Site {}'.format(index)) for index in range(0, 10)]
+        self.assertEqual(csv_lines(row_list), csv_lines(row_list, 0))
+
+if __name__ == '__main__':
+    unittest.main()
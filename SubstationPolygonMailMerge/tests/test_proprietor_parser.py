@@ -0,0 +1,64 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import proprietor_parser
+
+def proprietor(number):
+    return 'ESTATE {0} LIMITED  {0} HIGH STREET,TOWN,COUNTY,AB1 2CD'.format(number)
+
+class ParseProprietorTests(unittest.TestCase):
+
+    def test_landowners_and_address_columns(self):
+        parsed_landowner_tuple = proprietor_parser.parse_proprietor('JOHN SMITH  1 HIGH STREET,TOWN AND JANE SMITH')
+        self.assertEqual(parsed_landowner_tuple, (proprietor_parser.ParsedLandowner('John Smith', ('1 HIGH STREET', 'TOWN', '', '', '', '')),
+                                                  proprietor_parser.ParsedLandowner('Jane Smith', ('',) * 6)))
+
+    def test_address_cut_to_six_columns(self):
+        self.assertEqual(proprietor_parser.address_columns_from_text('1,2,3,4,5,6,7,8'), ('1', '2', '3', '4', '5', '6'))
+
+class ProprietorCacheTests(unittest.TestCase):
+
+    def test_hit_returns_shared_object(self):
+        parser = proprietor_parser.ProprietorParser(4)
+        parsed_landowner_tuple = parser.parse(proprietor(1))
+        self.assertTrue(parser.parse(proprietor(1)) is parsed_landowner_tuple)
+        ## The shared result is immutable, so no title can change it for the others
+        self.assertTrue(isinstance(parsed_landowner_tuple, tuple))
+        self.assertRaises(AttributeError, setattr, parsed_landowner_tuple[0], 'landowner', 'Other')
+        self.assertTrue(isinstance(parsed_landowner_tuple[0].address_columns, tuple))
+
+    def test_hit_and_miss_counts(self):
+        parser = proprietor_parser.ProprietorParser(4)
+        for number in [1, 2, 1, 1, 3, 2]:
+            parser.parse(proprietor(number))
+        self.assertEqual((parser.hit_count, parser.miss_count, parser.cached_count), (3, 3, 3))
+        self.assertEqual(parser.hit_ratio, 0.5)
+        self.assertEqual(parser.statistics_message(), 'Proprietor cache: 3 hits, 3 misses (50.0% hit ratio), 3 of 4 proprietors cached')
+        parser.clear()
+        self.assertEqual((parser.hit_count, parser.miss_count, parser.cached_count, parser.hit_ratio), (0, 0, 0, 0.0))
+
+    def test_eviction_at_capacity(self):
+        parser = proprietor_parser.ProprietorParser(3)
+        for number in [1, 2, 3]:
+            parser.parse(proprietor(number))
+        ## Using 1 again makes 2 the least recently used, so 2 is evicted when 4 is added
+        parser.parse(proprietor(1))
+        parser.parse(proprietor(4))
+        self.assertEqual(parser.cached_proprietors(), [proprietor(3), proprietor(1), proprietor(4)])
+        self.assertEqual(parser.cached_count, 3)
+        miss_count = parser.miss_count
+        parser.parse(proprietor(2))
+        self.assertEqual(parser.miss_count, miss_count + 1)
+        self.assertEqual(parser.cached_proprietors(), [proprietor(1), proprietor(4), proprietor(2)])
+
+    def test_no_cache(self):
+        parser = proprietor_parser.ProprietorParser(0)
+        parsed_landowner_tuple = parser.parse(proprietor(1))
+        self.assertEqual(parser.parse(proprietor(1)), parsed_landowner_tuple)
+        self.assertEqual((parser.hit_count, parser.miss_count, parser.cached_count), (0, 2, 0))
+        self.assertEqual(parser.cached_proprietors(), [])
+
+if __name__ == '__main__':
+    unittest.main()